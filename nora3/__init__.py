@@ -5,3 +5,8 @@ path.append(dirname(realpath(__file__)))
 
 ROOT_DIR = abspath(join(dirname(__file__), "../"))
 TEST_DIR = join(ROOT_DIR, "tests")
+
+from nora3.common import CompilationSession  # noqa: E402
+from nora3.compiler import compile  # noqa: E402
+
+__all__ = ["ROOT_DIR", "TEST_DIR", "CompilationSession", "compile"]
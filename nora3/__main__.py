@@ -6,7 +6,7 @@ import platform
 import subprocess
 import tempfile
 
-from nora3 import lex, parse
+from nora3 import lex, optimize, parse, preprocess, tok
 
 parser = argparse.ArgumentParser(
     prog="Nora3 Compiler",
@@ -20,6 +20,89 @@ parser.add_argument(
     default="test",
     choices=["lex", "parse", "resolve", "tacky", "asm", "codegen", "assemble", "run", "test"],
 )
+parser.add_argument(
+    "--tokens",
+    action="store",
+    default="list",
+    choices=["list", "buffer", "stream"],
+)
+parser.add_argument(
+    "--lexer",
+    action="store",
+    default="regex",
+    choices=["regex", "vector"],
+    help="vector classifies the whole source with numpy, for batch jobs over many files",
+)
+parser.add_argument(
+    "--jobs",
+    action="store",
+    type=int,
+    default=1,
+    help="lex (with --tokens buffer), parse and resolve large sources in chunks on this many processes",
+)
+parser.add_argument(
+    "--preprocess",
+    action="store_true",
+    default=False,
+    help="run directives and expand macros instead of skipping directive lines, lexes with the regex lexer into a "
+    "list of tokens (not with --mmap, --lexer vector or --tokens buffer/stream)",
+)
+parser.add_argument(
+    "-I",
+    "--include-dir",
+    action="append",
+    default=[],
+    dest="include_dirs",
+)
+parser.add_argument(
+    "--explicit-stack",
+    action="store_true",
+    default=False,
+    help="parse statements and expressions, analyze and emit TACKY without recursion, slower and only for code "
+    "nested too deeply to recurse (implies --fused-analysis)",
+)
+parser.add_argument(
+    "--lazy-bodies",
+    action="store_true",
+    default=False,
+    help="parse function bodies on first use, unused static functions are never parsed or checked",
+)
+parser.add_argument(
+    "--fused-analysis",
+    action="store_true",
+    default=False,
+    help="resolve and typecheck in a single walk that updates the tree in place",
+)
+parser.add_argument(
+    "--mmap",
+    action="store_true",
+    default=False,
+    help="lex the memory-mapped bytes of the source instead of decoding it first",
+)
+parser.add_argument(
+    "--fold-constants",
+    action="store_true",
+    default=False,
+    help="evaluate tacky instructions on constant operands and branches on constant conditions",
+)
+parser.add_argument(
+    "--propagate-copies",
+    action="store_true",
+    default=False,
+    help="replace the reads of copied tacky variables by the values they were copied from",
+)
+parser.add_argument(
+    "--eliminate-dead-stores",
+    action="store_true",
+    default=False,
+    help="drop tacky instructions whose results are never read, printing how many per function",
+)
+parser.add_argument(
+    "--optimize",
+    action="store_true",
+    default=False,
+    help="run every tacky optimization pass (implies the three above)",
+)
 parser.add_argument(
     "--debug",
     action="store_true",
@@ -27,6 +110,9 @@ parser.add_argument(
 )
 
 args = parser.parse_args()
+# the preprocessor lexes each file itself, into a list of tokens
+if args.preprocess and (args.mmap or args.lexer != "regex" or args.tokens != "list"):
+    parser.error("--preprocess cannot be combined with --mmap, --lexer vector or --tokens buffer/stream")
 
 assert isinstance(args.filename, str)
 client: str | None
@@ -48,31 +134,71 @@ else:
 
 print("RUNNING:", args.filename)
 
-with open(args.filename, "r") as fh:
-    src = fh.read()
+src: tok.Source
+if args.mmap:
+    src = lex.map_source(args.filename)
+else:
+    with open(args.filename, "r") as fh:
+        src = fh.read()
 
-tokens = lex.Lexer(src).lex()
-if args.debug:
+if args.lexer == "vector":
+    from nora3.vector_lex import VectorLexer
+
+    lexer: lex.Lexer = VectorLexer(src, lazy_positions=True)
+else:
+    lexer = lex.Lexer(src, lazy_positions=True)
+match args.tokens:
+    case _ if args.preprocess:
+        ast_parser: parse.Parser = parse.Parser(
+            preprocess.Preprocessor(args.include_dirs).preprocess_file(args.filename),
+            args.explicit_stack,
+            args.lazy_bodies,
+        )
+    case "buffer":
+        tokens = lexer.lex_buffer() if args.jobs == 1 else lexer.lex_parallel(args.jobs)
+        ast_parser = parse.BufferParser(tokens, args.explicit_stack, args.lazy_bodies)
+    case "stream":
+        # tokens are lexed as the parser asks for them
+        ast_parser = parse.StreamParser(lexer.iter_tokens(), args.explicit_stack, args.lazy_bodies, lexer.lines)
+    case _:
+        ast_parser = parse.Parser(lexer.lex(), args.explicit_stack, args.lazy_bodies)
+if args.debug and args.tokens != "stream":
     print("TOKENS:")
-    print(tokens)
+    print(ast_parser.tokens)
 if args.stop_after == "lex":
+    if isinstance(ast_parser, parse.StreamParser):
+        for _ in ast_parser.stream:
+            pass
     exit(0)
 
-ast = parse.Parser(tokens).parse()
+ast = ast_parser.parse() if args.jobs == 1 else ast_parser.program_parallel(args.jobs)
 if args.debug:
     print("RAW AST:")
     print(ast)
 if args.stop_after == "parse":
     exit(0)
 
-ast = ast.resolve()
+if args.fused_analysis or args.explicit_stack:
+    ast = ast.analyze(args.explicit_stack)
+else:
+    ast = ast.resolve() if args.jobs == 1 else ast.resolve_parallel(args.jobs)
 if args.debug:
     print("RESOLVED AST:")
     print(ast)
 if args.stop_after == "resolve":
     exit(0)
 
-ir = ast.to_tacky()
+ir = ast.to_tacky(args.explicit_stack)
+if args.optimize or args.fold_constants or args.propagate_copies or args.eliminate_dead_stores:
+    changes = optimize.optimize_program(
+        ir,
+        fold=args.optimize or args.fold_constants,
+        propagate=args.optimize or args.propagate_copies,
+        eliminate=args.optimize or args.eliminate_dead_stores,
+    )
+    if args.debug or args.eliminate_dead_stores:
+        for name, counts in changes.items():
+            print(f"OPTIMIZED {name}:", ", ".join(f"{count} {change}" for change, count in counts.items()))
 if args.debug:
     print("IR:")
     print(ir)
@@ -80,7 +206,7 @@ if args.stop_after == "tacky":
     exit(0)
 
 assembly = ir.to_asm()
-assembly.replace_pseudo(0, {})
+assembly.replace_pseudo()
 assembly = assembly.fix_instructions()
 if args.debug:
     print("ASM:")
@@ -0,0 +1,153 @@
+from array import array
+
+from nora3 import asts
+from nora3.common import slot_names
+
+type Node = asts.Program | asts.Expr | asts.BlockItem
+
+# node classes by kind id; kind 0 is a list of nodes (a block's items, call arguments, parameters)
+node_types: list[type] = [list]
+node_types.extend(
+    cls
+    for cls in vars(asts).values()
+    if isinstance(cls, type) and issubclass(cls, (asts.Program, asts.Expr, asts.BlockItem))
+)
+node_kinds = {cls: kind for kind, cls in enumerate(node_types)}
+LIST = 0
+
+# field encoding: a node index, NONE, or a payload index p stored as PAYLOAD - p
+NONE = -1
+PAYLOAD = -2
+
+
+def is_node(value: object) -> bool:
+    # exact type lookups, isinstance() against the protocol bases is slow
+    if type(value) is list:
+        return all(type(item) in node_kinds for item in value)
+    return type(value) in node_kinds
+
+
+def node_fields(node: object) -> list[object]:
+    if type(node) is list:
+        return node
+    cls: type = type(node)
+    names = slot_names(cls)
+    values = [getattr(node, name) for name in names]
+    if type(node) is asts.FuncDecl and node.lazy_body is not None:
+        # closures neither pickle nor share, lazy bodies are parsed on the way in
+        values[names.index("_body")] = node.body
+        values[names.index("lazy_body")] = None
+    return values
+
+
+class Arena:
+    """An AST as parallel arrays: the kind of every node and its fields, which are child node indices, -1 for None
+    or indices into a table of payloads (names, constants, specifiers, labels).
+
+    Nodes are stored children first, so a node's children always have smaller indices and a single forward
+    loop visits them bottom-up. The arrays and payloads pickle without walking a tree of objects.
+    """
+
+    __slots__ = ("fields", "kinds", "payload_index", "payloads", "root", "starts")
+
+    def __init__(self) -> None:
+        self.kinds = array("i")
+        # node idx has fields[starts[idx]:starts[idx + 1]]
+        self.starts = array("i", [0])
+        self.fields = array("i")
+        self.payloads: list[object] = []
+        # keyed by type too, so 1 and True stay apart
+        self.payload_index: dict[tuple[type, object], int] = {}
+        self.root = NONE
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getstate__(self) -> tuple:
+        return self.kinds, self.starts, self.fields, self.payloads, self.root
+
+    def __setstate__(self, state: tuple) -> None:
+        self.kinds, self.starts, self.fields, self.payloads, self.root = state
+        self.payload_index = {}
+        for idx, payload in enumerate(self.payloads):
+            if payload.__hash__ is not None:
+                self.payload_index.setdefault((type(payload), payload), idx)
+
+    def node_type(self, idx: int) -> type:
+        return node_types[self.kinds[idx]]
+
+    def node_fields(self, idx: int) -> array:
+        return self.fields[self.starts[idx] : self.starts[idx + 1]]
+
+    def children(self, idx: int) -> list[int]:
+        return [field for field in self.node_fields(idx) if field >= 0]
+
+    def payload(self, field: int) -> object:
+        assert field <= PAYLOAD
+        return self.payloads[PAYLOAD - field]
+
+    def add_payload(self, value: object) -> int:
+        # names, constants and specifiers are shared, unhashable payloads (label lists, symbol tables) are not
+        if value.__hash__ is None:
+            self.payloads.append(value)
+            return PAYLOAD - (len(self.payloads) - 1)
+        if (idx := self.payload_index.get(key := (type(value), value))) is None:
+            idx = self.payload_index[key] = len(self.payloads)
+            self.payloads.append(value)
+        return PAYLOAD - idx
+
+    def add(self, kind: int, fields: list[int]) -> int:
+        self.kinds.append(kind)
+        self.fields.extend(fields)
+        self.starts.append(len(self.fields))
+        return len(self.kinds) - 1
+
+    @classmethod
+    def from_ast(cls, root: Node) -> "Arena":
+        # post-order without recursion: a node is added once its children are, their indices wait on `done`
+        arena = cls()
+        done: list[int] = []
+        stack: list[tuple[object, list[object] | None, list[bool] | None]] = [(root, None, None)]
+        while stack:
+            node, values, nodes = stack.pop()
+            if values is None or nodes is None:
+                values = node_fields(node)
+                nodes = [is_node(value) for value in values]
+                stack.append((node, values, nodes))
+                stack.extend((value, None, None) for value, child in zip(reversed(values), reversed(nodes)) if child)
+                continue
+
+            nchildren = nodes.count(True)
+            children = iter(done[len(done) - nchildren :])
+            del done[len(done) - nchildren :]
+
+            fields = [
+                next(children) if child else NONE if value is None else arena.add_payload(value)
+                for value, child in zip(values, nodes)
+            ]
+            done.append(arena.add(node_kinds[type(node)], fields))
+
+        arena.root = done.pop()
+        return arena
+
+    def to_ast(self) -> Node:
+        # children come first, so every field refers to an object already built
+        built: list[object] = []
+        for idx, kind in enumerate(self.kinds):
+            values = [
+                None if field == NONE else built[field] if field >= 0 else self.payloads[PAYLOAD - field]
+                for field in self.node_fields(idx)
+            ]
+            if kind == LIST:
+                built.append(values)
+                continue
+
+            node_type = node_types[kind]
+            node: object = object.__new__(node_type)
+            for name, value in zip(slot_names(node_type), values):
+                setattr(node, name, value)
+            built.append(node)
+
+        root = built[self.root]
+        assert isinstance(root, (asts.Program, asts.Expr, asts.BlockItem))
+        return root
@@ -1,25 +1,34 @@
 from typing import Protocol
 
-from nora3.builtin_types import StaticAttrs, SymbolTable
-from nora3.common import Unreachable
+from nora3.builtin_types import SymbolTable
+from nora3.common import Unreachable, VariableTable, slot_names
 
 
 class Codegen(Protocol):
+    __slots__ = ()
+
     def codegen(self) -> str: ...
 
 
 class ReplacePseudo(Protocol):
-    def replace_pseudo(self, stack_size: int, variable_map: dict[str, int], symbol_table: SymbolTable) -> int: ...
+    __slots__ = ()
+
+    def replace_pseudo(self, stack_size: int, offsets: list[int]) -> int: ...
 
 
 class FixInstructions(Protocol):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None: ...
 
 
-class Operand(Codegen): ...
+class Operand(Codegen):
+    __slots__ = ()
 
 
 class Imm(Operand):
+    __slots__ = ("value",)
+
     def __init__(self, value: int):
         self.value = value
 
@@ -31,6 +40,8 @@ class Imm(Operand):
 
 
 class Null(Operand):
+    __slots__ = ()
+
     def __repr__(self) -> str:
         return "Null()"
 
@@ -39,6 +50,8 @@ class Null(Operand):
 
 
 class Register(Operand):
+    __slots__ = ("nbytes",)
+
     mapping: dict[int, str]
 
     def __init_subclass__(cls, one: str, two: str, four: str, eight: str) -> None:
@@ -59,21 +72,37 @@ class Register(Operand):
 
 
 # fmt: off
-class Ax(Register, one="al", two="ax", four="eax", eight="rax"): ...
-class Cx(Register, one="cl", two="cx", four="ecx", eight="rcx"): ...
-class Dx(Register, one="dl", two="dx", four="edx", eight="rdx"): ...
-class Di(Register, one="dil", two="di", four="edi", eight="rdi"): ...
-class Si(Register, one="sil", two="si", four="esi", eight="rsi"): ...
-class R8(Register, one="r8b", two="r8w", four="r8d", eight="r8"): ...
-class R9(Register, one="r9b", two="r9w", four="r9d", eight="r9"): ...
-class R10(Register, one="r10b", two="r10w", four="r10d", eight="r10"): ...
-class R11(Register, one="r11b", two="r11w", four="r11d", eight="r11"): ...
+class Ax(Register, one="al", two="ax", four="eax", eight="rax"):
+    __slots__ = ()
+class Cx(Register, one="cl", two="cx", four="ecx", eight="rcx"):
+    __slots__ = ()
+class Dx(Register, one="dl", two="dx", four="edx", eight="rdx"):
+    __slots__ = ()
+class Di(Register, one="dil", two="di", four="edi", eight="rdi"):
+    __slots__ = ()
+class Si(Register, one="sil", two="si", four="esi", eight="rsi"):
+    __slots__ = ()
+class R8(Register, one="r8b", two="r8w", four="r8d", eight="r8"):
+    __slots__ = ()
+class R9(Register, one="r9b", two="r9w", four="r9d", eight="r9"):
+    __slots__ = ()
+class R10(Register, one="r10b", two="r10w", four="r10d", eight="r10"):
+    __slots__ = ()
+class R11(Register, one="r11b", two="r11w", four="r11d", eight="r11"):
+    __slots__ = ()
 # fmt: on
 
 
 class Pseudo(Operand):
-    def __init__(self, name: str):
-        self.name = name
+    __slots__ = ("id", "variables")
+
+    def __init__(self, id_: int, variables: VariableTable):
+        self.id = id_
+        self.variables = variables
+
+    @property
+    def name(self) -> str:
+        return self.variables.name(self.id)
 
     def __repr__(self) -> str:
         return f"Pseudo({self.name})"
@@ -83,6 +112,8 @@ class Pseudo(Operand):
 
 
 class Stack(Operand):
+    __slots__ = ("size",)
+
     def __init__(self, size: int):
         self.size = size
 
@@ -94,6 +125,8 @@ class Stack(Operand):
 
 
 class Data(Operand):
+    __slots__ = ("name",)
+
     def __init__(self, name: str) -> None:
         self.name = name
 
@@ -104,27 +137,35 @@ class Data(Operand):
         return f"{self.name}(%rip)"
 
 
+# no stack offset is positive, so this one marks a static variable in replace_pseudo()
+STATIC = 1
+
+
 class Instruction(Codegen, ReplacePseudo, FixInstructions):
+    __slots__ = ()
+
     code: str
 
     @classmethod
-    def _replace_pseudo(
-        cls, pseudo: Pseudo, stack_size: int, mapping: dict[str, int], symbol_table: SymbolTable
-    ) -> tuple[Stack | Data, int]:
-        if pseudo.name in mapping:
-            return Stack(mapping[pseudo.name]), stack_size
-        else:
-            if pseudo.name in symbol_table and isinstance(symbol_table[pseudo.name].attrs, StaticAttrs):
-                return Data(pseudo.name), stack_size
-            else:
-                stack_size -= 4
-                mapping[pseudo.name] = stack_size
-                return Stack(stack_size), stack_size
-
-    def replace_pseudo(self, stack_size: int, variable_map: dict[str, int], symbol_table: SymbolTable) -> int:
-        for name, item in self.__dict__.items():
-            if isinstance(item, Pseudo):
-                stack, stack_size = self._replace_pseudo(item, stack_size, variable_map, symbol_table)
+    def _replace_pseudo(cls, pseudo: Pseudo, stack_size: int, offsets: list[int]) -> tuple[Stack | Data, int]:
+        # offsets by variable id: 0 until first seen, STATIC for a static variable, else its (negative) stack offset
+        if (offset := offsets[pseudo.id]) == STATIC:
+            return Data(pseudo.name), stack_size
+        elif offset:
+            return Stack(offset), stack_size
+
+        if pseudo.variables.static[pseudo.id]:
+            offsets[pseudo.id] = STATIC
+            return Data(pseudo.name), stack_size
+        stack_size -= 4
+        offsets[pseudo.id] = stack_size
+        return Stack(stack_size), stack_size
+
+    def replace_pseudo(self, stack_size: int, offsets: list[int]) -> int:
+        for name in slot_names(type(self)):
+            # exact type check, isinstance() against the protocol bases is slow
+            if type(item := getattr(self, name)) is Pseudo:
+                stack, stack_size = self._replace_pseudo(item, stack_size, offsets)
                 setattr(self, name, stack)
 
         return stack_size
@@ -134,6 +175,8 @@ class Instruction(Codegen, ReplacePseudo, FixInstructions):
 
 
 class Mov(Instruction):
+    __slots__ = ("src", "dst")
+
     code: str = "movl"
 
     def __init__(self, src: Operand, dst: Operand) -> None:
@@ -164,6 +207,8 @@ class Mov(Instruction):
 
 
 class Unary(Instruction):
+    __slots__ = ("src",)
+
     code: str
 
     def __init_subclass__(cls, code: str) -> None:
@@ -182,12 +227,16 @@ class Unary(Instruction):
 
 
 # fmt: off
-class Neg(Unary, code="negl"): ...
-class Not(Unary, code="notl"): ...
+class Neg(Unary, code="negl"):
+    __slots__ = ()
+class Not(Unary, code="notl"):
+    __slots__ = ()
 # fmt: on
 
 
 class Binary(Instruction):
+    __slots__ = ("src", "dst")
+
     code: str
 
     def __init_subclass__(cls, code: str) -> None:
@@ -209,6 +258,8 @@ class Binary(Instruction):
 
 
 class Add(Binary, code="addl"):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None:
         if isinstance(self.src, Stack | Data) and isinstance(self.dst, Stack | Data):
             r10 = R10(4)
@@ -223,6 +274,8 @@ class Add(Binary, code="addl"):
 
 
 class Subtract(Binary, code="subl"):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None:
         if isinstance(self.src, Stack | Data) and isinstance(self.dst, Stack | Data):
             r10 = R10(4)
@@ -237,6 +290,8 @@ class Subtract(Binary, code="subl"):
 
 
 class Multiply(Binary, code="imull"):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None:
         if isinstance(self.dst, Stack | Data):
             r11 = R11(4)
@@ -252,6 +307,8 @@ class Multiply(Binary, code="imull"):
 
 
 class LeftShift(Binary, code="sall"):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None:
         if isinstance(self.src, Imm) or (isinstance(self.src, Register) and self.src.nbytes == 1):
             instructions.append(self)
@@ -265,6 +322,8 @@ class LeftShift(Binary, code="sall"):
 
 
 class RightShift(Binary, code="sarl"):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None:
         if isinstance(self.src, Imm) or (isinstance(self.src, Register) and self.src.nbytes == 1):
             instructions.append(self)
@@ -278,6 +337,8 @@ class RightShift(Binary, code="sarl"):
 
 
 class BitwiseAnd(Binary, code="andl"):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None:
         if isinstance(self.src, Stack | Data) and isinstance(self.dst, Stack | Data):
             r10 = R10(4)
@@ -292,6 +353,8 @@ class BitwiseAnd(Binary, code="andl"):
 
 
 class BitwiseOr(Binary, code="orl"):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None:
         if isinstance(self.src, Stack | Data) and isinstance(self.dst, Stack | Data):
             r10 = R10(4)
@@ -306,6 +369,8 @@ class BitwiseOr(Binary, code="orl"):
 
 
 class BitwiseXor(Binary, code="xorl"):
+    __slots__ = ()
+
     def fix_instructions(self, instructions: list["Instruction"]) -> None:
         if isinstance(self.src, Stack | Data) and isinstance(self.dst, Stack | Data):
             r10 = R10(4)
@@ -320,6 +385,8 @@ class BitwiseXor(Binary, code="xorl"):
 
 
 class Cmp(Instruction):
+    __slots__ = ("left", "right")
+
     code: str = "cmpl"
 
     def __init__(self, left: Operand, right: Operand) -> None:
@@ -358,6 +425,8 @@ class Cmp(Instruction):
 
 
 class Idiv(Instruction):
+    __slots__ = ("divisor",)
+
     code: str = "idivl"
 
     def __init__(self, divisor: Operand) -> None:
@@ -385,6 +454,8 @@ class Idiv(Instruction):
 
 
 class Cdq(Instruction):
+    __slots__ = ()
+
     code: str = "cdq"
 
     def __init__(self) -> None:
@@ -398,6 +469,8 @@ class Cdq(Instruction):
 
 
 class Jmp(Instruction):
+    __slots__ = ("label",)
+
     code: str = "jmp"
 
     def __init__(self, label: str) -> None:
@@ -411,6 +484,8 @@ class Jmp(Instruction):
 
 
 class JmpCC(Instruction):
+    __slots__ = ("cond", "label")
+
     code: str = "j"
 
     def __init__(self, cond: str, label: str) -> None:
@@ -426,6 +501,8 @@ class JmpCC(Instruction):
 
 
 class SetCC(Instruction):
+    __slots__ = ("cond", "src")
+
     code: str = "set"
 
     def __init__(self, cond: str, src: Operand) -> None:
@@ -443,6 +520,8 @@ class SetCC(Instruction):
 
 
 class Label(Instruction):
+    __slots__ = ("label",)
+
     code: str = ""
 
     def __init__(self, label: str) -> None:
@@ -456,6 +535,8 @@ class Label(Instruction):
 
 
 class AllocateStack(Instruction):
+    __slots__ = ("size",)
+
     code: str = "subq"
 
     def __init__(self, size: int) -> None:
@@ -470,6 +551,8 @@ class AllocateStack(Instruction):
 
 
 class DeallocateStack(Instruction):
+    __slots__ = ("size",)
+
     code: str = "addq"
 
     def __init__(self, size: int) -> None:
@@ -483,6 +566,8 @@ class DeallocateStack(Instruction):
 
 
 class Push(Instruction):
+    __slots__ = ("operand",)
+
     code: str = "pushq"
 
     def __init__(self, operand: Operand) -> None:
@@ -496,6 +581,8 @@ class Push(Instruction):
 
 
 class Call(Instruction):
+    __slots__ = ("label",)
+
     code: str = "call"
 
     def __init__(self, label: str) -> None:
@@ -509,6 +596,8 @@ class Call(Instruction):
 
 
 class Ret(Instruction):
+    __slots__ = ()
+
     def __repr__(self) -> str:
         return "Ret()"
 
@@ -520,17 +609,21 @@ class Ret(Instruction):
 
 
 class TopLevel(Codegen):
+    __slots__ = ("name", "globl")
+
     def __init__(self, name: str, globl: bool) -> None:
         self.name = name
         self.globl = globl
 
 
 class StaticVar(TopLevel):
+    __slots__ = ("init",)
+
     def __init__(self, name: str, globl: bool, init: int) -> None:
         super().__init__(name, globl)
         self.init = init
 
-    def replace_pseudo(self, stack_size: int, variable_map: dict[str, int], symbol_table: SymbolTable) -> None:
+    def replace_pseudo(self) -> None:
         return
 
     def __repr__(self) -> str:
@@ -557,19 +650,30 @@ class StaticVar(TopLevel):
 
 
 class Function(TopLevel):
-    def __init__(self, name: str, globl: bool, instructions: list[Instruction], stack_size: int | None = None) -> None:
+    __slots__ = ("instructions", "variables", "stack_size")
+
+    def __init__(
+        self,
+        name: str,
+        globl: bool,
+        instructions: list[Instruction],
+        variables: VariableTable,
+        stack_size: int | None = None,
+    ) -> None:
         super().__init__(name, globl)
         self.instructions = instructions
+        self.variables = variables
         self.stack_size = stack_size
 
     def __repr__(self) -> str:
         body = "\n".join(["    " + repr(i) for i in self.instructions])
         return f"{self.name}\n{body}"
 
-    def replace_pseudo(self, stack_size: int, variable_map: dict[str, int], symbol_table: SymbolTable) -> None:
+    def replace_pseudo(self) -> None:
         stack_size = 0
+        offsets = [0] * len(self.variables)
         for instruction in self.instructions:
-            stack_size = instruction.replace_pseudo(stack_size, variable_map, symbol_table)
+            stack_size = instruction.replace_pseudo(stack_size, offsets)
         self.stack_size = stack_size
 
     def codegen(self) -> str:
@@ -599,10 +703,12 @@ class Function(TopLevel):
         assert stack_size % 16 == 0
         instructions.insert(0, AllocateStack(stack_size))
 
-        return Function(self.name, self.globl, instructions)
+        return Function(self.name, self.globl, instructions, self.variables)
 
 
 class Program(Codegen):
+    __slots__ = ("functions", "symbol_table")
+
     def __init__(self, functions: list[Function], symbol_table: SymbolTable) -> None:
         self.functions = functions
         self.symbol_table = symbol_table
@@ -616,9 +722,9 @@ class Program(Codegen):
     .section .note.GNU-stack,"",@progbits
 """
 
-    def replace_pseudo(self, stack_size: int, variable_map: dict[str, int]) -> None:
+    def replace_pseudo(self) -> None:
         for func in self.functions:
-            func.replace_pseudo(stack_size, variable_map, self.symbol_table)
+            func.replace_pseudo()
 
     def fix_instructions(self) -> "Program":
         funcs = [func.fix_instructions() for func in self.functions]
@@ -640,7 +746,7 @@ int main(void) {
     ast = ast.resolve()
     ir = ast.to_tacky()
     ass = ir.to_asm()
-    ass.replace_pseudo(0, {})
+    ass.replace_pseudo()
     ass = ass.fix_instructions()
     code = ass.codegen()
 
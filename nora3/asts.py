@@ -1,9 +1,11 @@
-from typing import Protocol, Self
+import os
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Protocol, Self
 
 from nora3 import tacky
 from nora3 import tok
 from nora3.builtin_types import (
-    Type,
     FuncType,
     IntType,
     SymbolTable,
@@ -14,13 +16,15 @@ from nora3.builtin_types import (
     FuncAttrs,
     StaticAttrs,
     LocalAttrs,
+    Symbol,
+    local_int,
 )
 from nora3.common import (
     MappingHolder,
-    Emitter,
     Unreachable,
+    CompilationSession,
+    VariableTable,
     make_label_name,
-    make_temp_variable_name,
     make_variable_name,
 )
 
@@ -30,38 +34,136 @@ class ResolverError(Exception): ...
 class TypeCheckerError(Exception): ...
 # fmt: on
 
+semantic_errors = (ResolverError, TypeCheckerError)
+
 
 class ToTacky[Res](Protocol):
+    __slots__ = ()
+
     def to_tacky(self, symbol_table: SymbolTable) -> Res: ...
 
 
+class Emitter[Res](Protocol):
+    __slots__ = ()
+
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> Res: ...
+
+
 class MapEntry:
-    def __init__(self, name: str, from_current_scope: bool, has_linkage: bool = False) -> None:
+    __slots__ = ("name", "has_linkage")
+
+    def __init__(self, name: str, has_linkage: bool = False) -> None:
         self.name = name
-        self.from_current_scope = from_current_scope
         self.has_linkage = has_linkage
 
     def __repr__(self) -> str:
-        return f"Entry({self.name} cur={self.from_current_scope} link={self.has_linkage})"
+        return f"Entry({self.name} link={self.has_linkage})"
+
+
+class Scope:
+    """The identifier map as a chain of scopes. Entering a block links an empty scope to the enclosing one instead
+    of copying every visible name, and a lookup walks outwards through at most the nesting depth.
+    """
+
+    __slots__ = ("entries", "parent")
+
+    def __init__(self, parent: "Scope | None" = None) -> None:
+        self.entries: dict[str, MapEntry] = {}
+        self.parent = parent
+
+    def __repr__(self) -> str:
+        return f"Scope({self.entries} <- {self.parent})"
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __getitem__(self, name: str) -> MapEntry:
+        if (entry := self.get(name)) is None:
+            raise KeyError(name)
+        return entry
+
+    def __setitem__(self, name: str, entry: MapEntry) -> None:
+        # declarations always go in the innermost scope
+        self.entries[name] = entry
+
+    def get(self, name: str) -> MapEntry | None:
+        scope: Scope | None = self
+        while scope is not None:
+            if (entry := scope.entries.get(name)) is not None:
+                return entry
+            scope = scope.parent
+        return None
+
+    def current(self, name: str) -> MapEntry | None:
+        # only a declaration in this very scope can conflict
+        return self.entries.get(name)
+
+    def child(self) -> "Scope":
+        return Scope(self)
 
 
 class Resolver(Protocol):
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> Self: ...
+    __slots__ = ()
+
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> Self: ...
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> Self: ...
     def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> Self: ...
 
     def mangle_label(self, label: str, function_name: str) -> str:
         return f".label.{function_name}.{label}"
 
-    def copy_variable_map(self, identifier_map: dict[str, MapEntry]) -> dict[str, MapEntry]:
-        return {name: MapEntry(me.name, False, me.has_linkage) for name, me in identifier_map.items()}
-
 
 class TypeChecker(Protocol):
+    __slots__ = ()
+
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None: ...
 
 
-class Expr(Emitter[tacky.Instruction, tacky.Value], Resolver, TypeChecker):
+class Analysis:
+    """The state of resolve_identifiers, resolve_goto_labels, resolve_loop_labels and typecheck together, for the
+    single walk of Program.analyze(); scoped fields are swapped on the way into a node and restored on the way out.
+    """
+
+    __slots__ = (
+        "symbol_table",
+        "identifier_map",
+        "inside_func",
+        "function_name",
+        "goto_labels",
+        "loop_labels",
+        "switch_context",
+    )
+
+    def __init__(
+        self,
+        symbol_table: SymbolTable,
+        identifier_map: Scope,
+        inside_func: bool = False,
+        function_name: str = "",
+    ) -> None:
+        self.symbol_table = symbol_table
+        self.identifier_map = identifier_map
+        self.inside_func = inside_func
+        self.function_name = function_name
+        self.goto_labels: dict[str, bool] = {}
+        # enclosing loops and switches, innermost last
+        self.loop_labels: list[str] = []
+        self.switch_context: set[str] | None = None
+
+    def push_loop_label(self, kind: str) -> str:
+        self.loop_labels.append(label := make_label_name(f"{kind}.{self.function_name}"))
+        return label
+
+
+class Analyzer(Protocol):
+    __slots__ = ()
+
+    def analyze(self, analysis: Analysis) -> None: ...
+
+
+class Expr(Emitter[tacky.Value], Resolver, TypeChecker, Analyzer):
+    __slots__ = ()
+
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> Self:
         raise NotImplementedError("cannot resolve goto labels for expressions")
 
@@ -70,24 +172,31 @@ class Expr(Emitter[tacky.Instruction, tacky.Value], Resolver, TypeChecker):
 
 
 class Constant(Expr):
+    __slots__ = ("value",)
+
     def __init__(self, value: int) -> None:
         self.value = value
 
     def __repr__(self) -> str:
         return f"Constant({self.value})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Constant:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Constant:
         return tacky.Constant(self.value)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Constant":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Constant":
         return Constant(self.value)
 
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         pass
 
+    def analyze(self, analysis: Analysis) -> None:
+        pass
+
 
 class Variable(Expr):
-    def __init__(self, token: tok.Token) -> None:
+    __slots__ = ("name",)
+
+    def __init__(self, token: tok.BaseToken) -> None:
         assert isinstance(token.tokentype, tok.Identifier)
         self.name = token.tokentype.value
 
@@ -100,10 +209,10 @@ class Variable(Expr):
     def __repr__(self) -> str:
         return f"Variable({self.name})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Variable:
-        return tacky.Variable(self.name)
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Variable:
+        return tacky.Variable(variables, self.name)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Variable":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Variable":
         if self.name not in identifier_map:
             raise ResolverError(f"undefined variable: {self.name}")
 
@@ -111,12 +220,20 @@ class Variable(Expr):
         return Variable(tok.Token(-1, -1, tok.Identifier(unique_name)))
 
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
-        var = symbol_table[self.name]
-        if isinstance(var, FuncType):
+        if isinstance(symbol_table[self.name].type_, FuncType):
             raise TypeCheckerError(f"function name {self.name} used as a variable")
 
+    def analyze(self, analysis: Analysis) -> None:
+        if (entry := analysis.identifier_map.get(self.name)) is None:
+            raise ResolverError(f"undefined variable: {self.name}")
+
+        self.name = entry.name
+        self.typecheck(analysis.symbol_table, False)
+
 
 class Unary(Expr, MappingHolder):
+    __slots__ = ("expr",)
+
     tacky_type: type[tacky.Unary]
 
     def __init__(self, expr: Expr) -> None:
@@ -143,38 +260,58 @@ class Unary(Expr, MappingHolder):
             return False
         return True
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
-        src = self.expr.emit(instructions)
-        dst = tacky.Variable(make_temp_variable_name())
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
+        src = self.expr.emit(instructions, variables)
+        return self.emit_operator(instructions, variables, src)
+
+    def emit_operator(
+        self, instructions: list[tacky.Instruction], variables: VariableTable, src: tacky.Value
+    ) -> tacky.Value:
+        dst = tacky.Variable(variables)
         instructions.append(self.tacky_type(src, dst))
         return dst
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Unary":
+    def check_lvalue(self) -> None:
         if self.__class__ in {PrefixIncrement, PrefixDecrement, PostfixIncrement, PostfixDecrement}:
             if not isinstance(self.expr, Variable):
                 raise ResolverError(
                     f"expr for {self.__class__.__name__} must be variable, not {self.expr.__class__.__name__}"
                 )
 
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Unary":
+        self.check_lvalue()
         expr = self.expr.resolve_identifiers(identifier_map, inside_func)
         return self.__class__(expr)
 
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         self.expr.typecheck(symbol_table, file_scope)
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.check_lvalue()
+        self.expr.analyze(analysis)
+
 
 # fmt: off
-class Complement(Unary, tokentype=tok.Tilde(), op=tacky.Complement): ...
-class Negate(Unary, tokentype=tok.Hyphen(), op=tacky.Negate): ...
-class Not(Unary, tokentype=tok.Bang(), op=tacky.Not): ...
-class PrefixIncrement(Unary, tokentype=tok.PlusPlus(), op=tacky.PrefixIncrement): ...
-class PrefixDecrement(Unary, tokentype=tok.HyphenHyphen(), op=tacky.PrefixDecrement): ...
-class PostfixIncrement(Unary, tokentype=None, op=tacky.PostfixIncrement): ...
-class PostfixDecrement(Unary, tokentype=None, op=tacky.PostfixDecrement): ...
+class Complement(Unary, tokentype=tok.Tilde(), op=tacky.Complement):
+    __slots__ = ()
+class Negate(Unary, tokentype=tok.Hyphen(), op=tacky.Negate):
+    __slots__ = ()
+class Not(Unary, tokentype=tok.Bang(), op=tacky.Not):
+    __slots__ = ()
+class PrefixIncrement(Unary, tokentype=tok.PlusPlus(), op=tacky.PrefixIncrement):
+    __slots__ = ()
+class PrefixDecrement(Unary, tokentype=tok.HyphenHyphen(), op=tacky.PrefixDecrement):
+    __slots__ = ()
+class PostfixIncrement(Unary, tokentype=None, op=tacky.PostfixIncrement):
+    __slots__ = ()
+class PostfixDecrement(Unary, tokentype=None, op=tacky.PostfixDecrement):
+    __slots__ = ()
 # fmt: on
 
 
 class Binary(Expr, MappingHolder):
+    __slots__ = ("left", "right")
+
     tacky_type: type[tacky.Binary] | None
     precedence: int
     associativity: str
@@ -209,37 +346,45 @@ class Binary(Expr, MappingHolder):
             raise TypeError(f"token is not a unary operator: {tokentype}")
         return binary
 
-    def _assign_emit(self, instructions: list[tacky.Instruction]) -> tacky.Variable:
-        assert isinstance(self.left, Variable)
-        left = self.left.emit(instructions)
-        right = self.right.emit(instructions)
-
+    def _assign_emit(
+        self, instructions: list[tacky.Instruction], variables: VariableTable, left: tacky.Value, right: tacky.Value
+    ) -> tacky.Variable:
+        assert isinstance(left, tacky.Variable)
         if self.compound_op is None:
             instructions.append(tacky.Copy(right, left))
             return left
         else:
-            dst = tacky.Variable(make_temp_variable_name())
+            dst = tacky.Variable(variables)
             instructions.extend([self.compound_op(left, right, dst), tacky.Copy(dst, left)])
             return left
 
-    def _non_assign_emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
-        left = self.left.emit(instructions)
-        right = self.right.emit(instructions)
-        dst = tacky.Variable(make_temp_variable_name())
+    def _non_assign_emit(
+        self, instructions: list[tacky.Instruction], variables: VariableTable, left: tacky.Value, right: tacky.Value
+    ) -> tacky.Value:
+        dst = tacky.Variable(variables)
         assert self.tacky_type is not None
         instructions.append(self.tacky_type(left, right, dst))
         return dst
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
+        left = self.left.emit(instructions, variables)
+        right = self.right.emit(instructions, variables)
+        return self.emit_operator(instructions, variables, left, right)
+
+    def emit_operator(
+        self, instructions: list[tacky.Instruction], variables: VariableTable, left: tacky.Value, right: tacky.Value
+    ) -> tacky.Value:
         if self.precedence == 1:
-            return self._assign_emit(instructions)
+            return self._assign_emit(instructions, variables, left, right)
         else:
-            return self._non_assign_emit(instructions)
+            return self._non_assign_emit(instructions, variables, left, right)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> Self:
+    def check_lvalue(self) -> None:
         if self.precedence == 1 and not isinstance(self.left, Variable):
             raise ResolverError(f"invalid lvalue: {self.left.__class__.__name__}")
 
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> Self:
+        self.check_lvalue()
         left = self.left.resolve_identifiers(identifier_map, inside_func)
         right = self.right.resolve_identifiers(identifier_map, inside_func)
         return self.__class__(left, right)
@@ -248,56 +393,91 @@ class Binary(Expr, MappingHolder):
         self.left.typecheck(symbol_table, file_scope)
         self.right.typecheck(symbol_table, file_scope)
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.check_lvalue()
+        self.left.analyze(analysis)
+        self.right.analyze(analysis)
+
 
 # fmt: off
-class Multiply(Binary, tokentype=tok.Star(), precedence=50, tacky_type=tacky.Multiply): ...
-class Divide(Binary, tokentype=tok.ForwardSlash(), precedence=50, tacky_type=tacky.Divide): ...
-class Remainder(Binary, tokentype=tok.Percent(), precedence=50, tacky_type=tacky.Remainder): ...
-class Add(Binary, tokentype=tok.Plus(), precedence=45, tacky_type=tacky.Add): ...
-class Subtract(Binary, tokentype=tok.Hyphen(), precedence=45, tacky_type=tacky.Subtract): ...
-class LeftShift(Binary, tokentype=tok.LessLess(), precedence=40, tacky_type=tacky.LeftShift): ...
-class RightShift(Binary, tokentype=tok.GreaterGreater(), precedence=40, tacky_type=tacky.RightShift): ...
-class LessThan(Binary, tokentype=tok.Less(), precedence=35, tacky_type=tacky.LessThan): ...
-class LessOrEqual(Binary, tokentype=tok.LessEqual(), precedence=35, tacky_type=tacky.LessOrEqual): ...
-class GreaterThan(Binary, tokentype=tok.Greater(), precedence=35, tacky_type=tacky.GreaterThan): ...
-class GreaterOrEqual(Binary, tokentype=tok.GreaterEqual(), precedence=35, tacky_type=tacky.GreaterOrEqual): ...
-class Equal(Binary, tokentype=tok.EqualEqual(), precedence=30, tacky_type=tacky.Equal): ...
-class NotEqual(Binary, tokentype=tok.BangEqual(), precedence=30, tacky_type=tacky.NotEqual): ...
-class BitwiseAnd(Binary, tokentype=tok.Ampersand(), precedence=24, tacky_type=tacky.BitwiseAnd): ...
-class BitwiseXOr(Binary, tokentype=tok.Caret(), precedence=22, tacky_type=tacky.BitwiseXOr): ...
-class BitwiseOr(Binary, tokentype=tok.Bar(), precedence=20, tacky_type=tacky.BitwiseOr): ...
+class Multiply(Binary, tokentype=tok.Star(), precedence=50, tacky_type=tacky.Multiply):
+    __slots__ = ()
+class Divide(Binary, tokentype=tok.ForwardSlash(), precedence=50, tacky_type=tacky.Divide):
+    __slots__ = ()
+class Remainder(Binary, tokentype=tok.Percent(), precedence=50, tacky_type=tacky.Remainder):
+    __slots__ = ()
+class Add(Binary, tokentype=tok.Plus(), precedence=45, tacky_type=tacky.Add):
+    __slots__ = ()
+class Subtract(Binary, tokentype=tok.Hyphen(), precedence=45, tacky_type=tacky.Subtract):
+    __slots__ = ()
+class LeftShift(Binary, tokentype=tok.LessLess(), precedence=40, tacky_type=tacky.LeftShift):
+    __slots__ = ()
+class RightShift(Binary, tokentype=tok.GreaterGreater(), precedence=40, tacky_type=tacky.RightShift):
+    __slots__ = ()
+class LessThan(Binary, tokentype=tok.Less(), precedence=35, tacky_type=tacky.LessThan):
+    __slots__ = ()
+class LessOrEqual(Binary, tokentype=tok.LessEqual(), precedence=35, tacky_type=tacky.LessOrEqual):
+    __slots__ = ()
+class GreaterThan(Binary, tokentype=tok.Greater(), precedence=35, tacky_type=tacky.GreaterThan):
+    __slots__ = ()
+class GreaterOrEqual(Binary, tokentype=tok.GreaterEqual(), precedence=35, tacky_type=tacky.GreaterOrEqual):
+    __slots__ = ()
+class Equal(Binary, tokentype=tok.EqualEqual(), precedence=30, tacky_type=tacky.Equal):
+    __slots__ = ()
+class NotEqual(Binary, tokentype=tok.BangEqual(), precedence=30, tacky_type=tacky.NotEqual):
+    __slots__ = ()
+class BitwiseAnd(Binary, tokentype=tok.Ampersand(), precedence=24, tacky_type=tacky.BitwiseAnd):
+    __slots__ = ()
+class BitwiseXOr(Binary, tokentype=tok.Caret(), precedence=22, tacky_type=tacky.BitwiseXOr):
+    __slots__ = ()
+class BitwiseOr(Binary, tokentype=tok.Bar(), precedence=20, tacky_type=tacky.BitwiseOr):
+    __slots__ = ()
 # fmt: on
 
 
 class Assign(Binary, tokentype=tok.Equal(), precedence=1, associativity="right"):
+    __slots__ = ()
+
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         super().typecheck(symbol_table, file_scope)
 
 
 # fmt: off
-class AddAssign(Assign, tokentype=tok.PlusEqual(), precedence=1, compound_op=tacky.Add, associativity="right"): ...
-class MinusAssign(Assign, tokentype=tok.HyphenEqual(), precedence=1, compound_op=tacky.Subtract, associativity="right"): ...
-class MultiplyAssign(Assign, tokentype=tok.StarEqual(), precedence=1, compound_op=tacky.Multiply, associativity="right"): ...
-class DivideAssign(Assign, tokentype=tok.ForwardSlashEqual(), precedence=1, compound_op=tacky.Divide, associativity="right"): ...
-class RemainderAssign(Assign, tokentype=tok.PercentEqual(), precedence=1, compound_op=tacky.Remainder, associativity="right"): ...
-class AndAssign(Assign, tokentype=tok.AmpersandEqual(), precedence=1, compound_op=tacky.BitwiseAnd, associativity="right"): ...
-class OrAssign(Assign, tokentype=tok.BarEqual(), precedence=1, compound_op=tacky.BitwiseOr, associativity="right"): ...
-class XorAssign(Assign, tokentype=tok.CaretEqual(), precedence=1, compound_op=tacky.BitwiseXOr, associativity="right"): ...
-class LeftShiftAssign(Assign, tokentype=tok.LessLessEqual(), precedence=1, compound_op=tacky.LeftShift, associativity="right"): ...
-class RightShigfAssign(Assign, tokentype=tok.GreaterGreaterEqual(), precedence=1, compound_op=tacky.RightShift, associativity="right"): ...
+class AddAssign(Assign, tokentype=tok.PlusEqual(), precedence=1, compound_op=tacky.Add, associativity="right"):
+    __slots__ = ()
+class MinusAssign(Assign, tokentype=tok.HyphenEqual(), precedence=1, compound_op=tacky.Subtract, associativity="right"):
+    __slots__ = ()
+class MultiplyAssign(Assign, tokentype=tok.StarEqual(), precedence=1, compound_op=tacky.Multiply, associativity="right"):
+    __slots__ = ()
+class DivideAssign(Assign, tokentype=tok.ForwardSlashEqual(), precedence=1, compound_op=tacky.Divide, associativity="right"):
+    __slots__ = ()
+class RemainderAssign(Assign, tokentype=tok.PercentEqual(), precedence=1, compound_op=tacky.Remainder, associativity="right"):
+    __slots__ = ()
+class AndAssign(Assign, tokentype=tok.AmpersandEqual(), precedence=1, compound_op=tacky.BitwiseAnd, associativity="right"):
+    __slots__ = ()
+class OrAssign(Assign, tokentype=tok.BarEqual(), precedence=1, compound_op=tacky.BitwiseOr, associativity="right"):
+    __slots__ = ()
+class XorAssign(Assign, tokentype=tok.CaretEqual(), precedence=1, compound_op=tacky.BitwiseXOr, associativity="right"):
+    __slots__ = ()
+class LeftShiftAssign(Assign, tokentype=tok.LessLessEqual(), precedence=1, compound_op=tacky.LeftShift, associativity="right"):
+    __slots__ = ()
+class RightShigfAssign(Assign, tokentype=tok.GreaterGreaterEqual(), precedence=1, compound_op=tacky.RightShift, associativity="right"):
+    __slots__ = ()
 # fmt: on
 
 
 class And(Binary, tokentype=tok.AmpersandAmpersand(), precedence=10):
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
-        dst = tacky.Variable(make_temp_variable_name())
+    __slots__ = ()
+
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
+        dst = tacky.Variable(variables)
         false_label = make_label_name("and.false")
         end_label = make_label_name("and.end")
 
-        left = self.left.emit(instructions)
+        left = self.left.emit(instructions, variables)
         instructions.append(tacky.JumpIfZero(left, false_label))
 
-        right = self.right.emit(instructions)
+        right = self.right.emit(instructions, variables)
         instructions.extend(
             [
                 tacky.JumpIfZero(right, false_label),
@@ -316,15 +496,17 @@ class And(Binary, tokentype=tok.AmpersandAmpersand(), precedence=10):
 
 
 class Or(Binary, tokentype=tok.BarBar(), precedence=5):
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
-        dst = tacky.Variable(make_temp_variable_name())
+    __slots__ = ()
+
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
+        dst = tacky.Variable(variables)
         true_label = make_label_name("or.true")
         end_label = make_label_name("or.end")
 
-        left = self.left.emit(instructions)
+        left = self.left.emit(instructions, variables)
         instructions.append(tacky.JumpIfNotZero(left, true_label))
 
-        right = self.right.emit(instructions)
+        right = self.right.emit(instructions, variables)
         instructions.extend(
             [
                 tacky.JumpIfNotZero(right, true_label),
@@ -343,6 +525,8 @@ class Or(Binary, tokentype=tok.BarBar(), precedence=5):
 
 
 class Conditional(Binary, tokentype=tok.Question(), precedence=3):
+    __slots__ = ("middle",)
+
     def __init__(self, left: Expr, middle: Expr, right: Expr):
         super().__init__(left, right)
         self.middle = middle
@@ -353,20 +537,20 @@ class Conditional(Binary, tokentype=tok.Question(), precedence=3):
         right = repr(self.right)
         return f"{self.__class__.__name__}({left} ? {middle} : {right})"
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Conditional":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Conditional":
         left = self.left.resolve_identifiers(identifier_map, inside_func)
         middle = self.middle.resolve_identifiers(identifier_map, inside_func)
         right = self.right.resolve_identifiers(identifier_map, inside_func)
         return Conditional(left, middle, right)
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         end_label = make_label_name("end")
         else_label = make_label_name("else")
-        dst = tacky.Variable(make_temp_variable_name())
+        dst = tacky.Variable(variables)
 
-        cond = self.left.emit(instructions)
+        cond = self.left.emit(instructions, variables)
         instructions.append(tacky.JumpIfZero(cond, else_label))
-        then_val = self.middle.emit(instructions)
+        then_val = self.middle.emit(instructions, variables)
         instructions.extend(
             [
                 tacky.Copy(then_val, dst),
@@ -374,7 +558,7 @@ class Conditional(Binary, tokentype=tok.Question(), precedence=3):
                 tacky.Label(else_label),
             ]
         )
-        else_val = self.right.emit(instructions)
+        else_val = self.right.emit(instructions, variables)
         instructions.extend(
             [
                 tacky.Copy(else_val, dst),
@@ -388,16 +572,27 @@ class Conditional(Binary, tokentype=tok.Question(), precedence=3):
         super().typecheck(symbol_table, file_scope)
         self.middle.typecheck(symbol_table, file_scope)
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.left.analyze(analysis)
+        self.middle.analyze(analysis)
+        self.right.analyze(analysis)
+
 
 class FuncCall(Expr):
+    __slots__ = ("name", "args")
+
     def __init__(self, name: str, args: list[Expr]) -> None:
         self.name = name
         self.args = args
 
+    def __repr__(self) -> str:
+        args = ", ".join(map(repr, self.args))
+        return f"FuncCall({self.name}({args}))"
+
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> Self:
         return self
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "FuncCall":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "FuncCall":
         if self.name in identifier_map:
             unique_name = identifier_map[self.name]
             unique_args = []
@@ -409,14 +604,19 @@ class FuncCall(Expr):
     def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> Self:
         return self
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
-        args = [arg.emit(instructions) for arg in self.args]
-        dst = tacky.Variable(make_temp_variable_name())
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
+        args = [arg.emit(instructions, variables) for arg in self.args]
+        return self.emit_call(instructions, variables, args)
+
+    def emit_call(
+        self, instructions: list[tacky.Instruction], variables: VariableTable, args: list[tacky.Value]
+    ) -> tacky.Value:
+        dst = tacky.Variable(variables)
         instructions.append(tacky.FuncCall(self.name, args, dst))
         return dst
 
-    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
-        type_ = symbol_table[self.name]
+    def typecheck_call(self, symbol_table: SymbolTable) -> None:
+        type_ = symbol_table[self.name].type_
         if isinstance(type_, IntType):
             raise TypeCheckerError(f"variable {self.name} used as a function name")
 
@@ -426,20 +626,39 @@ class FuncCall(Expr):
                 f"function {self.name} called with wrong number of arguments: {len(type_.params)} != {len(self.args)}"
             )
 
+    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
+        self.typecheck_call(symbol_table)
         for arg in self.args:
             arg.typecheck(symbol_table, file_scope)
 
+    def analyze_call(self, analysis: Analysis) -> None:
+        if (entry := analysis.identifier_map.get(self.name)) is None:
+            raise ResolverError(f"undeclared function: {self.name}")
 
-class BlockItem(Emitter, Resolver, TypeChecker): ...
+        self.name = entry.name
+        self.typecheck_call(analysis.symbol_table)
+
+    def analyze(self, analysis: Analysis) -> None:
+        self.analyze_call(analysis)
+        for arg in self.args:
+            arg.analyze(analysis)
+
+
+class BlockItem(Emitter, Resolver, TypeChecker, Analyzer):
+    __slots__ = ()
 
 
 class Declaration(BlockItem, ToTacky):
+    __slots__ = ("name",)
+
     def __init__(self, name: str) -> None:
         super().__init__()
         self.name = name
 
 
 class VarDecl(Declaration):
+    __slots__ = ("expr", "type_", "storage_class")
+
     def __init__(
         self, name: str, expr: Expr | None, type_: tok.TypeSpecifier, storage_class: tok.StorageSpecifier | None
     ) -> None:
@@ -452,10 +671,10 @@ class VarDecl(Declaration):
         expr = repr(self.expr)
         return f"VariableleDeclaration({self.name} = {expr} {self.storage_class})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         if self.expr is not None and self.storage_class is None:
-            v = self.expr.emit(instructions)
-            instructions.append(tacky.Copy(v, tacky.Variable(self.name)))
+            v = self.expr.emit(instructions, variables)
+            instructions.append(tacky.Copy(v, tacky.Variable(variables, self.name)))
         return tacky.Null()
 
     def to_tacky(self, symbol_table: SymbolTable) -> tacky.Variable | None:
@@ -463,31 +682,32 @@ class VarDecl(Declaration):
             case attrs if isinstance(attrs, StaticAttrs):
                 return None
             case attrs if isinstance(attrs, LocalAttrs):
-                return tacky.Variable(self.name)
+                # outside any function, so in a table of its own
+                return tacky.Variable(VariableTable(), self.name)
             case _:
                 Unreachable()
 
-    def resolve_identifiers_file_scope(self, identifier_map: dict[str, MapEntry]) -> "VarDecl":
-        identifier_map[self.name] = MapEntry(self.name, True, True)
+    def resolve_identifiers_file_scope(self, identifier_map: Scope) -> "VarDecl":
+        identifier_map[self.name] = MapEntry(self.name, True)
         return self
 
-    def resolve_identifiers_block_scope(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "VarDecl":
-        if self.name in identifier_map:
-            prev_entry = identifier_map[self.name]
-            if prev_entry.from_current_scope:
-                if not (prev_entry.has_linkage and self.storage_class is tok.Extern()):
-                    raise ResolverError(f"conflicting local definitions for {self.name}")
+    def check_redeclaration(self, identifier_map: Scope) -> None:
+        if (prev_entry := identifier_map.current(self.name)) is not None:
+            if not (prev_entry.has_linkage and self.storage_class is tok.Extern()):
+                raise ResolverError(f"conflicting local definitions for {self.name}")
 
+    def resolve_identifiers_block_scope(self, identifier_map: Scope, inside_func: bool) -> "VarDecl":
+        self.check_redeclaration(identifier_map)
         if self.storage_class is tok.Extern():
-            identifier_map[self.name] = MapEntry(self.name, True, True)
+            identifier_map[self.name] = MapEntry(self.name, True)
             return self
         else:
             unique_name = make_variable_name(self.name)
-            identifier_map[self.name] = MapEntry(unique_name, True, False)
+            identifier_map[self.name] = MapEntry(unique_name)
             init = self.expr.resolve_identifiers(identifier_map, inside_func) if self.expr is not None else None
             return VarDecl(unique_name, init, self.type_, self.storage_class)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "VarDecl":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "VarDecl":
         if inside_func:
             return self.resolve_identifiers_block_scope(identifier_map, inside_func)
         else:
@@ -521,10 +741,9 @@ class VarDecl(Declaration):
             if not isinstance(old_decl.attrs, StaticAttrs):
                 raise TypeCheckerError(f"cannot redeclare function {self.name} as file-scope variable")
 
-            if not isinstance(old_decl, IntType):
+            if not isinstance(old_decl.type_, IntType):
                 raise TypeCheckerError(f"function {self.name} redefined as variable")
 
-            assert isinstance(old_decl, IntType)
             if self.storage_class is tok.Extern():
                 globl = old_decl.attrs.globl
             elif old_decl.attrs.globl != globl:
@@ -538,8 +757,7 @@ class VarDecl(Declaration):
             elif not isinstance(initial_value, Initial) and old_decl.attrs.initial_value == Tentative():
                 initial_value = Tentative()
 
-        attrs = StaticAttrs(initial_value, globl)
-        symbol_table[self.name] = IntType(attrs)
+        symbol_table[self.name] = Symbol(IntType(), StaticAttrs(initial_value, globl))
 
     def typecheck_block_scope(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         assert not file_scope
@@ -549,10 +767,10 @@ class VarDecl(Declaration):
                 raise TypeCheckerError(f"initializer on local extern variable declaration for {self.name}")
             elif self.name in symbol_table:
                 old_decl = symbol_table[self.name]
-                if not isinstance(old_decl, IntType):
+                if not isinstance(old_decl.type_, IntType):
                     raise TypeCheckerError(f"function {self.name} redecalred as variable")
             else:
-                symbol_table[self.name] = IntType(StaticAttrs(NoInitializer(), True))
+                symbol_table[self.name] = Symbol(IntType(), StaticAttrs(NoInitializer(), True))
 
         elif self.storage_class is tok.Static():
             if isinstance(self.expr, Constant):
@@ -561,9 +779,9 @@ class VarDecl(Declaration):
                 initial_value = Initial(0)
             else:
                 raise TypeCheckerError(f"non-constant initializer on local static variable {self.name}")
-            symbol_table[self.name] = IntType(StaticAttrs(initial_value, False))
+            symbol_table[self.name] = Symbol(IntType(), StaticAttrs(initial_value, False))
         else:
-            symbol_table[self.name] = IntType(LocalAttrs())
+            symbol_table[self.name] = local_int
             if self.expr is not None:
                 self.expr.typecheck(symbol_table, file_scope)
 
@@ -573,8 +791,54 @@ class VarDecl(Declaration):
         else:
             self.typecheck_block_scope(symbol_table, file_scope)
 
+    def analyze_declaration(self, analysis: Analysis) -> bool:
+        # true when the initializer is left to analyze
+        identifier_map = analysis.identifier_map
+        if not analysis.inside_func:
+            self.resolve_identifiers_file_scope(identifier_map)
+            self.typecheck_file_scope(analysis.symbol_table, True)
+            return False
+
+        self.check_redeclaration(identifier_map)
+        if self.storage_class is tok.Extern():
+            identifier_map[self.name] = MapEntry(self.name, True)
+            self.typecheck_block_scope(analysis.symbol_table, False)
+            return False
+
+        name = self.name
+        self.name = make_variable_name(name)
+        identifier_map[name] = MapEntry(self.name)
+        if self.storage_class is None:
+            # declared before the initializer is checked, so it may refer to itself
+            analysis.symbol_table[self.name] = local_int
+            return self.expr is not None
+
+        if self.expr is not None and not isinstance(self.expr, Constant):
+            # undefined names in a non-constant initializer are reported first, as by resolve()
+            self.expr = self.expr.resolve_identifiers(identifier_map, True)
+        self.typecheck_block_scope(analysis.symbol_table, False)
+        return False
+
+    def analyze(self, analysis: Analysis) -> None:
+        if self.analyze_declaration(analysis):
+            assert self.expr is not None
+            self.expr.analyze(analysis)
+
+
+class LazyBody:
+    """A function body the parser skipped by brace matching, parsed when first needed."""
+
+    __slots__ = ("parse", "names")
+
+    def __init__(self, parse: Callable[[], "Block"], names: set[str]) -> None:
+        self.parse = parse
+        # every identifier in the body, a superset of the functions it calls
+        self.names = names
+
 
 class FuncDecl(Declaration):
+    __slots__ = ("params", "_body", "lazy_body", "type_", "storage_class")
+
     def __init__(
         self,
         name: str,
@@ -582,95 +846,130 @@ class FuncDecl(Declaration):
         body: "Block | None",
         type_: tok.TypeSpecifier,
         storage_class: tok.StorageSpecifier | None,
+        lazy_body: LazyBody | None = None,
     ) -> None:
         super().__init__(name)
         self.params = params
-        self.body = body
+        self._body = body
+        self.lazy_body = lazy_body
         self.type_ = type_
         self.storage_class = storage_class
 
+    @property
+    def body(self) -> "Block | None":
+        if self._body is None and self.lazy_body is not None:
+            self._body = self.lazy_body.parse()
+        return self._body
+
+    @property
+    def has_body(self) -> bool:
+        # a definition, without parsing a lazy body
+        return self._body is not None or self.lazy_body is not None
+
     def __repr__(self) -> str:
-        body = "" if self.body is None else repr(self.body)
+        if not self.has_body:
+            body = ""
+        elif self._body is None:
+            body = "{ ... }"
+        else:
+            body = repr(self._body)
         return f"{self.name}\n{body}"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         # called when a function is defined below the top-level
-        assert self.body is None
+        assert not self.has_body
         return tacky.Null()
 
-    def to_tacky(self, symbol_table) -> tacky.FuncDecl | None:
+    def to_tacky(self, symbol_table, explicit_stack: bool = False) -> tacky.FuncDecl | None:
         # called when a function is defined at the top-level
         if self.body is None:
             return None
 
-        params = [tacky.Variable(param.name) for param in self.params]
+        # variables made while emitting the body are numbered in a table of their own
+        variables = VariableTable(symbol_table)
+        params = [tacky.Variable(variables, param.name) for param in self.params]
         assert isinstance((attrs := symbol_table[self.name].attrs), FuncAttrs)
 
         # if self.body is None:
         #     return tacky.FuncDecl(self.name, attrs.globl, params, [])
 
         instructions: list[tacky.Instruction] = []
-        for block_item in self.body.items:
-            _ = block_item.emit(instructions)
+        if explicit_stack:
+            emit_explicit_stack(self.body, instructions, variables)
+        else:
+            for block_item in self.body.items:
+                _ = block_item.emit(instructions, variables)
         instructions.append(tacky.Return(tacky.Constant(0)))
-        return tacky.FuncDecl(self.name, attrs.globl, params, instructions)
+        return tacky.FuncDecl(self.name, attrs.globl, params, instructions, variables)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "FuncDecl":
-        if inside_func and self.body is not None:
+    def declare(self, identifier_map: Scope, inside_func: bool) -> None:
+        if inside_func and self.has_body:
             raise ResolverError(f"cannot define function {self.name} inside function")
 
         if inside_func and self.storage_class is tok.Static():
             raise ResolverError(f"function {self.name} in block scope cannot be static")
 
-        if self.name in identifier_map:
-            prev_entry = identifier_map[self.name]
-            if prev_entry.from_current_scope and not prev_entry.has_linkage:
-                raise ResolverError(f"duplication function definition: {self.name}")
+        if (prev_entry := identifier_map.current(self.name)) is not None and not prev_entry.has_linkage:
+            raise ResolverError(f"duplication function definition: {self.name}")
 
-        identifier_map[self.name] = MapEntry(self.name, True, True)
-
-        inner_identifier_map = self.copy_variable_map(identifier_map)
+        identifier_map[self.name] = MapEntry(self.name, True)
 
+    def resolve_params(self, inner_identifier_map: Scope) -> list[Variable]:
         params = []
         for param in self.params:
             # function parameters are like variable declarations inside function scope
             var_decl = VarDecl(param.name, None, tok.Int(), None).resolve_identifiers(inner_identifier_map, True)
             params.append(Variable.from_str(var_decl.name))
+        return params
+
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "FuncDecl":
+        self.declare(identifier_map, inside_func)
+
+        inner_identifier_map = identifier_map.child()
+        params = self.resolve_params(inner_identifier_map)
         body = None if self.body is None else self.body.resolve_identifiers(inner_identifier_map, True)
 
         return FuncDecl(self.name, params, body, self.type_, self.storage_class)
 
-    def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> "FuncDecl":
-        body = None if self.body is None else self.body.resolve_goto_labels(labels, self.name)
+    def skip_body(self, identifier_map: Scope, symbol_table: SymbolTable) -> "FuncDecl":
+        # an unused lazy definition: its name is declared and defined, so a second definition is still an error,
+        # but the body is never parsed and nothing inside it is diagnosed
+        self.declare(identifier_map, False)
+        self.typecheck_declaration(symbol_table)
+        return FuncDecl(self.name, self.params, None, self.type_, self.storage_class)
 
+    def check_goto_labels(self, labels: dict[str, bool]) -> None:
         for label, defined in labels.items():
             if not defined:
                 raise ResolverError(f"goto undefined label: {label}")
 
+    def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> "FuncDecl":
+        body = None if self.body is None else self.body.resolve_goto_labels(labels, self.name)
+        self.check_goto_labels(labels)
         return FuncDecl(self.name, self.params, body, self.type_, self.storage_class)
 
     def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "FuncDecl":
         body = None if self.body is None else self.body.resolve_loop_labels(labels, self.name, switch_context)
         return FuncDecl(self.name, self.params, body, self.type_, self.storage_class)
 
-    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
-        params: list[Type] = [IntType(LocalAttrs()) for _ in self.params]
-        has_body = self.body is not None
+    def typecheck_declaration(self, symbol_table: SymbolTable) -> None:
+        type_ = FuncType((IntType(),) * len(self.params))
+        has_body = self.has_body
         already_defined = False
         globl = not isinstance(self.storage_class, tok.Static)
 
         if self.name in symbol_table:
             old_decl = symbol_table[self.name]
 
-            if not isinstance(old_decl, FuncType):
+            if not isinstance((old_type := old_decl.type_), FuncType):
                 raise TypeCheckerError(f"incompatible function declarations for: {self.name}")
-            elif len(old_decl.params) != len(params):
+            elif len(old_type.params) != len(type_.params):
                 raise TypeCheckerError(
-                    f"function {self.name} redefined from {len(old_decl.params)} to {len(params)} parameters"
+                    f"function {self.name} redefined from {len(old_type.params)} to {len(type_.params)} parameters"
                 )
-            elif old_decl.params != params:
-                old_params = " ".join(map(repr, old_decl.params))
-                new_params = " ".join(map(repr, params))
+            elif old_type is not type_:
+                old_params = " ".join(map(repr, old_type.params))
+                new_params = " ".join(map(repr, type_.params))
                 raise TypeCheckerError(
                     f"function {self.name} defined with different params: ({old_params}) != ({new_params})"
                 )
@@ -690,31 +989,59 @@ class FuncDecl(Declaration):
             globl = old_decl.attrs.globl
 
         defined = already_defined or has_body
-        attrs = FuncAttrs(defined, globl)
-        symbol_table[self.name] = FuncType(params, has_body or already_defined, attrs)
-        if has_body:
-            for param in self.params:
-                symbol_table[param.name] = IntType(LocalAttrs())
+        symbol_table[self.name] = Symbol(type_, FuncAttrs(defined, globl))
+
+    def typecheck_body(self, symbol_table: SymbolTable, file_scope: bool) -> None:
+        for param in self.params:
+            symbol_table[param.name] = local_int
+        assert self.body is not None
+        self.body.typecheck(symbol_table, file_scope)
+
+    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
+        self.typecheck_declaration(symbol_table)
+        if self.has_body:
+            self.typecheck_body(symbol_table, file_scope)
+
+    def analyze_declaration(self, analysis: Analysis) -> Analysis | None:
+        # the analysis of the body of a definition
+        self.declare(analysis.identifier_map, analysis.inside_func)
+
+        inner_identifier_map = analysis.identifier_map.child()
+        self.params = self.resolve_params(inner_identifier_map)
+        self.typecheck_declaration(analysis.symbol_table)
+        if not self.has_body:
+            return None
+
+        for param in self.params:
+            analysis.symbol_table[param.name] = local_int
+        return Analysis(analysis.symbol_table, inner_identifier_map, True, self.name)
+
+    def analyze(self, analysis: Analysis) -> None:
+        if (function := self.analyze_declaration(analysis)) is not None:
             assert self.body is not None
-            self.body.typecheck(symbol_table, file_scope)
+            self.body.analyze(function)
+            self.check_goto_labels(function.goto_labels)
 
 
-class Stmt(BlockItem): ...
+class Stmt(BlockItem):
+    __slots__ = ()
 
 
 class Block(Stmt):
+    __slots__ = ("items",)
+
     def __init__(self, items: list[BlockItem]) -> None:
         self.items = items
 
     def __repr__(self) -> str:
         return "\n" + "\n".join("        " + repr(item) for item in self.items)
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         for item in self.items:
-            _ = item.emit(instructions)
+            _ = item.emit(instructions, variables)
         return tacky.Null()
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Block":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Block":
         items = [item.resolve_identifiers(identifier_map, inside_func) for item in self.items]
         return Block(items)
 
@@ -729,8 +1056,14 @@ class Block(Stmt):
         for item in self.items:
             item.typecheck(symbol_table, False)
 
+    def analyze(self, analysis: Analysis) -> None:
+        for item in self.items:
+            item.analyze(analysis)
+
 
 class Return(Stmt):
+    __slots__ = ("expr",)
+
     def __init__(self, expr: Expr) -> None:
         self.expr = expr
 
@@ -738,12 +1071,12 @@ class Return(Stmt):
         expr = repr(self.expr)
         return f"Return({expr})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
-        dst = self.expr.emit(instructions)
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
+        dst = self.expr.emit(instructions, variables)
         instructions.append(tacky.Return(dst))
         return dst
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Return":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Return":
         return Return(self.expr.resolve_identifiers(identifier_map, inside_func))
 
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> Self:
@@ -755,8 +1088,13 @@ class Return(Stmt):
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         self.expr.typecheck(symbol_table, file_scope)
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.expr.analyze(analysis)
+
 
 class Expression(Stmt):
+    __slots__ = ("expr",)
+
     def __init__(self, expr: Expr) -> None:
         self.expr = expr
 
@@ -764,10 +1102,10 @@ class Expression(Stmt):
         expr = repr(self.expr)
         return f"Expression({expr})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
-        return self.expr.emit(instructions)
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
+        return self.expr.emit(instructions, variables)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Expression":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Expression":
         return Expression(self.expr.resolve_identifiers(identifier_map, inside_func))
 
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> Self:
@@ -779,8 +1117,13 @@ class Expression(Stmt):
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         self.expr.typecheck(symbol_table, file_scope)
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.expr.analyze(analysis)
+
 
 class If(Stmt):
+    __slots__ = ("cond", "then", "else_")
+
     def __init__(self, cond: Expr, then: Stmt, else_: Stmt | None) -> None:
         self.cond = cond
         self.then = then
@@ -792,12 +1135,12 @@ class If(Stmt):
         else_ = None if self.else_ is None else repr(self.else_)
         return f"If({cond} ? {then} : {else_})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         end_label = make_label_name("end")
         else_label = make_label_name("else")
-        cond = self.cond.emit(instructions)
+        cond = self.cond.emit(instructions, variables)
         instructions.append(tacky.JumpIfZero(cond, else_label))
-        _ = self.then.emit(instructions)
+        _ = self.then.emit(instructions, variables)
         instructions.extend(
             [
                 tacky.Jump(end_label),
@@ -805,11 +1148,11 @@ class If(Stmt):
             ]
         )
         if self.else_ is not None:
-            _ = self.else_.emit(instructions)
+            _ = self.else_.emit(instructions, variables)
         instructions.append(tacky.Label(end_label))
         return tacky.Null()
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "If":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "If":
         cond = self.cond.resolve_identifiers(identifier_map, inside_func)
         then = self.then.resolve_identifiers(identifier_map, inside_func)
         else_ = None if self.else_ is None else self.else_.resolve_identifiers(identifier_map, inside_func)
@@ -830,8 +1173,16 @@ class If(Stmt):
         self.then.typecheck(symbol_table, file_scope)
         self.else_.typecheck(symbol_table, file_scope) if self.else_ is not None else ...
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.cond.analyze(analysis)
+        self.then.analyze(analysis)
+        if self.else_ is not None:
+            self.else_.analyze(analysis)
+
 
 class Label(Stmt):
+    __slots__ = ("name", "stmt")
+
     def __init__(self, name: str, stmt: Stmt) -> None:
         self.name = name
         self.stmt = stmt
@@ -839,12 +1190,12 @@ class Label(Stmt):
     def __repr__(self) -> str:
         return f"Label({self.name})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         instructions.append(tacky.Label(self.name))
-        _ = self.stmt.emit(instructions)
+        _ = self.stmt.emit(instructions, variables)
         return tacky.Null()
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Label":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Label":
         stmt = self.stmt.resolve_identifiers(identifier_map, inside_func)
         return Label(self.name, stmt)
 
@@ -867,19 +1218,31 @@ class Label(Stmt):
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         self.stmt.typecheck(symbol_table, file_scope)
 
+    def add_label(self, analysis: Analysis) -> None:
+        self.name = self.mangle_label(self.name, analysis.function_name)
+        if analysis.goto_labels.get(self.name):
+            raise ResolverError(f"label already used: {self.name}")
+        analysis.goto_labels[self.name] = True
+
+    def analyze(self, analysis: Analysis) -> None:
+        self.add_label(analysis)
+        self.stmt.analyze(analysis)
+
 
 class Goto(Stmt):
+    __slots__ = ("target",)
+
     def __init__(self, target: str) -> None:
         self.target = target
 
     def __repr__(self) -> str:
         return f"Goto({self.target})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         instructions.append(tacky.Jump(self.target))
         return tacky.Null()
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> Self:
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> Self:
         return self
 
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> "Goto":
@@ -895,19 +1258,25 @@ class Goto(Stmt):
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         pass
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.target = self.mangle_label(self.target, analysis.function_name)
+        analysis.goto_labels.setdefault(self.target, False)
+
 
 class Compound(Stmt):
+    __slots__ = ("block",)
+
     def __init__(self, block: Block) -> None:
         self.block = block
 
     def __repr__(self) -> str:
         return f"Block({self.block})"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
-        return self.block.emit(instructions)
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
+        return self.block.emit(instructions, variables)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Compound":
-        inner_identifier_map = self.copy_variable_map(identifier_map)
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Compound":
+        inner_identifier_map = identifier_map.child()
         return Compound(self.block.resolve_identifiers(inner_identifier_map, inside_func))
 
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> "Compound":
@@ -919,8 +1288,16 @@ class Compound(Stmt):
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         self.block.typecheck(symbol_table, file_scope)
 
+    def analyze(self, analysis: Analysis) -> None:
+        identifier_map = analysis.identifier_map
+        analysis.identifier_map = identifier_map.child()
+        self.block.analyze(analysis)
+        analysis.identifier_map = identifier_map
+
 
 class Break(Stmt):
+    __slots__ = ("label",)
+
     def __init__(self, label: str | None = None) -> None:
         self.label = label
 
@@ -928,7 +1305,7 @@ class Break(Stmt):
         label = "" if self.label is None else self.label
         return f"Break({label})"
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> Self:
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> Self:
         return self
 
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> Self:
@@ -939,7 +1316,7 @@ class Break(Stmt):
             raise ResolverError("break statement outside of loop")
         return Break(labels[-1])
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         assert self.label is not None
         instructions.append(tacky.Jump(f"__break__{self.label}"))
         return tacky.Null()
@@ -947,8 +1324,13 @@ class Break(Stmt):
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         pass
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.label = self.resolve_loop_labels(analysis.loop_labels, analysis.function_name, None).label
+
 
 class Continue(Stmt):
+    __slots__ = ("label",)
+
     def __init__(self, label: str | None = None) -> None:
         self.label = label
 
@@ -956,7 +1338,7 @@ class Continue(Stmt):
         label = "" if self.label is None else self.label
         return f"Continue({label})"
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> Self:
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> Self:
         return self
 
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> Self:
@@ -980,7 +1362,7 @@ class Continue(Stmt):
         assert label is not None
         return Continue(label)
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         assert self.label is not None
         instructions.append(tacky.Jump(f"__continue__{self.label}"))
         return tacky.Null()
@@ -988,8 +1370,13 @@ class Continue(Stmt):
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         pass
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.label = self.resolve_loop_labels(analysis.loop_labels, analysis.function_name, None).label
+
 
 class While(Stmt):
+    __slots__ = ("cond", "body", "labels")
+
     def __init__(self, cond: Expr, body: Stmt, labels: list[str] = []) -> None:
         self.cond = cond
         self.body = body
@@ -1004,7 +1391,7 @@ class While(Stmt):
           {body.replace("\n", "\n        ")}
         ) """.strip()
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "While":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "While":
         cond = self.cond.resolve_identifiers(identifier_map, inside_func)
         body = self.body.resolve_identifiers(identifier_map, inside_func)
         return While(cond, body)
@@ -1014,20 +1401,21 @@ class While(Stmt):
         return While(self.cond, body)
 
     def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "While":
-        current_labels = labels + [make_label_name(f"while.{function_name}")]
-        body = self.body.resolve_loop_labels(current_labels, function_name, switch_context)
-        return While(self.cond, body, current_labels)
+        labels.append(label := make_label_name(f"while.{function_name}"))
+        body = self.body.resolve_loop_labels(labels, function_name, switch_context)
+        labels.pop()
+        return While(self.cond, body, [label])
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         assert len(self.labels) > 0
         curent_label = self.labels[-1]
         continue_ = tacky.Label(f"__continue__{curent_label}")
         break_ = tacky.Label(f"__break__{curent_label}")
 
         instructions.append(continue_)
-        dst = self.cond.emit(instructions)
+        dst = self.cond.emit(instructions, variables)
         instructions.append(tacky.JumpIfZero(dst, break_.label))
-        _ = self.body.emit(instructions)
+        _ = self.body.emit(instructions, variables)
         instructions.extend(
             [
                 tacky.Jump(continue_.label),
@@ -1041,8 +1429,16 @@ class While(Stmt):
         self.cond.typecheck(symbol_table, file_scope)
         self.body.typecheck(symbol_table, file_scope)
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.cond.analyze(analysis)
+        self.labels = [analysis.push_loop_label("while")]
+        self.body.analyze(analysis)
+        analysis.loop_labels.pop()
+
 
 class DoWhile(Stmt):
+    __slots__ = ("cond", "body", "labels")
+
     def __init__(self, cond: Expr, body: Stmt, labels: list[str] = []) -> None:
         self.cond = cond
         self.body = body
@@ -1057,7 +1453,7 @@ class DoWhile(Stmt):
           {body.replace("\n", "\n        ")}
         ) While ({cond})""".strip()
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "DoWhile":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "DoWhile":
         cond = self.cond.resolve_identifiers(identifier_map, inside_func)
         body = self.body.resolve_identifiers(identifier_map, inside_func)
         return DoWhile(cond, body)
@@ -1067,11 +1463,12 @@ class DoWhile(Stmt):
         return DoWhile(self.cond, body)
 
     def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "DoWhile":
-        current_labels = labels + [make_label_name(f"dowhile.{function_name}")]
-        body = self.body.resolve_loop_labels(current_labels, function_name, switch_context)
-        return DoWhile(self.cond, body, current_labels)
+        labels.append(label := make_label_name(f"dowhile.{function_name}"))
+        body = self.body.resolve_loop_labels(labels, function_name, switch_context)
+        labels.pop()
+        return DoWhile(self.cond, body, [label])
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         assert len(self.labels) > 0
         current_label = self.labels[-1]
         start = tacky.Label(f"__start__{current_label}")
@@ -1079,9 +1476,9 @@ class DoWhile(Stmt):
         break_ = tacky.Label(f"__break__{current_label}")
 
         instructions.append(start)
-        _ = self.body.emit(instructions)
+        _ = self.body.emit(instructions, variables)
         instructions.append(continue_)
-        dst = self.cond.emit(instructions)
+        dst = self.cond.emit(instructions, variables)
         instructions.extend(
             [
                 tacky.JumpIfNotZero(dst, start.label),
@@ -1094,8 +1491,16 @@ class DoWhile(Stmt):
         self.cond.typecheck(symbol_table, file_scope)
         self.body.typecheck(symbol_table, file_scope)
 
+    def analyze(self, analysis: Analysis) -> None:
+        self.cond.analyze(analysis)
+        self.labels = [analysis.push_loop_label("dowhile")]
+        self.body.analyze(analysis)
+        analysis.loop_labels.pop()
+
 
 class For(Stmt):
+    __slots__ = ("init", "cond", "post", "body", "labels")
+
     def __init__(
         self,
         init: Expr | Declaration | None,
@@ -1125,8 +1530,8 @@ class For(Stmt):
           {body.replace("\n", "\n        ")}
         )""".strip()
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "For":
-        new_identifier_map = self.copy_variable_map(identifier_map)
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "For":
+        new_identifier_map = identifier_map.child()
         init = None if self.init is None else self.init.resolve_identifiers(new_identifier_map, inside_func)
         cond = None if self.cond is None else self.cond.resolve_identifiers(new_identifier_map, inside_func)
         post = None if self.post is None else self.post.resolve_identifiers(new_identifier_map, inside_func)
@@ -1138,11 +1543,12 @@ class For(Stmt):
         return For(self.init, self.cond, self.post, body)
 
     def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "For":
-        current_labels = labels + [make_label_name(f"for.{function_name}")]
-        body = self.body.resolve_loop_labels(current_labels, function_name, switch_context)
-        return For(self.init, self.cond, self.post, body, current_labels)
+        labels.append(label := make_label_name(f"for.{function_name}"))
+        body = self.body.resolve_loop_labels(labels, function_name, switch_context)
+        labels.pop()
+        return For(self.init, self.cond, self.post, body, [label])
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         assert len(self.labels) > 0
         current_label = self.labels[-1]
         start = tacky.Label(f"__start__{current_label}")
@@ -1150,15 +1556,15 @@ class For(Stmt):
         break_ = tacky.Label(f"__break__{current_label}")
 
         if self.init is not None:
-            _ = self.init.emit(instructions)
+            _ = self.init.emit(instructions, variables)
         instructions.append(start)
         if self.cond is not None:
-            dst = self.cond.emit(instructions)
+            dst = self.cond.emit(instructions, variables)
             instructions.append(tacky.JumpIfZero(dst, break_.label))
-        _ = self.body.emit(instructions)
+        _ = self.body.emit(instructions, variables)
         instructions.append(continue_)
         if self.post is not None:
-            _ = self.post.emit(instructions)
+            _ = self.post.emit(instructions, variables)
         instructions.extend(
             [
                 tacky.Jump(start.label),
@@ -1168,20 +1574,38 @@ class For(Stmt):
 
         return tacky.Null()
 
-    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
-        self.init.typecheck(symbol_table, file_scope) if self.init is not None else ...
+    def check_init(self, symbol_table: SymbolTable) -> None:
         if isinstance(self.init, Declaration):
             assert not isinstance(self.init, FuncDecl)
-            assert not isinstance((init := symbol_table[self.init.name]), FuncType)
-            if not isinstance(init.attrs, LocalAttrs):
+            if not isinstance(symbol_table[self.init.name].attrs, LocalAttrs):
                 raise TypeCheckerError(f"cannot apply storage-class specifiers in for loop init for {self.init}")
 
+    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
+        self.init.typecheck(symbol_table, file_scope) if self.init is not None else ...
+        self.check_init(symbol_table)
+
         self.cond.typecheck(symbol_table, file_scope) if self.cond is not None else ...
         self.body.typecheck(symbol_table, file_scope)
         self.post.typecheck(symbol_table, file_scope) if self.post is not None else ...
 
+    def analyze(self, analysis: Analysis) -> None:
+        identifier_map = analysis.identifier_map
+        analysis.identifier_map = identifier_map.child()
+        if self.init is not None:
+            self.init.analyze(analysis)
+            self.check_init(analysis.symbol_table)
+        self.cond.analyze(analysis) if self.cond is not None else ...
+        self.post.analyze(analysis) if self.post is not None else ...
+
+        self.labels = [analysis.push_loop_label("for")]
+        self.body.analyze(analysis)
+        analysis.loop_labels.pop()
+        analysis.identifier_map = identifier_map
+
 
 class Switch(Stmt):
+    __slots__ = ("condition", "body", "labels")
+
     def __init__(self, condition: Expr, body: Stmt, labels: list[str] = []) -> None:
         self.condition = condition
         self.body = body
@@ -1193,12 +1617,12 @@ class Switch(Stmt):
             {repr(self.body).replace("\n", "\n        ")}
         """.strip()
 
-    def typecheck(self, symbol_table: dict[str, IntType | FuncType], file_scope: bool) -> None:
+    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         self.condition.typecheck(symbol_table, file_scope)
         self.body.typecheck(symbol_table, file_scope)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Switch":
-        new_identifier_map = self.copy_variable_map(identifier_map)
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Switch":
+        new_identifier_map = identifier_map.child()
         condition = self.condition.resolve_identifiers(new_identifier_map, inside_func)
         body = self.body.resolve_identifiers(new_identifier_map, inside_func)
         return Switch(condition, body)
@@ -1208,17 +1632,38 @@ class Switch(Stmt):
         return Switch(self.condition, body)
 
     def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "Switch":
-        current_labels = labels + [make_label_name(f"__switch__.{function_name}")]
-        body = self.body.resolve_loop_labels(current_labels, function_name, set())
-        return Switch(self.condition, body, current_labels)
+        labels.append(label := make_label_name(f"__switch__.{function_name}"))
+        body = self.body.resolve_loop_labels(labels, function_name, set())
+        labels.pop()
+        return Switch(self.condition, body, [label])
+
+    def analyze(self, analysis: Analysis) -> None:
+        identifier_map, switch_context = analysis.identifier_map, analysis.switch_context
+        analysis.identifier_map = identifier_map.child()
+        self.condition.analyze(analysis)
+
+        self.labels = [analysis.push_loop_label("__switch__")]
+        analysis.switch_context = set()
+        self.body.analyze(analysis)
+        analysis.loop_labels.pop()
+        analysis.identifier_map, analysis.switch_context = identifier_map, switch_context
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
 
-        cond_dst = self.condition.emit(instructions)
+        cond_dst = self.condition.emit(instructions, variables)
 
         instrs: list[tacky.Instruction] = []
-        _ = self.body.emit(instrs)
+        _ = self.body.emit(instrs, variables)
+        return self.emit_cases(instructions, variables, cond_dst, instrs)
 
+    def emit_cases(
+        self,
+        instructions: list[tacky.Instruction],
+        variables: VariableTable,
+        cond_dst: tacky.Value,
+        instrs: list[tacky.Instruction],
+    ) -> tacky.Value:
+        # the jumps to the cases, then the body emitted into instrs with its placeholders replaced by labels
         assert len(self.labels) > 0
         break_ = tacky.Label(f"__break__{self.labels[-1]}")
 
@@ -1233,7 +1678,7 @@ class Switch(Stmt):
 
         for case_value, case_label in values_and_labels:
             if case_value is not None:
-                dst = tacky.Variable(make_temp_variable_name())
+                dst = tacky.Variable(variables)
                 instructions.extend(
                     [
                         tacky.NotEqual(cond_dst, case_value, dst),
@@ -1251,6 +1696,8 @@ class Switch(Stmt):
 
 
 class Case(Stmt):
+    __slots__ = ("value", "body")
+
     def __init__(self, value: Expr, body: Stmt) -> None:
         self.value = value
         self.body = body
@@ -1261,13 +1708,16 @@ class Case(Stmt):
             {repr(self.body).replace("\n", "\n        ")}
         """.strip()
 
-    def typecheck(self, symbol_table: dict[str, IntType | FuncType], file_scope: bool) -> None:
+    def check_constant(self) -> None:
         if not isinstance(self.value, Constant):
             raise TypeCheckerError(f"case values must be constant, got: {self.value}")
+
+    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
+        self.check_constant()
         self.value.typecheck(symbol_table, file_scope)
         self.body.typecheck(symbol_table, file_scope)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Case":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Case":
         value = self.value.resolve_identifiers(identifier_map, inside_func)
         body = self.body.resolve_identifiers(identifier_map, inside_func)
         return Case(value, body)
@@ -1276,7 +1726,7 @@ class Case(Stmt):
         body = self.body.resolve_goto_labels(labels, function_name)
         return Case(self.value, body)
 
-    def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "Case":
+    def add_case(self, switch_context: set[str] | None) -> None:
         if switch_context is None:
             raise ResolverError("cannot have case statement outside of a switch")
         elif (value_str := str(self.value)) in switch_context:
@@ -1284,17 +1734,31 @@ class Case(Stmt):
         else:
             switch_context.add(value_str)
 
+    def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "Case":
+        self.add_case(switch_context)
         body = self.body.resolve_loop_labels(labels, function_name, switch_context)
         return Case(self.value, body)
 
-    def emit(self, instructions: list[tacky.Instruction]) -> object:
-        value = self.value.emit(instructions)
+    def analyze_value(self, analysis: Analysis) -> None:
+        # only resolved, a valid value is a constant and there is nothing to typecheck
+        self.value = self.value.resolve_identifiers(analysis.identifier_map, True)
+        self.add_case(analysis.switch_context)
+        self.check_constant()
+
+    def analyze(self, analysis: Analysis) -> None:
+        self.analyze_value(analysis)
+        self.body.analyze(analysis)
+
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> object:
+        value = self.value.emit(instructions, variables)
         instructions.append(tacky.SwitchCasePlaceholder(value))
-        self.body.emit(instructions)
+        self.body.emit(instructions, variables)
         return tacky.Null()
 
 
 class Default(Stmt):
+    __slots__ = ("body",)
+
     def __init__(self, body: Stmt) -> None:
         self.body = body
 
@@ -1304,10 +1768,10 @@ class Default(Stmt):
             {repr(self.body).replace("\n", "\n        ")}
         """.strip()
 
-    def typecheck(self, symbol_table: dict[str, IntType | FuncType], file_scope: bool) -> None:
+    def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         self.body.typecheck(symbol_table, file_scope)
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Default":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Default":
         body = self.body.resolve_identifiers(identifier_map, inside_func)
         return Default(body)
 
@@ -1315,7 +1779,7 @@ class Default(Stmt):
         body = self.body.resolve_goto_labels(labels, function_name)
         return Default(body)
 
-    def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "Default":
+    def add_case(self, switch_context: set[str] | None) -> None:
         if switch_context is None:
             raise ResolverError("cannot have default statement outside of a switch")
         elif (value_str := "__default__") in switch_context:
@@ -1323,26 +1787,34 @@ class Default(Stmt):
         else:
             switch_context.add(value_str)
 
+    def resolve_loop_labels(self, labels: list[str], function_name: str, switch_context: set[str] | None) -> "Default":
+        self.add_case(switch_context)
         body = self.body.resolve_loop_labels(labels, function_name, switch_context)
         return Default(body)
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def analyze(self, analysis: Analysis) -> None:
+        self.add_case(analysis.switch_context)
+        self.body.analyze(analysis)
+
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         instructions.append(tacky.SwitchCasePlaceholder())
-        self.body.emit(instructions)
+        self.body.emit(instructions, variables)
         return tacky.Null()
 
 
 class Null(Stmt):
+    __slots__ = ()
+
     def __init__(self):
         pass
 
     def __repr__(self) -> str:
         return "Null()"
 
-    def emit(self, instructions: list[tacky.Instruction]) -> tacky.Value:
+    def emit(self, instructions: list[tacky.Instruction], variables: VariableTable) -> tacky.Value:
         return tacky.Null()
 
-    def resolve_identifiers(self, identifier_map: dict[str, MapEntry], inside_func: bool) -> "Null":
+    def resolve_identifiers(self, identifier_map: Scope, inside_func: bool) -> "Null":
         return Null()
 
     def resolve_goto_labels(self, labels: dict[str, bool], function_name: str) -> "Null":
@@ -1354,8 +1826,308 @@ class Null(Stmt):
     def typecheck(self, symbol_table: SymbolTable, file_scope: bool) -> None:
         pass
 
+    def analyze(self, analysis: Analysis) -> None:
+        pass
+
+
+# explicit-stack walks: the per-node steps of analyze() and emit() driven by a loop over a list of pending work
+# instead of python recursion, so nesting depth is not bound by the recursion limit. A pending item is a node
+# still to visit or a (step, argument) tuple to run once the nodes pushed before it are done.
+
+# fmt: off
+# steps of analyze_explicit_stack()
+RESTORE_SCOPE, POP_LOOP_LABEL, RESTORE_SWITCH, CHECK_FOR_INIT, END_FUNCTION = range(5)
+# steps of emit_explicit_stack()
+(
+    APPEND, DISCARD, UNARY_OP, BINARY_OP, CALL, COPY_TO, RETURN, JUMP_IF_ZERO, JUMP_IF_NOT_ZERO,
+    AND_END, OR_END, CONDITIONAL_THEN, CONDITIONAL_ELSE, SWITCH_BODY, SWITCH_END, CASE_VALUE,
+) = range(16)
+# fmt: on
+
+
+def node_classes(*bases: type) -> list[type]:
+    return [cls for cls in list(globals().values()) if isinstance(cls, type) and issubclass(cls, bases)]
+
+
+# exact type lookups, isinstance() against the protocol bases is slow
+analyze_leaves = {Constant, Variable, Goto, Break, Continue, Null}
+unary_types = set(node_classes(Unary))
+binary_types = set(node_classes(Binary)) - {Conditional}
+loop_kinds = {While: "while", DoWhile: "dowhile"}
+
+
+def analyze_explicit_stack(root: BlockItem, analysis: Analysis) -> None:
+    """analyze() without recursion, with the same checks in the same order. Slower than analyze(), it is only for
+    code nested too deeply for the recursion limit."""
+    # items are nodes or steps, told apart by exact type
+    stack: list[Any] = [root]
+    pop, push, extend = stack.pop, stack.append, stack.extend
+
+    while stack:
+        node = pop()
+        cls = type(node)
+
+        if cls in analyze_leaves:
+            node.analyze(analysis)
+        elif cls in binary_types:
+            node.check_lvalue()
+            extend((node.right, node.left))
+        elif cls in unary_types:
+            node.check_lvalue()
+            push(node.expr)
+        elif cls is Block:
+            extend(reversed(node.items))
+        elif cls is Expression or cls is Return:
+            push(node.expr)
+        elif cls is VarDecl:
+            if node.analyze_declaration(analysis):
+                push(node.expr)
+        elif cls is FuncCall:
+            node.analyze_call(analysis)
+            extend(reversed(node.args))
+        elif cls is Conditional:
+            extend((node.right, node.middle, node.left))
+        elif cls is If:
+            if node.else_ is not None:
+                push(node.else_)
+            extend((node.then, node.cond))
+        elif cls is Compound:
+            push((RESTORE_SCOPE, analysis.identifier_map))
+            analysis.identifier_map = analysis.identifier_map.child()
+            push(node.block)
+        elif cls in loop_kinds:
+            # the condition is visited with the label pushed, expressions never look at it
+            node.labels = [analysis.push_loop_label(loop_kinds[cls])]
+            extend(((POP_LOOP_LABEL, None), node.body, node.cond))
+        elif cls is For:
+            push((RESTORE_SCOPE, analysis.identifier_map))
+            analysis.identifier_map = analysis.identifier_map.child()
+            node.labels = [analysis.push_loop_label("for")]
+            extend(((POP_LOOP_LABEL, None), node.body))
+            extend(expr for expr in (node.post, node.cond) if expr is not None)
+            if node.init is not None:
+                extend(((CHECK_FOR_INIT, node), node.init))
+        elif cls is Switch:
+            push((RESTORE_SWITCH, (analysis.identifier_map, analysis.switch_context)))
+            analysis.identifier_map = analysis.identifier_map.child()
+            node.labels = [analysis.push_loop_label("__switch__")]
+            analysis.switch_context = set()
+            extend(((POP_LOOP_LABEL, None), node.body, node.condition))
+        elif cls is Label:
+            node.add_label(analysis)
+            push(node.stmt)
+        elif cls is Case:
+            node.analyze_value(analysis)
+            push(node.body)
+        elif cls is Default:
+            node.add_case(analysis.switch_context)
+            push(node.body)
+        elif cls is FuncDecl:
+            if (function := node.analyze_declaration(analysis)) is not None:
+                push((END_FUNCTION, (node, analysis)))
+                analysis = function
+                push(node.body)
+        elif cls is tuple:
+            step, arg = node
+            if step == POP_LOOP_LABEL:
+                analysis.loop_labels.pop()
+            elif step == RESTORE_SCOPE:
+                analysis.identifier_map = arg
+            elif step == RESTORE_SWITCH:
+                analysis.identifier_map, analysis.switch_context = arg
+            elif step == CHECK_FOR_INIT:
+                arg.check_init(analysis.symbol_table)
+            elif step == END_FUNCTION:
+                function_decl, outer = arg
+                function_decl.check_goto_labels(analysis.goto_labels)
+                analysis = outer
+            else:
+                Unreachable()
+        else:
+            Unreachable()
+
+
+def emit_explicit_stack(root: BlockItem, instructions: list[tacky.Instruction], variables: VariableTable) -> None:
+    """emit() without recursion, giving the same instructions and names. Expression values wait on a list. Slower
+    than emit(), it is only for code nested too deeply for the recursion limit."""
+    # items are nodes or steps, told apart by exact type
+    stack: list[Any] = [root]
+    pop, push, extend = stack.pop, stack.append, stack.extend
+    values: list[tacky.Value] = []
+    # the instruction list and condition of every switch whose body is being emitted into a list of its own
+    switches: list[tuple[list[tacky.Instruction], tacky.Value]] = []
+
+    while stack:
+        node = pop()
+        cls = type(node)
+
+        if cls is tuple:
+            step, arg = node
+            if step == APPEND:
+                instructions.append(arg)
+            elif step == BINARY_OP:
+                right = values.pop()
+                values.append(arg.emit_operator(instructions, variables, values.pop(), right))
+            elif step == UNARY_OP:
+                values.append(arg.emit_operator(instructions, variables, values.pop()))
+            elif step == DISCARD:
+                values.pop()
+            elif step == COPY_TO:
+                instructions.append(tacky.Copy(values.pop(), tacky.Variable(variables, arg)))
+            elif step == JUMP_IF_ZERO:
+                instructions.append(tacky.JumpIfZero(values.pop(), arg))
+            elif step == JUMP_IF_NOT_ZERO:
+                instructions.append(tacky.JumpIfNotZero(values.pop(), arg))
+            elif step == RETURN:
+                instructions.append(tacky.Return(values.pop()))
+            elif step == CALL:
+                args = values[len(values) - len(arg.args) :]
+                del values[len(values) - len(arg.args) :]
+                values.append(arg.emit_call(instructions, variables, args))
+            elif step == AND_END or step == OR_END:
+                dst, short_circuit, end = arg
+                short, other = (0, 1) if step == AND_END else (1, 0)
+                jump = tacky.JumpIfZero if step == AND_END else tacky.JumpIfNotZero
+                instructions.extend(
+                    [
+                        jump(values.pop(), short_circuit),
+                        tacky.Copy(tacky.Constant(other), dst),
+                        tacky.Jump(end),
+                        tacky.Label(short_circuit),
+                        tacky.Copy(tacky.Constant(short), dst),
+                        tacky.Label(end),
+                    ]
+                )
+                values.append(dst)
+            elif step == CONDITIONAL_THEN:
+                dst, end, else_ = arg
+                instructions.extend([tacky.Copy(values.pop(), dst), tacky.Jump(end), tacky.Label(else_)])
+            elif step == CONDITIONAL_ELSE:
+                dst, end = arg
+                instructions.extend([tacky.Copy(values.pop(), dst), tacky.Label(end)])
+                values.append(dst)
+            elif step == SWITCH_BODY:
+                switches.append((instructions, values.pop()))
+                instructions = []
+            elif step == SWITCH_END:
+                body = instructions
+                instructions, cond_dst = switches.pop()
+                arg.emit_cases(instructions, variables, cond_dst, body)
+            elif step == CASE_VALUE:
+                instructions.append(tacky.SwitchCasePlaceholder(values.pop()))
+            else:
+                Unreachable()
+        elif cls is Variable or cls is Constant:
+            values.append(node.emit(instructions, variables))
+        elif cls in binary_types and cls is not And and cls is not Or:
+            extend(((BINARY_OP, node), node.right, node.left))
+        elif cls in unary_types:
+            extend(((UNARY_OP, node), node.expr))
+        elif cls is Block:
+            extend(reversed(node.items))
+        elif cls is Expression:
+            extend(((DISCARD, None), node.expr))
+        elif cls is Return:
+            extend(((RETURN, None), node.expr))
+        elif cls is VarDecl:
+            if node.expr is not None and node.storage_class is None:
+                extend(((COPY_TO, node.name), node.expr))
+        elif cls is FuncCall:
+            push((CALL, node))
+            extend(reversed(node.args))
+        elif cls is And or cls is Or:
+            dst = tacky.Variable(variables)
+            if cls is And:
+                short_circuit, end = make_label_name("and.false"), make_label_name("and.end")
+                extend(((AND_END, (dst, short_circuit, end)), node.right, (JUMP_IF_ZERO, short_circuit), node.left))
+            else:
+                short_circuit, end = make_label_name("or.true"), make_label_name("or.end")
+                extend(((OR_END, (dst, short_circuit, end)), node.right, (JUMP_IF_NOT_ZERO, short_circuit), node.left))
+        elif cls is Conditional:
+            end, else_ = make_label_name("end"), make_label_name("else")
+            dst = tacky.Variable(variables)
+            extend(
+                (
+                    (CONDITIONAL_ELSE, (dst, end)),
+                    node.right,
+                    (CONDITIONAL_THEN, (dst, end, else_)),
+                    node.middle,
+                    (JUMP_IF_ZERO, else_),
+                    node.left,
+                )
+            )
+        elif cls is If:
+            end, else_ = make_label_name("end"), make_label_name("else")
+            push((APPEND, tacky.Label(end)))
+            if node.else_ is not None:
+                push(node.else_)
+            extend(
+                (
+                    (APPEND, tacky.Label(else_)),
+                    (APPEND, tacky.Jump(end)),
+                    node.then,
+                    (JUMP_IF_ZERO, else_),
+                    node.cond,
+                )
+            )
+        elif cls is Label:
+            instructions.append(tacky.Label(node.name))
+            push(node.stmt)
+        elif cls is Compound:
+            push(node.block)
+        elif cls is While:
+            label = node.labels[-1]
+            instructions.append(tacky.Label(f"__continue__{label}"))
+            extend(
+                (
+                    (APPEND, tacky.Label(f"__break__{label}")),
+                    (APPEND, tacky.Jump(f"__continue__{label}")),
+                    node.body,
+                    (JUMP_IF_ZERO, f"__break__{label}"),
+                    node.cond,
+                )
+            )
+        elif cls is DoWhile:
+            label = node.labels[-1]
+            instructions.append(tacky.Label(f"__start__{label}"))
+            extend(
+                (
+                    (APPEND, tacky.Label(f"__break__{label}")),
+                    (JUMP_IF_NOT_ZERO, f"__start__{label}"),
+                    node.cond,
+                    (APPEND, tacky.Label(f"__continue__{label}")),
+                    node.body,
+                )
+            )
+        elif cls is For:
+            label = node.labels[-1]
+            extend(((APPEND, tacky.Label(f"__break__{label}")), (APPEND, tacky.Jump(f"__start__{label}"))))
+            if node.post is not None:
+                extend(((DISCARD, None), node.post))
+            extend(((APPEND, tacky.Label(f"__continue__{label}")), node.body))
+            if node.cond is not None:
+                extend(((JUMP_IF_ZERO, f"__break__{label}"), node.cond))
+            push((APPEND, tacky.Label(f"__start__{label}")))
+            if type(node.init) is VarDecl:
+                push(node.init)
+            elif node.init is not None:
+                extend(((DISCARD, None), node.init))
+        elif cls is Switch:
+            extend(((SWITCH_END, node), node.body, (SWITCH_BODY, None), node.condition))
+        elif cls is Case:
+            extend((node.body, (CASE_VALUE, None), node.value))
+        elif cls is Default:
+            instructions.append(tacky.SwitchCasePlaceholder())
+            push(node.body)
+        elif cls is Goto or cls is Break or cls is Continue or cls is Null or cls is FuncDecl:
+            node.emit(instructions, variables)
+        else:
+            Unreachable()
+
 
 class Program:
+    __slots__ = ("decls", "symbol_table")
+
     def __init__(self, decls: list[Declaration], symbol_table: SymbolTable) -> None:
         self.decls = decls
         self.symbol_table = symbol_table
@@ -1366,11 +2138,7 @@ class Program:
     def convert_symbols_to_tacky(self) -> list[tacky.TopLevel]:
         tacky_defs: list[tacky.TopLevel] = []
         for name, entry in self.symbol_table.items():
-            if isinstance(entry, FuncType):
-                continue
-
-            attrs = entry.attrs
-            if not isinstance(attrs, StaticAttrs):
+            if not isinstance((attrs := entry.attrs), StaticAttrs):
                 continue
 
             assert isinstance(attrs.initial_value, InitialValue)
@@ -1385,18 +2153,162 @@ class Program:
 
         return tacky_defs
 
-    def to_tacky(self) -> tacky.Program:
-        decls = [decl.to_tacky(self.symbol_table) for decl in self.decls]
+    def to_tacky(self, explicit_stack: bool = False) -> tacky.Program:
+        decls = [
+            decl.to_tacky(self.symbol_table, explicit_stack)
+            if isinstance(decl, FuncDecl)
+            else decl.to_tacky(self.symbol_table)
+            for decl in self.decls
+        ]
         decls.extend(self.convert_symbols_to_tacky())
         return tacky.Program([f for f in decls if f is not None], self.symbol_table)
 
+    def unused_functions(self) -> set[str]:
+        # static functions with lazy bodies not reachable from an external definition, never parsed or emitted:
+        # they count as definitions, errors inside their bodies are not reported
+        definitions = [decl for decl in self.decls if isinstance(decl, FuncDecl) and decl.has_body]
+        names: dict[str, set[str]] = {}
+        for decl in definitions:
+            if decl.lazy_body is None:
+                # the calls of a body parsed up front are not known
+                return set()
+            names.setdefault(decl.name, set()).update(decl.lazy_body.names)
+
+        static = {
+            decl.name for decl in self.decls if isinstance(decl, FuncDecl) and decl.storage_class is tok.Static()
+        }
+        work = [name for name in names if name not in static]
+        needed = set(work)
+        while work:
+            for name in names[work.pop()]:
+                if name in names and name not in needed:
+                    needed.add(name)
+                    work.append(name)
+
+        return set(names) - needed
+
     def resolve(self) -> "Program":
-        decls = []
-        identifier_map: dict[str, MapEntry] = {}
+        decls: list[Declaration] = []
+        identifier_map = Scope()
+        unused = self.unused_functions()
         for decl in self.decls:
+            if isinstance(decl, FuncDecl) and decl.name in unused:
+                decls.append(decl.skip_body(identifier_map, self.symbol_table))
+                continue
             decl = decl.resolve_identifiers(identifier_map, False)
             decl = decl.resolve_goto_labels({}, decl.name)
             decl = decl.resolve_loop_labels([], decl.name, None)
             decl.typecheck(self.symbol_table, True)
             decls.append(decl)
         return Program(decls, self.symbol_table)
+
+    def resolve_parallel(self, workers: int | None = None, min_declarations: int = 256) -> "Program":
+        """resolve() in two phases: file-scope declarations and function signatures in order, then function
+        bodies in chunks of at least min_declarations top-level declarations in a pool of worker processes.
+
+        A body only needs the file-scope names declared before it and the final symbol table entries, which
+        valid redeclarations do not change in ways a body can see. Block-scope declarations of names with linkage
+        do depend on where they are, so does an error, and lazy bodies do not pickle; those fall back to resolve().
+        """
+        workers = workers or os.process_cpu_count() or 1
+        if any(isinstance(decl, FuncDecl) and decl.lazy_body is not None for decl in self.decls):
+            return self.resolve()
+        if (nchunks := min(workers, len(self.decls) // max(min_declarations, 1))) <= 1:
+            return self.resolve()
+
+        points = [len(self.decls) * chunk // nchunks for chunk in range(nchunks)]
+        # the file-scope names visible at the start of every chunk
+        scopes: list[dict[str, MapEntry]] = []
+        identifier_map = Scope()
+        symbol_table = dict(self.symbol_table)
+        try:
+            for idx, decl in enumerate(self.decls):
+                if idx in points:
+                    scopes.append(dict(identifier_map.entries))
+                if isinstance(decl, FuncDecl):
+                    decl.declare(identifier_map, False)
+                    decl.typecheck_declaration(symbol_table)
+                else:
+                    decl.resolve_identifiers(identifier_map, False).typecheck(symbol_table, True)
+        except semantic_errors:
+            return self.resolve()
+
+        chunks = [self.decls[start:end] for start, end in zip(points, [*points[1:], len(self.decls)])]
+        resolved: list[tuple[Declaration, SymbolTable]] = []
+        with ProcessPoolExecutor(workers) as pool:
+            args = (chunks, scopes, [symbol_table] * nchunks, range(nchunks), [nchunks] * nchunks)
+            for chunk_resolved in pool.map(resolve_chunk, *args):
+                if chunk_resolved is None:
+                    return self.resolve()
+                resolved.extend(chunk_resolved)
+
+        # entries in the order resolve() adds them: a name at its first declaration, then the function's locals
+        decls = []
+        for decl, local_symbols in resolved:
+            if decl.name not in self.symbol_table:
+                self.symbol_table[decl.name] = symbol_table[decl.name]
+            self.symbol_table.update(local_symbols)
+            decls.append(decl)
+        return Program(decls, self.symbol_table)
+
+    def analyze(self, explicit_stack: bool = False) -> "Program":
+        # resolve() in one walk per declaration instead of four, mutating the nodes instead of copying them
+        decls: list[Declaration] = []
+        analysis = Analysis(self.symbol_table, Scope())
+        unused = self.unused_functions()
+        for decl in self.decls:
+            if isinstance(decl, FuncDecl) and decl.name in unused:
+                decls.append(decl.skip_body(analysis.identifier_map, self.symbol_table))
+                continue
+            if explicit_stack:
+                analyze_explicit_stack(decl, analysis)
+            else:
+                decl.analyze(analysis)
+            decls.append(decl)
+        return Program(decls, self.symbol_table)
+
+
+class FunctionSymbols(dict[str, Symbol]):
+    """The symbol table of one function body in a resolve_parallel() worker: its own entries over the file-scope
+    ones, which it only reads. Only declarations test membership, so the names they test are those declared in
+    block scope with linkage."""
+
+    __slots__ = ("file_scope", "declared")
+
+    def __init__(self, file_scope: SymbolTable) -> None:
+        super().__init__()
+        self.file_scope = file_scope
+        self.declared: set[str] = set()
+
+    def __missing__(self, name: str) -> Symbol:
+        return self.file_scope[name]
+
+    def __contains__(self, name: object) -> bool:
+        assert isinstance(name, str)
+        self.declared.add(name)
+        return super().__contains__(name) or name in self.file_scope
+
+
+def resolve_chunk(
+    decls: list[Declaration], scope: dict[str, MapEntry], symbol_table: SymbolTable, chunk: int, nchunks: int
+) -> list[tuple[Declaration, SymbolTable]] | None:
+    # one resolve_parallel() chunk: every declaration with the local entries of its body, None if it needs resolve()
+    identifier_map = Scope()
+    identifier_map.entries = scope
+    resolved: list[tuple[Declaration, SymbolTable]] = []
+    # unique names of chunk k are k + 1 modulo nchunks, so no two chunks make the same one
+    with CompilationSession(symbol_table, chunk + 1, nchunks):
+        try:
+            for decl in decls:
+                decl = decl.resolve_identifiers(identifier_map, False)
+                decl = decl.resolve_goto_labels({}, decl.name)
+                decl = decl.resolve_loop_labels([], decl.name, None)
+                local_symbols = FunctionSymbols(symbol_table)
+                if isinstance(decl, FuncDecl) and decl.has_body:
+                    decl.typecheck_body(local_symbols, True)
+                    if local_symbols.declared:
+                        return None
+                resolved.append((decl, dict(local_symbols)))
+        except semantic_errors:
+            return None
+    return resolved
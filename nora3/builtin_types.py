@@ -1,4 +1,4 @@
-from typing import TypeVar
+from typing import ClassVar, TypeVar, final
 
 
 class InitialValue: ...
@@ -22,10 +22,13 @@ class NoInitializer(InitialValue):
         return isinstance(value, NoInitializer)
 
 
-class IdentifierAttrs: ...
+class IdentifierAttrs:
+    __slots__ = ()
 
 
 class FuncAttrs(IdentifierAttrs):
+    __slots__ = ("defined", "globl")
+
     def __init__(self, defined: bool, globl: bool) -> None:
         self.defined = defined
         self.globl = globl
@@ -35,6 +38,8 @@ class FuncAttrs(IdentifierAttrs):
 
 
 class StaticAttrs(IdentifierAttrs):
+    __slots__ = ("globl", "initial_value")
+
     def __init__(self, initial_value: InitialValue, globl: bool) -> None:
         self.initial_value = initial_value
         self.globl = globl
@@ -46,44 +51,80 @@ class StaticAttrs(IdentifierAttrs):
 
 
 class LocalAttrs(IdentifierAttrs):
+    __slots__ = ()
+
     def __eq__(self, value: object, /) -> bool:
         return isinstance(value, LocalAttrs)
 
 
-class Type: ...
+class Type:
+    """Types are hash-consed: building a type equal to an existing one returns that instance, so types are
+    immutable and compare and hash by identity. What an identifier's declarations add (linkage, definedness,
+    initial value) lives in its Symbol's attrs instead."""
+
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
 
+@final
 class FuncType(Type):
-    def __init__(self, params: list[Type], defined: bool, attrs: IdentifierAttrs) -> None:
-        self.params = params
-        self.defined = defined
-        self.attrs = attrs
+    __slots__ = ("params",)
 
-    def __eq__(self, value: object, /) -> bool:
-        if not isinstance(value, FuncType) or len(self.params) != len(value.params):
-            return False
+    params: tuple[Type, ...]
+    instances: ClassVar[dict[tuple[Type, ...], "FuncType"]] = {}
 
-        for idx in range(len(self.params)):
-            if self.params[idx] != value.params[idx]:
-                return False
+    def __new__(cls, params: tuple[Type, ...]) -> "FuncType":
+        # params are interned already, so the key hashes and compares by identity
+        if (type_ := cls.instances.get(params)) is None:
+            type_ = super().__new__(cls)
+            object.__setattr__(type_, "params", params)
+            # a thread that interned the same params first wins
+            type_ = cls.instances.setdefault(params, type_)
+        return type_
 
-        return True
+    def __reduce__(self) -> tuple:
+        # interned again in the process that unpickles it
+        return FuncType, (self.params,)
 
     def __repr__(self) -> str:
         params = " ".join(map(repr, self.params))
         return f"FuncType({params})"
 
 
+@final
 class IntType(Type):
-    def __init__(self, attrs: IdentifierAttrs) -> None:
-        self.attrs = attrs
+    __slots__ = ()
 
-    def __eq__(self, value: object, /) -> bool:
-        return isinstance(value, IntType)
+    instance: ClassVar["IntType | None"] = None
+
+    def __new__(cls) -> "IntType":
+        if (type_ := cls.instance) is None:
+            type_ = super().__new__(cls)
+            cls.instance = type_
+        return type_
+
+    def __reduce__(self) -> tuple:
+        return IntType, ()
 
     def __repr__(self) -> str:
         return "IntType()"
 
 
+class Symbol:
+    __slots__ = ("attrs", "type_")
+
+    def __init__(self, type_: Type, attrs: IdentifierAttrs) -> None:
+        self.type_ = type_
+        self.attrs = attrs
+
+    def __repr__(self) -> str:
+        return repr(self.type_)
+
+
+# the entry of every local variable and parameter, none is ever updated in place
+local_int = Symbol(IntType(), LocalAttrs())
+
 Res = TypeVar("Res")
-SymbolTable = dict[str, IntType | FuncType]
+SymbolTable = dict[str, Symbol]
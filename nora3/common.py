@@ -1,4 +1,8 @@
-from typing import Callable, Never, Protocol, TypeVar
+from contextvars import ContextVar, Token
+from functools import cache
+from typing import Never, Protocol, Self, TypeVar
+
+from nora3.builtin_types import StaticAttrs, SymbolTable
 
 KT = TypeVar("KT")
 VT = TypeVar("VT")
@@ -15,6 +19,8 @@ class Singleton(Protocol):
 
 
 class MappingHolder[KT, VT]:
+    __slots__ = ()
+
     mapping: dict[KT, VT] = {}
 
     def __init_subclass__(cls, cls1: KT | None = None, cls2: VT | None = None) -> None:
@@ -26,6 +32,12 @@ class MappingHolder[KT, VT]:
             raise ValueError("both KT and VT should be None or not None")
 
 
+@cache
+def slot_names(cls: type) -> tuple[str, ...]:
+    # the instance attributes of a class whose hierarchy uses __slots__, base classes first
+    return tuple(name for base in reversed(cls.__mro__) for name in base.__dict__.get("__slots__", ()))
+
+
 def Unreachable() -> Never:
     raise Exception("unreachable")
 
@@ -35,42 +47,89 @@ Res = TypeVar("Res")
 
 
 class Emitter[Instr, Res](Protocol):
+    __slots__ = ()
+
     def emit(self, instructions: list[Instr]) -> Res: ...
 
 
-def make_make_temp_variable() -> Callable[[], str]:
-    counter = 0
+class VariableTable:
+    """The variables of one function, which tacky.Variable and asm.Pseudo refer to by index, and their attributes:
+    the name and whether the variable lives in static storage. A temporary has no name until it is printed, a named
+    variable gets the same index every time it is added and is looked up in the symbol table only then."""
+
+    __slots__ = ("ids", "names", "static", "symbol_table")
+
+    def __init__(self, symbol_table: SymbolTable | None = None) -> None:
+        self.names: list[str | None] = []
+        self.static: list[bool] = []
+        self.ids: dict[str, int] = {}
+        self.symbol_table: SymbolTable = {} if symbol_table is None else symbol_table
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str | None = None) -> int:
+        if name is None:
+            self.names.append(None)
+            self.static.append(False)
+            return len(self.names) - 1
+        if (id_ := self.ids.get(name)) is None:
+            id_ = self.ids[name] = len(self.names)
+            self.names.append(name)
+            symbol = self.symbol_table.get(name)
+            self.static.append(symbol is not None and isinstance(symbol.attrs, StaticAttrs))
+        return id_
+
+    def name(self, id_: int) -> str:
+        return f".tmpvar.{id_}" if (name := self.names[id_]) is None else name
+
+
+class CompilationSession:
+    """The state of compiling one translation unit: the counters behind unique names and the symbol table.
+
+    Names are made by the session entered last in the current thread (outside any `with`, by one the thread makes
+    the first time it needs a name), so translation units compiled one after another or in several threads each
+    number their names from 1.
+    """
+
+    __slots__ = ("labels", "step", "symbol_table", "tokens", "variables")
+
+    def __init__(self, symbol_table: SymbolTable | None = None, start: int = 1, step: int = 1) -> None:
+        self.symbol_table: SymbolTable = {} if symbol_table is None else symbol_table
+        # the last number each counter handed out, going up by step
+        self.variables = self.labels = start - step
+        self.step = step
+        self.tokens: list[Token[CompilationSession | None]] = []
 
-    def make_temp_variable() -> str:
-        nonlocal counter
-        counter += 1
-        return f".tmpvar.{counter}"
+    def __enter__(self) -> Self:
+        self.tokens.append(active_session.set(self))
+        return self
 
-    return make_temp_variable
+    def __exit__(self, *exc_info: object) -> None:
+        active_session.reset(self.tokens.pop())
 
+    def make_variable_name(self, name: str) -> str:
+        self.variables += self.step
+        return f".var.{name}.{self.variables}"
 
-def make_make_variable() -> Callable[[str], str]:
-    counter = 0
+    def make_label_name(self, name: str) -> str:
+        self.labels += self.step
+        return f".label.{name}.{self.labels}"
 
-    def make_variable(name: str) -> str:
-        nonlocal counter
-        counter += 1
-        return f".var.{name}.{counter}"
 
-    return make_variable
+active_session: ContextVar[CompilationSession | None] = ContextVar("active_session", default=None)
 
 
-def make_make_label() -> Callable[[str], str]:
-    counter = 0
+def current_session() -> CompilationSession:
+    if (session := active_session.get()) is None:
+        session = CompilationSession()
+        active_session.set(session)
+    return session
 
-    def make_label(name: str) -> str:
-        nonlocal counter
-        counter += 1
-        return f".label.{name}.{counter}"
 
-    return make_label
+def make_variable_name(name: str) -> str:
+    return current_session().make_variable_name(name)
 
 
-make_temp_variable_name = make_make_temp_variable()
-make_variable_name = make_make_variable()
-make_label_name = make_make_label()
+def make_label_name(name: str) -> str:
+    return current_session().make_label_name(name)
@@ -0,0 +1,24 @@
+from nora3 import asts
+from nora3.common import CompilationSession
+from nora3.lex import Lexer
+from nora3.optimize import optimize_program
+from nora3.parse import Parser
+
+
+def compile(src: str, session: CompilationSession | None = None, optimize: bool = False) -> str:
+    """The assembly for a translation unit, compiled in this process.
+
+    Every call gets a fresh session unless one is passed, so the output does not depend on what was compiled before
+    or in other threads. optimize runs the tacky optimization passes. Lexer, parser and semantic errors are raised as
+    they are.
+    """
+    session = CompilationSession() if session is None else session
+    with session:
+        ast = Parser(Lexer(src, lazy_positions=True).lex()).parse()
+        program = asts.Program(ast.decls, session.symbol_table).resolve()
+        ir = program.to_tacky()
+        if optimize:
+            optimize_program(ir, fold=True, propagate=True, eliminate=True)
+        assembly = ir.to_asm()
+        assembly.replace_pseudo()
+        return assembly.fix_instructions().codegen()
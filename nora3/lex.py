@@ -1,21 +1,61 @@
-from string import ascii_letters, digits, whitespace as _whitespace
+import os
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from mmap import ACCESS_READ, mmap
+from typing import overload
+from string import whitespace
 
 from nora3 import tok
-
-TAB_WIDTH = 4
-LONGEST_OPERATOR_LENGTH = 3
-
-alpha = frozenset(ascii_letters + "_")
-numeric = frozenset(digits)
-alphanumeric = alpha | numeric
-whitespace = frozenset(_whitespace)
+from nora3.tok import TAB_WIDTH
+
+# every operator, longest first so the alternation below always takes the longest match;
+# "#" never reaches it because it starts a directive
+operators = sorted((value for value in tok.Character().mapping if value != tok.Pound.value), key=len, reverse=True)
+
+# a directive runs to the end of its line, and on past backslash-newlines and block comments that cross lines
+directive_pattern = r"#(?:\\\n|//[^\n]*|/\*.*?\*/|[^\n])*"
+directive_scanner = re.compile(directive_pattern, re.DOTALL)
+byte_directive_scanner = re.compile(directive_pattern.encode("ascii"), re.DOTALL)
+
+# one alternation over every lexeme so whole tokens (and whole comments) are consumed by a single match
+pattern = "|".join(
+    [
+        rf"(?P<skip>[{re.escape(whitespace)}]+|//[^\n]*|/\*.*?\*/)",
+        f"(?P<directive>{directive_pattern})",
+        r"(?P<unterminated_comment>/\*)",
+        r"(?P<number>[0-9]+(?![A-Za-z0-9_]))",
+        r"(?P<invalid_number>[0-9][A-Za-z0-9_]*)",
+        r"(?P<word>[A-Za-z_][A-Za-z0-9_]*)",
+        f"(?P<operator>{'|'.join(map(re.escape, operators))})",
+    ]
+)
+scanner = re.compile(pattern, re.DOTALL)
+# the same lexemes over bytes, for sources that are mapped rather than decoded
+byte_scanner = re.compile(pattern.encode("ascii"), re.DOTALL)
+
+# just the skipped lexemes that can hide a block comment opener, an unterminated comment runs to the end
+comment_pattern = rf"//[^\n]*|{directive_pattern}|/\*(?:.*?\*/|.*)"
+comment_scanner = re.compile(comment_pattern, re.DOTALL)
+byte_comment_scanner = re.compile(comment_pattern.encode("ascii"), re.DOTALL)
+
+
+def map_source(filename: str) -> mmap | bytes:
+    with open(filename, "rb") as fh:
+        try:
+            return mmap(fh.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return b""
 
 
 class UnexpectedEOF(Exception):
     value: str
 
     def __init__(self, value: str) -> None:
-        super().__init__()
+        super().__init__(value)
         self.value = value
 
     def __str__(self) -> str:
@@ -28,7 +68,8 @@ class InvalidNumber(Exception):
     offset: int
 
     def __init__(self, line: int, offset: int, value: str) -> None:
-        super().__init__()
+        # keep the arguments so errors raised in lex_parallel() workers survive pickling
+        super().__init__(line, offset, value)
         self.line = line
         self.offset = offset
         self.value = value
@@ -43,7 +84,7 @@ class InvalidCharacter(Exception):
     value: str
 
     def __init__(self, line: int, offset: int, value: str) -> None:
-        super().__init__()
+        super().__init__(line, offset, value)
         self.line = line
         self.offset = offset
         self.value = value
@@ -52,113 +93,308 @@ class InvalidCharacter(Exception):
         return f"invalid character '{self.value}' @ {self.line}:{self.offset}"
 
 
+class TokenList(list[tok.BaseToken]):
+    """Tokens of one source, with the LineIndex that positions those lexed with lazy positions."""
+
+    def __init__(self, tokens: Iterable[tok.BaseToken], lines: tok.LineIndex) -> None:
+        super().__init__(tokens)
+        self.lines = lines
+
+
+class TokenBuffer(Sequence[tok.LazyToken]):
+    """Tokens stored column-wise in arrays, with one shared token type per distinct identifier or literal."""
+
+    def __init__(self, src: tok.Source, lines: tok.LineIndex | None = None) -> None:
+        self.src = src
+        self.lines = tok.LineIndex(src) if lines is None else lines
+
+        self.kinds = array("i")
+        self.starts = array("i")
+        self.lengths = array("i")
+        # index into self.interned for identifiers and literals, -1 for keywords and operators
+        self.values = array("i")
+
+        self.interned: list[tok.TokenType] = []
+        # keyed by the raw text, so bytes sources decode each distinct identifier or literal once
+        self.intern_index: dict[str | bytes, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @overload
+    def __getitem__(self, idx: int) -> tok.LazyToken: ...
+    @overload
+    def __getitem__(self, idx: slice) -> list[tok.LazyToken]: ...
+
+    def __getitem__(self, idx: int | slice) -> tok.LazyToken | list[tok.LazyToken]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return tok.LazyToken(self.tokentype(idx), self.starts[idx])
+
+    def __iter__(self) -> Iterator[tok.LazyToken]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __repr__(self) -> str:
+        return f"TokenBuffer({list(self)})"
+
+    def tokentype(self, idx: int) -> tok.TokenType:
+        if (value := self.values[idx]) == -1:
+            return tok.fixed_tokentypes[self.kinds[idx]]
+        else:
+            return self.interned[value]
+
+    def intern(self, kind: int, text: str | bytes) -> int:
+        if (value := self.intern_index.get(text)) is None:
+            value = self.intern_index[text] = len(self.interned)
+            value_text = text if isinstance(text, str) else text.decode("ascii")
+            self.interned.append(
+                tok.Identifier(value_text) if kind == tok.Identifier.kind else tok.LiteralInt(value_text)
+            )
+        return value
+
+    def append(self, kind: int, text: str | bytes, start: int) -> None:
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.lengths.append(len(text))
+        self.values.append(-1 if kind < tok.Identifier.kind else self.intern(kind, text))
+
+
 class Lexer:
-    def __init__(self, src: str) -> None:
+    def __init__(self, src: tok.Source, lazy_positions: bool = False, directives: bool = False) -> None:
         self.src = src
+        # bytes and mmap sources are scanned without decoding, only identifiers and literals become str
+        self.binary = not isinstance(src, str)
         self.idx = 0
         self.line = 1
         self.offset = 0
 
-    def eat(self, nchars: int = 1) -> str | None:
-        chars = self.src[self.idx : self.idx + nchars]
-        if chars == "":
-            return None
-        elif len(chars) < nchars:
-            raise UnexpectedEOF(f"Lexer.eat({nchars})")
+        # lazy tokens keep only their source index, line:offset comes from the newline index on demand
+        self.lazy_positions = lazy_positions
+        self.lines = tok.LineIndex(src)
 
-        self.idx += nchars
+        # directive lines are skipped like comments unless a preprocessor asks for them as tok.Pound tokens
+        self.directives = directives
 
-        for char in chars:
-            if char == "\n":
-                self.offset = 0
-                self.line += 1
-            else:
-                self.offset += TAB_WIDTH if char == "\t" else 1
-
-        return chars
-
-    def peek(self, nchars: int = 1) -> str | None:
-        chars = self.src[self.idx : self.idx + nchars]
-        if nchars > 1 and len(chars) < nchars:
-            raise UnexpectedEOF(f"Lexer.peek({nchars})")
-        elif chars == "":
-            return None
-
-        return chars
-
-    def directive(self) -> None:
-        while (c := self.peek()) is not None and c != "\n":
-            _ = self.eat()
-
-    def single_line_comment(self) -> None:
-        assert self.eat() == "/"
-        while (c := self.peek()) is not None and c != "\n":
-            _ = self.eat()
-
-    def multi_line_comment(self) -> None:
-        assert self.eat() == "*"
-        while (next2 := self.peek(2)) is not None and next2 != "*/":
-            _ = self.eat()
-        _ = self.eat(2)
-
-    def numbers(self, char: str) -> tok.Token:
-        chars = [char]
-        while (c := self.peek()) is not None and c in alphanumeric:
-            chars.append(c)
-            _ = self.eat()
-
-        value = "".join(chars)
-        if len(set(chars) - numeric) != 0:
-            raise InvalidNumber(self.line, self.offset, value)
+    def advance(self, text: str | bytes) -> None:
+        if isinstance(text, bytes):
+            text = text.decode("latin-1")
+        if (newline := text.rfind("\n")) == -1:
+            self.offset += len(text) + (TAB_WIDTH - 1) * text.count("\t")
         else:
-            return tok.Token(self.line, self.offset, tok.LiteralInt(value))
+            self.line += text.count("\n")
+            self.offset = len(text) - newline - 1 + (TAB_WIDTH - 1) * text.count("\t", newline)
 
-    def letters(self, char: str) -> tok.Token:
-        chars = [char]
-        while (c := self.peek()) in alphanumeric:
-            chars.append(c)
-            _ = self.eat()
+    def position(self) -> tuple[int, int]:
+        if self.lazy_positions:
+            return self.lines.position(self.idx)
+        else:
+            return self.line, self.offset
 
-        v = "".join(chars)
-        try:
-            return tok.Token(self.line, self.offset, tok.Keyword().mapping[v])
-        except KeyError:
-            return tok.Token(self.line, self.offset, tok.Identifier(v))
-
-    def characters(self, char: str) -> tok.Token:
-        for num_chars in reversed(range(0, LONGEST_OPERATOR_LENGTH)):
-            try:
-                next_chars = self.peek(num_chars)
-            except UnexpectedEOF:
-                continue
-
-            if next_chars is not None and (tokentype := tok.Character().mapping.get(char + next_chars)) is not None:
-                _ = self.eat(num_chars)
-                return tok.Token(self.line, self.offset, tokentype)
-
-        return tok.Token(self.line, self.offset, tok.Character().mapping[char])
-
-    def lex(self) -> list[tok.Token]:
-        tokens = []
-        while (char := self.eat()) is not None:
-            if char in whitespace:
-                continue
-            elif char == tok.Pound.value:
-                self.directive()
-            elif char == tok.ForwardSlash.value and self.peek() == tok.ForwardSlash.value:
-                self.single_line_comment()
-            elif char == tok.ForwardSlash.value and self.peek() == tok.Star.value:
-                self.multi_line_comment()
-            elif char in numeric:
-                tokens.append(self.numbers(char))
-            elif char in alpha:
-                tokens.append(self.letters(char))
-            elif char in tok.characters:
-                tokens.append(self.characters(char))
+    def invalid_character(self) -> InvalidCharacter:
+        if isinstance(self.src, str):
+            char = self.src[self.idx]
+            self.idx += 1
+        else:
+            # report the whole utf-8 character, positions past it count its bytes
+            char = bytes(self.src[self.idx : self.idx + 4]).decode("utf-8", errors="replace")[0]
+            self.idx += len(char.encode("utf-8")) if char != "\ufffd" else 1
+        if not self.lazy_positions:
+            self.advance(char)
+        return InvalidCharacter(*self.position(), char)
+
+    def scan(self) -> Iterator[tuple[int, str | bytes, int]]:
+        # yields the kind id, raw text and source index of each token; line:offset are current unless lazy
+        keywords: dict[str | bytes, int] = {}
+        characters: dict[str | bytes, int] = {}
+        for table, mapping in ((keywords, tok.Keyword().mapping), (characters, tok.Character().mapping)):
+            for value, tokentype in mapping.items():
+                table[value.encode("ascii") if self.binary else value] = type(tokentype).kind
+        identifier, literal_int = tok.Identifier.kind, tok.LiteralInt.kind
+        lazy_positions = self.lazy_positions
+        directives = self.directives
+
+        active_scanner = byte_scanner if self.binary else scanner
+        for found in active_scanner.finditer(self.src, self.idx):  # type: ignore[arg-type]
+            if (start := found.start()) != self.idx:
+                raise self.invalid_character()
+
+            self.idx = found.end()
+            text = found.group()
+
+            match found.lastgroup:
+                case "skip":
+                    if not lazy_positions:
+                        self.advance(text)
+                    continue
+                case "directive":
+                    if not lazy_positions:
+                        self.advance(text)
+                    if directives:
+                        yield tok.Pound.kind, text, start
+                    continue
+                case "word":
+                    kind = keywords.get(text, identifier)
+                case "operator":
+                    kind = characters[text]
+                case "number":
+                    kind = literal_int
+                case "invalid_number":
+                    if not lazy_positions:
+                        self.offset += len(text)
+                    raise InvalidNumber(*self.position(), text if isinstance(text, str) else text.decode("ascii"))
+                case "unterminated_comment":
+                    raise UnexpectedEOF("Lexer.lex")
+
+            if not lazy_positions:
+                # tokens never span lines or contain tabs
+                self.offset += len(text)
+            yield kind, text, start
+
+        if self.idx != len(self.src):
+            raise self.invalid_character()
+
+    def iter_tokens(self) -> Iterator[tok.BaseToken]:
+        fixed = tok.fixed_tokentypes
+        identifier = tok.Identifier.kind
+
+        for kind, text, start in self.scan():
+            if kind < identifier:
+                tokentype = fixed[kind]
             else:
-                raise InvalidCharacter(self.line, self.offset, char)
-
-        return tokens
+                if isinstance(text, bytes):
+                    text = text.decode("ascii")
+                if kind == identifier:
+                    tokentype = tok.Identifier(text)
+                else:
+                    tokentype = tok.LiteralInt(text)
+
+            if self.lazy_positions:
+                yield tok.LazyToken(tokentype, start)
+            else:
+                yield tok.Token(self.line, self.offset, tokentype)
+
+    def lex(self) -> TokenList:
+        return TokenList(self.iter_tokens(), self.lines)
+
+    def lex_buffer(self) -> TokenBuffer:
+        self.lazy_positions = True
+
+        buffer = TokenBuffer(self.src, self.lines)
+        for kind, text, start in self.scan():
+            buffer.append(kind, text, start)
+
+        return buffer
+
+    def relex(self, previous: TokenBuffer, start: int, old_end: int, new_end: int) -> TokenBuffer:
+        """Token buffer for this source, made from the buffer of a source that had src[start:new_end] at start:old_end.
+
+        Lexing resumes after the last token ending before the edit and stops at the first token that starts
+        after the edit at the same shifted place as a previous token. The scanner carries no state between
+        tokens, so the rest of the previous buffer is reused with its starts shifted.
+        """
+        self.lazy_positions = True
+        delta = new_end - old_end
+
+        buffer = TokenBuffer(self.src, self.lines)
+        buffer.interned = previous.interned.copy()
+        buffer.intern_index = previous.intern_index.copy()
+
+        # a token ending right at the edit could be extended by it, so it is lexed again
+        kept = bisect_left(range(len(previous)), start, key=lambda idx: previous.starts[idx] + previous.lengths[idx])
+        buffer.kinds = previous.kinds[:kept]
+        buffer.starts = previous.starts[:kept]
+        buffer.lengths = previous.lengths[:kept]
+        buffer.values = previous.values[:kept]
+        self.idx = 0 if kept == 0 else previous.starts[kept - 1] + previous.lengths[kept - 1]
+
+        resync = len(previous)
+        old_starts = previous.starts
+        for kind, text, token_start in self.scan():
+            if token_start >= new_end:
+                resync = bisect_left(old_starts, max(token_start - delta, old_end), kept)
+                if resync < len(previous) and old_starts[resync] == token_start - delta:
+                    self.idx = token_start
+                    break
+            buffer.append(kind, text, token_start)
+        else:
+            resync = len(previous)
+
+        buffer.kinds.extend(previous.kinds[resync:])
+        buffer.starts.extend(array("i", [idx + delta for idx in previous.starts[resync:]]))
+        buffer.lengths.extend(previous.lengths[resync:])
+        buffer.values.extend(previous.values[resync:])
+        return buffer
+
+    def split_points(self, nchunks: int) -> list[int]:
+        # line starts near len(src) / nchunks apart that are not inside a block comment or a continued directive
+        length = len(self.src)
+        newline = b"\n" if self.binary else "\n"
+        active_scanner = byte_comment_scanner if self.binary else comment_scanner
+        comments = [
+            found.span()
+            for found in active_scanner.finditer(self.src)  # type: ignore[arg-type]
+            if newline in found.group()
+        ]
+        comment_starts = [start for start, _ in comments]
+
+        points = [0]
+        for chunk in range(1, nchunks):
+            split = max(chunk * length // nchunks, points[-1] + 1)
+            while True:
+                if (newline_idx := self.src.find(newline, split - 1)) == -1:  # type: ignore[arg-type]
+                    split = length
+                    break
+                split = newline_idx + 1
+                # a comment or directive started on an earlier line may still be open, move past its end and try again
+                if (comment := bisect_right(comment_starts, split - 1) - 1) == -1 or comments[comment][1] <= split:
+                    break
+                split = comments[comment][1]
+            if split >= length:
+                break
+            points.append(split)
+        return points
+
+    def lex_parallel(self, workers: int | None = None, min_chunk_size: int = 1 << 20) -> TokenBuffer:
+        """lex_buffer() over chunks of at least min_chunk_size characters, lexed in a pool of worker processes."""
+        workers = workers or os.process_cpu_count() or 1
+        if (nchunks := min(workers, len(self.src) // max(min_chunk_size, 1))) <= 1:
+            return self.lex_buffer()
+        self.lazy_positions = True
+
+        points = self.split_points(nchunks)
+        chunks = [self.src[start:end] for start, end in zip(points, [*points[1:], len(self.src)])]
+
+        buffer = TokenBuffer(self.src, self.lines)
+        with ProcessPoolExecutor(workers) as pool:
+            results = pool.map(lex_chunk, chunks, points)
+            for start in points:
+                try:
+                    kinds, starts, lengths, values, interned = next(results)
+                except (InvalidCharacter, InvalidNumber) as e:
+                    # workers only see their chunk, which begins at the start of a line
+                    e.line += self.lines.position(start)[0] - 1
+                    e.args = (e.line, e.offset, e.value)
+                    raise
+
+                remap = [buffer.intern(kind, text) for kind, text in interned]
+                buffer.kinds.extend(kinds)
+                buffer.starts.extend(starts)
+                buffer.lengths.extend(lengths)
+                buffer.values.extend(array("i", [-1 if value == -1 else remap[value] for value in values]))
+
+        self.idx = len(self.src)
+        return buffer
+
+
+def lex_chunk(
+    chunk: tok.Source, start: int
+) -> tuple[array[int], array[int], array[int], array[int], list[tuple[int, str | bytes]]]:
+    # one lex_parallel() chunk as token buffer columns indexed into the whole source, with its interned texts
+    buffer = Lexer(chunk, lazy_positions=True).lex_buffer()
+    starts = array("i", [idx + start for idx in buffer.starts])
+    interned = [(tokentype.kind, text) for text, tokentype in zip(buffer.intern_index, buffer.interned)]
+    return buffer.kinds, starts, buffer.lengths, buffer.values, interned
 
 
 if __name__ == "__main__":
@@ -0,0 +1,446 @@
+from collections.abc import Callable
+
+from nora3 import tacky
+
+INT_MIN = -(2**31)
+
+type Fold = Callable[[int, int], int | None]
+
+
+def wrap(value: int) -> int:
+    # two's complement int, as the 32-bit instructions compute it
+    return (value - INT_MIN) % 2**32 + INT_MIN
+
+
+def divide(left: int, right: int) -> int | None:
+    # truncates towards zero, division by zero and INT_MIN / -1 are undefined and trap at run time, left unfolded
+    if right == 0 or (left == INT_MIN and right == -1):
+        return None
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
+
+def remainder(left: int, right: int) -> int | None:
+    if (quotient := divide(left, right)) is None:
+        return None
+    return left - right * quotient
+
+
+def shift(fold: Callable[[int, int], int]) -> Fold:
+    # a shift by a negative count or the width of int is undefined, sall/sarl would mask the count
+    return lambda left, right: wrap(fold(left, right)) if 0 <= right < 32 else None
+
+
+# fmt: off
+binary_folds: dict[type[tacky.Binary], Fold] = {
+    tacky.Add: lambda left, right: wrap(left + right),
+    tacky.Subtract: lambda left, right: wrap(left - right),
+    tacky.Multiply: lambda left, right: wrap(left * right),
+    tacky.Divide: divide,
+    tacky.Remainder: remainder,
+    tacky.LeftShift: shift(lambda left, right: left << right),
+    tacky.RightShift: shift(lambda left, right: left >> right),
+    tacky.BitwiseAnd: lambda left, right: left & right,
+    tacky.BitwiseOr: lambda left, right: left | right,
+    tacky.BitwiseXOr: lambda left, right: left ^ right,
+    tacky.Equal: lambda left, right: int(left == right),
+    tacky.NotEqual: lambda left, right: int(left != right),
+    tacky.LessThan: lambda left, right: int(left < right),
+    tacky.LessOrEqual: lambda left, right: int(left <= right),
+    tacky.GreaterThan: lambda left, right: int(left > right),
+    tacky.GreaterOrEqual: lambda left, right: int(left >= right),
+}
+# increments and decrements update their operand, which is never a constant
+unary_folds: dict[type[tacky.Unary], Callable[[int], int]] = {
+    tacky.Complement: lambda src: ~src,
+    tacky.Negate: lambda src: wrap(-src),
+    tacky.Not: lambda src: int(src == 0),
+}
+updates = {tacky.PrefixIncrement, tacky.PrefixDecrement, tacky.PostfixIncrement, tacky.PostfixDecrement}
+# fmt: on
+
+
+def destinations(instr: tacky.Instruction) -> list[tacky.Value]:
+    if type(instr) in updates:
+        assert isinstance(instr, tacky.Unary)
+        return [instr.src, instr.dst]
+    if isinstance(instr, (tacky.Unary, tacky.Binary, tacky.Copy, tacky.FuncCall)):
+        return [instr.dst]
+    return []
+
+
+def replace_reads(instr: tacky.Instruction, replace: Callable[[tacky.Value], tacky.Value]) -> int:
+    # the operands instr only reads go through replace, returns how many changed
+    match instr:
+        case tacky.Unary() if type(instr) not in updates:
+            old = [instr.src]
+            instr.src = replace(instr.src)
+            new = [instr.src]
+        case tacky.Binary():
+            old = [instr.left, instr.right]
+            instr.left, right = replace(instr.left), replace(instr.right)
+            # arithmetic is emitted as `dst = left; dst op= right`, which would overwrite a right operand that is dst
+            if not (instr.mode == "arithmatic" and same(right, instr.dst)):
+                instr.right = right
+            new = [instr.left, instr.right]
+        case tacky.Copy():
+            old = [instr.src]
+            instr.src = replace(instr.src)
+            new = [instr.src]
+        case tacky.JumpIfZero() | tacky.JumpIfNotZero():
+            old = [instr.cond]
+            instr.cond = replace(instr.cond)
+            new = [instr.cond]
+        case tacky.Return():
+            old = [instr.value]
+            instr.value = replace(instr.value)
+            new = [instr.value]
+        case tacky.FuncCall():
+            old = instr.args
+            instr.args = [replace(arg) for arg in instr.args]
+            new = instr.args
+        case _:
+            return 0
+    return sum(before is not after for before, after in zip(old, new))
+
+
+def same(left: tacky.Value, right: tacky.Value) -> bool:
+    return type(left) is type(right) is tacky.Variable and left.id == right.id
+
+
+def fold_instruction(instr: tacky.Instruction) -> tacky.Instruction | None:
+    # the instruction to keep in place of instr, None to drop it
+    match instr:
+        case tacky.Binary(left=tacky.Constant(value=left), right=tacky.Constant(value=right)):
+            value = binary_folds[type(instr)](wrap(left), wrap(right))
+            return instr if value is None else tacky.Copy(tacky.Constant(value), instr.dst)
+        case tacky.Unary(src=tacky.Constant(value=src)) if type(instr) in unary_folds:
+            return tacky.Copy(tacky.Constant(unary_folds[type(instr)](wrap(src))), instr.dst)
+        case tacky.JumpIfZero(cond=tacky.Constant(value=cond)):
+            return tacky.Jump(instr.label) if cond == 0 else None
+        case tacky.JumpIfNotZero(cond=tacky.Constant(value=cond)):
+            return tacky.Jump(instr.label) if cond != 0 else None
+        case _:
+            return instr
+
+
+def fold_constants(func: tacky.FuncDecl) -> int:
+    """Evaluate the instructions on constant operands as 32-bit C ints and resolve branches on constants, returns
+    how many instructions were folded.
+
+    A temporary written once gets its constant substituted into the instructions after it, so nested expressions
+    fold all the way. Lowering always writes such a temporary before any read of it, named variables wait for copy
+    propagation.
+    """
+    writes: dict[int, int] = {}
+    for instr in func.body:
+        for dst in destinations(instr):
+            if type(dst) is tacky.Variable:
+                writes[dst.id] = writes.get(dst.id, 0) + 1
+    names = func.variables.names
+
+    def substitute(value: tacky.Value) -> tacky.Value:
+        if type(value) is tacky.Variable and (constant := constants.get(value.id)) is not None:
+            return constant
+        return value
+
+    constants: dict[int, tacky.Constant] = {}
+    body: list[tacky.Instruction] = []
+    folded = 0
+    for instr in func.body:
+        replace_reads(instr, substitute)
+        if (new := fold_instruction(instr)) is not instr:
+            folded += 1
+        if new is None:
+            continue
+        body.append(new)
+
+        match new:
+            case tacky.Copy(src=tacky.Constant() as src, dst=tacky.Variable() as dst):
+                if names[dst.id] is None and writes[dst.id] == 1:
+                    constants[dst.id] = src
+
+    func.body = body
+    return folded
+
+
+class ControlFlowGraph:
+    """The basic blocks of a function body with their successors and predecessors by block index. Block 0 is
+    where the function is entered, a block ends after a jump or return or before a label."""
+
+    __slots__ = ("blocks", "predecessors", "successors")
+
+    def __init__(self, body: list[tacky.Instruction]) -> None:
+        self.blocks: list[list[tacky.Instruction]] = [[]]
+        for instr in body:
+            if type(instr) is tacky.Label and self.blocks[-1]:
+                self.blocks.append([])
+            self.blocks[-1].append(instr)
+            if isinstance(instr, jumps) or type(instr) is tacky.Return:
+                self.blocks.append([])
+        if not self.blocks[-1] and len(self.blocks) > 1:
+            self.blocks.pop()
+
+        starts = {
+            block[0].label: idx for idx, block in enumerate(self.blocks) if block and type(block[0]) is tacky.Label
+        }
+        self.successors: list[list[int]] = []
+        for idx, block in enumerate(self.blocks):
+            last = block[-1] if block else None
+            successors = [starts[last.label]] if isinstance(last, jumps) else []
+            if type(last) not in (tacky.Jump, tacky.Return) and idx + 1 < len(self.blocks):
+                successors.append(idx + 1)
+            self.successors.append(successors)
+
+        self.predecessors: list[list[int]] = [[] for _ in self.blocks]
+        for idx in self.reachable():
+            for successor in self.successors[idx]:
+                self.predecessors[successor].append(idx)
+
+    def reachable(self) -> list[int]:
+        seen = [False] * len(self.blocks)
+        seen[0] = True
+        stack = [0]
+        while stack:
+            for successor in self.successors[stack.pop()]:
+                if not seen[successor]:
+                    seen[successor] = True
+                    stack.append(successor)
+        return [idx for idx, reached in enumerate(seen) if reached]
+
+    def body(self) -> list[tacky.Instruction]:
+        return [instr for block in self.blocks for instr in block]
+
+
+jumps = (tacky.Jump, tacky.JumpIfZero, tacky.JumpIfNotZero)
+
+
+def static_variables(func: tacky.FuncDecl) -> set[int]:
+    # the ids of the variables that live in static storage, which the functions this one calls can change
+    return {id_ for id_, static in enumerate(func.variables.static) if static}
+
+
+def propagate_copies(func: tacky.FuncDecl) -> int:
+    """Replace the reads of a variable copied from another value by that value wherever the copy reaches on every
+    path, and drop the copies that write a value the destination already holds. Returns how many operands and
+    copies changed.
+
+    Reaching copies are a forward dataflow analysis over the basic blocks: a copy `dst = src` reaches a point if
+    neither dst nor src is written on any path since. A call may write every static variable.
+    """
+    # every distinct copy is a bit, its source is kept as it was since the copies get rewritten too
+    sources: list[tacky.Value] = []
+    index: dict[tuple[int, type, int], int] = {}
+    # by variable id, the copies writing it and the copies that any write to it kills
+    writes = [0] * len(func.variables)
+    kills = [0] * len(func.variables)
+    for instr in func.body:
+        if type(instr) is tacky.Copy and (key := copy_key(instr)) not in index:
+            bit = index[key] = len(sources)
+            sources.append(instr.src)
+            writes[key[0]] |= 1 << bit
+            kills[key[0]] |= 1 << bit
+            if type(instr.src) is tacky.Variable:
+                kills[instr.src.id] |= 1 << bit
+    if not sources:
+        return 0
+
+    call_kills = 0
+    for id_ in static_variables(func):
+        call_kills |= kills[id_]
+
+    def transfer(instr: tacky.Instruction, reaching: int) -> int:
+        if type(instr) is tacky.Copy:
+            if redundant(instr, reaching):
+                return reaching
+            key = copy_key(instr)
+            return reaching & ~kills[key[0]] | 1 << index[key]
+        if type(instr) is tacky.FuncCall:
+            reaching &= ~call_kills
+        for dst in destinations(instr):
+            if type(dst) is tacky.Variable:
+                reaching &= ~kills[dst.id]
+        return reaching
+
+    def redundant(copy: tacky.Copy, reaching: int) -> bool:
+        # dst already holds src, either copy was made before and neither side has changed since
+        if reaching >> index[copy_key(copy)] & 1:
+            return True
+        dst, _, _ = copy_key(copy)
+        if type(src := copy.src) is not tacky.Variable:
+            return False
+        reverse = index.get((src.id, tacky.Variable, dst))
+        return reverse is not None and bool(reaching >> reverse & 1)
+
+    graph = ControlFlowGraph(func.body)
+    reachable = graph.reachable()
+    universe = (1 << len(sources)) - 1
+    # start from every copy reaching every block, except the entry, and shrink to the greatest fixed point;
+    # unreachable blocks see no copies and are left alone
+    outs = [universe] * len(graph.blocks)
+    ins = [0] * len(graph.blocks)
+    pending = set(reachable)
+    order = list(reachable)
+    while pending:
+        for idx in order:
+            if idx not in pending:
+                continue
+            pending.discard(idx)
+            reaching = 0 if idx == 0 else universe
+            for predecessor in graph.predecessors[idx]:
+                reaching &= outs[predecessor]
+            ins[idx] = reaching
+            for instr in graph.blocks[idx]:
+                reaching = transfer(instr, reaching)
+            if reaching != outs[idx]:
+                outs[idx] = reaching
+                pending.update(graph.successors[idx])
+
+    def replace(value: tacky.Value) -> tacky.Value:
+        # only one copy to a variable can reach at a time, adding one kills the others
+        if type(value) is tacky.Variable and (candidates := reaching & writes[value.id]):
+            return sources[candidates.bit_length() - 1]
+        return value
+
+    changed = 0
+    for idx in reachable:
+        reaching = ins[idx]
+        block: list[tacky.Instruction] = []
+        for instr in graph.blocks[idx]:
+            after = transfer(instr, reaching)
+            if type(instr) is tacky.Copy and (redundant(instr, reaching) or same(replace(instr.src), instr.dst)):
+                changed += 1
+            else:
+                changed += replace_reads(instr, replace)
+                block.append(instr)
+            reaching = after
+        graph.blocks[idx] = block
+
+    func.body = graph.body()
+    return changed
+
+
+def copy_key(copy: tacky.Copy) -> tuple[int, type, int]:
+    # keyed by the type of the source too, so a constant and a variable id never collide
+    assert type(copy.dst) is tacky.Variable
+    if type(src := copy.src) is tacky.Variable:
+        return copy.dst.id, tacky.Variable, src.id
+    assert type(src) is tacky.Constant
+    return copy.dst.id, tacky.Constant, src.value
+
+
+def reads(instr: tacky.Instruction) -> list[tacky.Value]:
+    match instr:
+        case tacky.Unary():
+            return [instr.src]
+        case tacky.Binary():
+            return [instr.left, instr.right]
+        case tacky.Copy():
+            return [instr.src]
+        case tacky.JumpIfZero() | tacky.JumpIfNotZero():
+            return [instr.cond]
+        case tacky.Return():
+            return [instr.value]
+        case tacky.FuncCall():
+            return instr.args
+        case _:
+            return []
+
+
+def eliminate_dead_stores(func: tacky.FuncDecl) -> int:
+    """Drop the instructions whose destinations are all dead, that is never read again before being overwritten,
+    returns how many were dropped.
+
+    Liveness is a backward dataflow analysis over the basic blocks. Static variables are live when the function
+    returns and at every call, which may read them; calls and writes to static variables are always kept.
+    """
+    graph = ControlFlowGraph(func.body)
+    # every variable id is a bit
+    statics = 0
+    for id_ in static_variables(func):
+        statics |= 1 << id_
+
+    def transfer(instr: tacky.Instruction, live: int) -> int:
+        # the variables live before instr, given those live after it
+        for dst in destinations(instr):
+            if type(dst) is tacky.Variable:
+                live &= ~(1 << dst.id)
+        if type(instr) is tacky.FuncCall:
+            live |= statics
+        for src in reads(instr):
+            if type(src) is tacky.Variable:
+                live |= 1 << src.id
+        return live
+
+    def live_out(idx: int) -> int:
+        if not graph.successors[idx]:
+            return statics
+        live = 0
+        for successor in graph.successors[idx]:
+            live |= ins[successor]
+        return live
+
+    # start from nothing live anywhere and grow to the least fixed point, blocks are visited last to first
+    ins = [0] * len(graph.blocks)
+    pending = set(range(len(graph.blocks)))
+    while pending:
+        for idx in reversed(range(len(graph.blocks))):
+            if idx not in pending:
+                continue
+            pending.discard(idx)
+            live = live_out(idx)
+            for instr in reversed(graph.blocks[idx]):
+                live = transfer(instr, live)
+            if live != ins[idx]:
+                ins[idx] = live
+                pending.update(graph.predecessors[idx])
+
+    removed = 0
+    for idx, block in enumerate(graph.blocks):
+        live = live_out(idx)
+        kept: list[tacky.Instruction] = []
+        for instr in reversed(block):
+            if dead(instr, live | statics):
+                removed += 1
+                continue
+            live = transfer(instr, live)
+            kept.append(instr)
+        graph.blocks[idx] = kept[::-1]
+
+    func.body = graph.body()
+    return removed
+
+
+def dead(instr: tacky.Instruction, live: int) -> bool:
+    # calls are kept for what they do besides returning a value, jumps, labels and returns write nothing
+    if type(instr) is tacky.FuncCall or not (dsts := destinations(instr)):
+        return False
+    return not any(type(dst) is tacky.Variable and live >> dst.id & 1 for dst in dsts)
+
+
+def optimize_program(
+    program: tacky.Program, fold: bool = False, propagate: bool = False, eliminate: bool = False
+) -> dict[str, dict[str, int]]:
+    # runs the passes asked for over every function until none changes anything, one pass often enables another;
+    # returns what each pass changed by function name
+    passes: dict[str, Callable[[tacky.FuncDecl], int]] = {}
+    if fold:
+        passes["folded"] = fold_constants
+    if propagate:
+        passes["propagated"] = propagate_copies
+    if eliminate:
+        passes["removed"] = eliminate_dead_stores
+
+    changes: dict[str, dict[str, int]] = {}
+    for func in program.top_level:
+        if not isinstance(func, tacky.FuncDecl):
+            continue
+        counts = changes[func.name] = dict.fromkeys(passes, 0)
+        changed = True
+        while changed:
+            changed = False
+            for name, run in passes.items():
+                if count := run(func):
+                    counts[name] += count
+                    changed = True
+    return changes
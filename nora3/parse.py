@@ -1,8 +1,14 @@
+import os
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
 from inspect import currentframe
-from typing import Iterable
+from typing import Any
 
 from nora3 import tok
 from nora3 import asts
+from nora3 import lex
+from nora3.common import Unreachable
 
 
 # fmt: off
@@ -13,46 +19,138 @@ class ParserError(Exception): ...
 
 
 class TokenTypeError(Exception):
-    def __init__(self, token: tok.Token, expected: Iterable[type[tok.TokenType]]) -> None:
+    def __init__(
+        self, token: tok.BaseToken, expected: Iterable[type[tok.TokenType]], lines: tok.LineIndex | None = None
+    ) -> None:
         self.token = token
         self.expected = expected
+        # looked up now, so the error does not hold on to the source
+        self.line, self.offset = token.position(lines)
 
     def __str__(self) -> str:
         expected = " or ".join(map(str, map(lambda x: x.__name__, self.expected)))
-        return f"expected {expected}, got {self.token.tokentype} @ {self.token.line}:{self.token.offset}"
+        return f"expected {expected}, got {self.token.tokentype} @ {self.line}:{self.offset}"
+
+
+# operator dispatch indexed by tok kind id, None for tokens that are not operators in that position;
+# infix entries are (precedence, right associative, node class)
+prefix_operators: list[type[asts.Unary] | None] = [None] * len(tok.kinds)
+infix_operators: list[tuple[int, bool, type[asts.Binary]] | None] = [None] * len(tok.kinds)
+for kind, tokentype in enumerate(tok.fixed_tokentypes):
+    if asts.Unary.is_unary_tokentype(tokentype):
+        prefix_operators[kind] = asts.Unary.from_tokentype(type(tokentype))
+    try:
+        binary = asts.Binary.from_tokentype(tokentype)
+    except TypeError:
+        continue
+    infix_operators[kind] = (binary.precedence, binary.associativity == "right", binary)
+
+
+def unexpected_eof() -> ParserEofError:
+    # names the parser method that called eat() or peek()
+    assert (frame := currentframe()) is not None
+    assert (eat_frame := frame.f_back) is not None
+    assert (f_back := eat_frame.f_back) is not None
+    calling_function = f_back.f_code.co_name
+    return ParserEofError(f"unexpected EOF found in {calling_function} function")
+
+
+class ExprFrame:
+    """An expr() call of the explicit-stack parser, waiting for its next operand."""
+
+    __slots__ = ("binary_type", "left", "middle", "minimum_precedence")
+
+    def __init__(self, minimum_precedence: int) -> None:
+        self.minimum_precedence = minimum_precedence
+        self.left: asts.Expr | None = None
+        # the operator whose right operand is being parsed; for "?" the middle is parsed first
+        self.binary_type: type[asts.Binary] | None = None
+        self.middle: asts.Expr | None = None
+
+
+class CallFrame:
+    """A function call of the explicit-stack parser, waiting for its next argument."""
+
+    __slots__ = ("args", "name")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.args: list[asts.Expr] = []
+
+
+class UnaryFrame:
+    __slots__ = ("unary_type",)
+
+    def __init__(self, unary_type: type[asts.Unary]) -> None:
+        self.unary_type = unary_type
+
+
+class ParenFrame:
+    __slots__ = ()
+
+
+class StmtFrame:
+    """A statement of the explicit-stack parser, waiting for its next sub-statement or block item."""
+
+    __slots__ = ("items", "kind", "parts")
+
+    def __init__(self, kind: type[tok.TokenType], *parts: Any) -> None:
+        # the token type that opened the statement, an Identifier for a label and a LeftBrace for a block
+        self.kind = kind
+        # what was parsed ahead of the sub-statement: a condition, the for clauses, a label name or case value
+        self.parts = parts
+        # the block items of a block or case so far, and the then branch of an if
+        self.items: list[asts.BlockItem] = []
 
 
 class Parser:
-    tokens: list[tok.Token]
+    tokens: Sequence[tok.BaseToken]
     idx: int = 0
 
-    def __init__(self, tokens: list[tok.Token]) -> None:
+    def __init__(
+        self,
+        tokens: Sequence[tok.BaseToken],
+        explicit_stack: bool = False,
+        lazy_bodies: bool = False,
+        lines: tok.LineIndex | None = None,
+    ) -> None:
         self.tokens = tokens
         self.idx = 0
-
-    def eat(self, expected: type[tok.TokenType] | None = None) -> tok.Token:
+        # positions lazy tokens in diagnostics, lexed token lists and buffers carry their own
+        if lines is None and isinstance(tokens, lex.TokenList | lex.TokenBuffer):
+            lines = tokens.lines
+        self.lines = lines
+        # parse expressions with expr_explicit_stack(), so nesting depth is not bound by the recursion limit
+        self.explicit_stack = explicit_stack
+        # skip function bodies by brace matching, each is parsed when FuncDecl.body is first read
+        self.lazy_bodies = lazy_bodies
+
+    def eat(self, expected: type[tok.TokenType] | None = None) -> tok.BaseToken:
         try:
             token = self.tokens[self.idx]
             self.idx += 1
         except IndexError:
-            assert (frame := currentframe()) is not None
-            assert (f_back := frame.f_back) is not None
-            calling_function = f_back.f_code.co_name
-            raise ParserEofError(f"unexpected EOF found in {calling_function} function")
+            raise unexpected_eof()
 
         if expected is None or isinstance(token.tokentype, expected):
             return token
         else:
-            raise TokenTypeError(token, [expected])
+            raise TokenTypeError(token, [expected], self.lines)
+
+    def position(self, token: tok.BaseToken) -> tuple[int, int]:
+        return token.position(self.lines)
 
-    def peek(self) -> tok.Token:
+    def peek(self) -> tok.BaseToken:
         try:
             return self.tokens[self.idx]
         except IndexError:
-            assert (frame := currentframe()) is not None
-            assert (f_back := frame.f_back) is not None
-            calling_function = f_back.f_code.co_name
-            raise ParserEofError(f"unexpected EOF found in {calling_function} function")
+            raise unexpected_eof()
+
+    def peek_kind(self) -> int:
+        try:
+            return self.tokens[self.idx].tokentype.kind
+        except IndexError:
+            raise unexpected_eof()
 
     def peek2(self, tokentype: type[tok.TokenType]) -> bool:
         try:
@@ -84,20 +182,28 @@ class Parser:
                 return asts.FuncCall(name, args)
             case tok.Identifier:
                 res = asts.Variable(token)
-            case t if asts.Unary.is_unary_tokentype(t()):
+            case _ if (unary := prefix_operators[token.tokentype.kind]) is not None:
                 inner = self.factor()
-                res = asts.Unary.from_tokentype(t)(inner)
+                res = unary(inner)
             case tok.LeftParen:
                 inner = self.expr()
                 _ = self.eat(tok.RightParen)
                 res = inner
             case _:
-                raise ParserError(
-                    f"expected an expression, found {token.tokentype} @ {token.line}:{token.offset - len(token)}"
-                )
+                line, offset = self.position(token)
+                raise ParserError(f"expected an expression, found {token.tokentype} @ {line}:{offset - len(token)}")
 
         # prefix incr/decr are parsed via the parser as unary operators
         # postfix incr/decr are added here after individual factors
+        return self.postfix(res)
+
+    def conditional_middle(self) -> asts.Expr:
+        _ = self.eat(tok.Question)
+        middle = self.expr()
+        _ = self.eat(tok.Colon)
+        return middle
+
+    def postfix(self, res: asts.Expr) -> asts.Expr:
         match self.peek().tokentype:
             case tok.PlusPlus():
                 _ = self.eat()
@@ -108,37 +214,125 @@ class Parser:
             case _:
                 return res
 
-    def conditional_middle(self) -> asts.Expr:
-        _ = self.eat(tok.Question)
-        middle = self.expr()
-        _ = self.eat(tok.Colon)
-        return middle
+    def expr_explicit_stack(self, minimum_precedence: int = 0) -> asts.Expr:
+        """expr() and factor() with their pending calls kept on a list instead of the python stack.
+
+        Builds the same trees as the recursive parser: at most one postfix operator after each factor,
+        none after a function call.
+        """
+        frames: list[ExprFrame | CallFrame | UnaryFrame | ParenFrame] = [ExprFrame(minimum_precedence)]
+        # the operand just completed, None while the next factor still has to be parsed
+        value: asts.Expr | None = None
 
-    def expr(self, minimum_precedence: int = 0) -> asts.Expr:
-        left = self.factor()
         while True:
-            next_token = self.peek()
+            if value is None:
+                match type((token := self.eat()).tokentype):
+                    case tok.LiteralInt:
+                        value = self.postfix(asts.Constant(int(token.tokentype.value)))
+                    case tok.Identifier if self.peek().tokentype is tok.LeftParen():
+                        _ = self.eat(tok.LeftParen)
+                        if self.peek().tokentype is tok.RightParen():
+                            _ = self.eat()
+                            value = asts.FuncCall(token.tokentype.value, [])
+                        else:
+                            frames.append(CallFrame(token.tokentype.value))
+                            frames.append(ExprFrame(0))
+                    case tok.Identifier:
+                        value = self.postfix(asts.Variable(token))
+                    case _ if (unary := prefix_operators[token.tokentype.kind]) is not None:
+                        frames.append(UnaryFrame(unary))
+                    case tok.LeftParen:
+                        frames.append(ParenFrame())
+                        frames.append(ExprFrame(0))
+                    case _:
+                        line, offset = self.position(token)
+                        raise ParserError(
+                            f"expected an expression, found {token.tokentype} @ {line}:{offset - len(token)}"
+                        )
+                continue
+
+            match frame := frames[-1]:
+                case ExprFrame(binary_type=None, left=None):
+                    frame.left = value
+                case ExprFrame(binary_type=asts.Conditional, middle=None):
+                    frame.middle = value
+                    _ = self.eat(tok.Colon)
+                    frames.append(ExprFrame(asts.Conditional.precedence + 1))
+                    value = None
+                    continue
+                case ExprFrame(binary_type=asts.Conditional):
+                    assert frame.left is not None and frame.middle is not None
+                    frame.left = asts.Conditional(frame.left, frame.middle, value)
+                    frame.binary_type = frame.middle = None
+                case ExprFrame():
+                    assert frame.left is not None and frame.binary_type is not None
+                    frame.left = frame.binary_type(frame.left, value)
+                    frame.binary_type = None
+                case CallFrame():
+                    frame.args.append(value)
+                    if self.peek().tokentype is tok.RightParen():
+                        _ = self.eat()
+                        frames.pop()
+                        value = asts.FuncCall(frame.name, frame.args)
+                    else:
+                        _ = self.eat(tok.Comma)
+                        frames.append(ExprFrame(0))
+                        value = None
+                    continue
+                case UnaryFrame():
+                    frames.pop()
+                    value = self.postfix(frame.unary_type(value))
+                    continue
+                case ParenFrame():
+                    _ = self.eat(tok.RightParen)
+                    frames.pop()
+                    value = self.postfix(value)
+                    continue
+
+            # the expression frame has a left operand, it either takes the next operator or is complete
+            assert isinstance(frame, ExprFrame) and frame.left is not None
+            infix = infix_operators[self.peek_kind()]
+            if infix is None or infix[0] < frame.minimum_precedence:
+                frames.pop()
+                if not frames:
+                    return frame.left
+                value = frame.left
+                continue
+
+            precedence, right_associative, binary_type = infix
+            frame.binary_type = binary_type
+            if right_associative:
+                _ = self.eat()
+                frames.append(ExprFrame(precedence))
+            elif binary_type is asts.Conditional:
+                _ = self.eat(tok.Question)
+                frames.append(ExprFrame(0))
+            else:
+                _ = self.eat()
+                frames.append(ExprFrame(precedence + 1))
+            value = None
 
-            try:
-                binary_type = asts.Binary.from_tokentype(next_token.tokentype)
-            except TypeError:
-                break
+    def expr(self, minimum_precedence: int = 0) -> asts.Expr:
+        if self.explicit_stack:
+            return self.expr_explicit_stack(minimum_precedence)
 
-            if binary_type.precedence < minimum_precedence:
+        left = self.factor()
+        while (infix := infix_operators[self.peek_kind()]) is not None:
+            precedence, right_associative, binary_type = infix
+            if precedence < minimum_precedence:
                 break
 
-            if binary_type.associativity == "right":
-                assert binary_type.precedence == 1
+            if right_associative:
                 _ = self.eat()
-                right = self.expr(binary_type.precedence)
+                right = self.expr(precedence)
                 left = binary_type(left, right)
-            elif binary_type.precedence == 3:
+            elif binary_type is asts.Conditional:
                 middle = self.conditional_middle()
-                right = self.expr(binary_type.precedence + 1)
+                right = self.expr(precedence + 1)
                 left = asts.Conditional(left, middle, right)
             else:
                 _ = self.eat()
-                right = self.expr(binary_type.precedence + 1)
+                right = self.expr(precedence + 1)
                 left = binary_type(left, right)
 
         return left
@@ -186,7 +380,7 @@ class Parser:
                 _ = self.eat(tok.Equal)
                 expr = self.expr()
             case _:
-                raise TokenTypeError(token, (tok.Semicolon, tok.Equal))
+                raise TokenTypeError(token, (tok.Semicolon, tok.Equal), self.lines)
 
         _ = self.eat(tok.Semicolon)
         return asts.VarDecl(name, expr, type_, storage_class)
@@ -217,6 +411,9 @@ class Parser:
             _ = self.eat(tok.Semicolon)
             return asts.FuncDecl(name, params, None, type_, storage_class)
 
+        if self.lazy_bodies:
+            return asts.FuncDecl(name, params, None, type_, storage_class, self.lazy_body())
+
         _ = self.eat(tok.LeftBrace)
         body: list[asts.BlockItem] = []
         while self.peek().tokentype is not tok.RightBrace():
@@ -225,6 +422,44 @@ class Parser:
 
         return asts.FuncDecl(name, params, asts.Block(body), type_, storage_class)
 
+    def compound_body(self) -> asts.Block:
+        # a body the brace matching already checked, parsed as a compound statement
+        assert isinstance((compound := self.stmt()), asts.Compound)
+        return compound.block
+
+    def skip_body(self, skipped: list[tok.BaseToken] | None = None) -> set[str]:
+        # moves past the "}" matching the next "{", returning the identifiers in between
+        names: set[str] = set()
+        token = self.eat(tok.LeftBrace)
+        if skipped is not None:
+            skipped.append(token)
+
+        depth = 1
+        while depth:
+            token = self.eat()
+            if skipped is not None:
+                skipped.append(token)
+            if (tokentype := token.tokentype) is tok.LeftBrace():
+                depth += 1
+            elif tokentype is tok.RightBrace():
+                depth -= 1
+            elif isinstance(tokentype, tok.Identifier):
+                names.add(tokentype.value)
+
+        return names
+
+    def lazy_body(self) -> asts.LazyBody:
+        start = self.idx
+        names = self.skip_body()
+        parser = type(self)(self.tokens, self.explicit_stack)
+        parser.lines = self.lines
+
+        def parse() -> asts.Block:
+            parser.idx = start
+            return parser.compound_body()
+
+        return asts.LazyBody(parse, names)
+
     def declaration(self) -> asts.Declaration:
         specifiers: list[tok.Specifier] = []
         while isinstance((specifier := self.peek()).tokentype, tok.Specifier):
@@ -233,7 +468,8 @@ class Parser:
         try:
             type_, storage_class = self.type_and_storage_class(specifiers)
         except ParserError as e:
-            raise ParserError(f"{e} @ {specifier.line}:{specifier.offset}")
+            line, offset = self.position(specifier)
+            raise ParserError(f"{e} @ {line}:{offset}")
 
         name = self.eat(tok.Identifier).tokentype.value
 
@@ -249,7 +485,8 @@ class Parser:
         elif token.tokentype is tok.Int():
             decl = self.declaration()
             if isinstance(decl, asts.FuncDecl):
-                raise ParserError(f"cannot declare function in for loop init @ {token.line}:{token.offset}")
+                line, offset = self.position(token)
+                raise ParserError(f"cannot declare function in for loop init @ {line}:{offset}")
             return decl
         else:
             expr = self.expr()
@@ -268,13 +505,163 @@ class Parser:
                     stmts.append(self.block_item())
         return asts.Block(stmts)
 
-    def stmt(self) -> asts.Stmt:
+    def simple_stmt(self) -> asts.Stmt:
+        # the statements without a sub-statement
         match type(self.peek().tokentype):
             case tok.Return:
                 _ = self.eat(tok.Return)
                 expr = self.expr()
                 _ = self.eat(tok.Semicolon)
                 return asts.Return(expr)
+            case tok.Goto:
+                _ = self.eat(tok.Goto)
+                target = self.eat(tok.Identifier).tokentype.value
+                _ = self.eat(tok.Semicolon)
+                return asts.Goto(target)
+            case tok.Semicolon:
+                _ = self.eat(tok.Semicolon)
+                return asts.Null()
+            case tok.Break:
+                _ = self.eat(tok.Break)
+                _ = self.eat(tok.Semicolon)
+                return asts.Break()
+            case tok.Continue:
+                _ = self.eat(tok.Continue)
+                _ = self.eat(tok.Semicolon)
+                return asts.Continue()
+            case _:
+                stmt = asts.Expression(self.expr())
+                _ = self.eat(tok.Semicolon)
+                return stmt
+
+    def stmt_explicit_stack(self) -> asts.Stmt:
+        """stmt() with the enclosing statements kept on a list instead of the python stack.
+
+        Chains of else if, nested blocks and loops build the same trees as the recursive parser.
+        """
+        frames: list[StmtFrame] = []
+        while True:
+            # a compound statement, or a case after its first statement, takes block items
+            if (
+                frames
+                and (frames[-1].kind is tok.LeftBrace or (frames[-1].kind is tok.Case and frames[-1].items))
+                and isinstance(self.peek().tokentype, tok.Specifier)
+            ):
+                item: asts.BlockItem = self.declaration()
+            else:
+                match type(self.peek().tokentype):
+                    case tok.If:
+                        _ = self.eat(tok.If)
+                        _ = self.eat(tok.LeftParen)
+                        cond = self.expr(0)
+                        _ = self.eat(tok.RightParen)
+                        frames.append(StmtFrame(tok.If, cond))
+                        continue
+                    case tok.Identifier if self.peek2(tok.Colon):
+                        name = self.eat(tok.Identifier).tokentype.value
+                        _ = self.eat(tok.Colon)
+                        frames.append(StmtFrame(tok.Identifier, name))
+                        continue
+                    case tok.LeftBrace:
+                        _ = self.eat(tok.LeftBrace)
+                        if self.peek().tokentype is not tok.RightBrace():
+                            frames.append(StmtFrame(tok.LeftBrace))
+                            continue
+                        _ = self.eat(tok.RightBrace)
+                        item = asts.Compound(asts.Block([]))
+                    case tok.While:
+                        _ = self.eat(tok.While)
+                        _ = self.eat(tok.LeftParen)
+                        cond = self.expr()
+                        _ = self.eat(tok.RightParen)
+                        frames.append(StmtFrame(tok.While, cond))
+                        continue
+                    case tok.Do:
+                        _ = self.eat(tok.Do)
+                        frames.append(StmtFrame(tok.Do))
+                        continue
+                    case tok.For:
+                        _ = self.eat(tok.For)
+                        _ = self.eat(tok.LeftParen)
+                        init = self.for_init()
+                        maybe_cond = None if self.peek().tokentype is tok.Semicolon() else self.expr()
+                        _ = self.eat(tok.Semicolon)
+                        maybe_post = None if self.peek().tokentype is tok.RightParen() else self.expr()
+                        _ = self.eat(tok.RightParen)
+                        frames.append(StmtFrame(tok.For, init, maybe_cond, maybe_post))
+                        continue
+                    case tok.Switch:
+                        _ = self.eat(tok.Switch)
+                        _ = self.eat(tok.LeftParen)
+                        cond = self.expr()
+                        _ = self.eat(tok.RightParen)
+                        frames.append(StmtFrame(tok.Switch, cond))
+                        continue
+                    case tok.Case:
+                        _ = self.eat(tok.Case)
+                        value = self.expr()
+                        _ = self.eat(tok.Colon)
+                        frames.append(StmtFrame(tok.Case, value))
+                        continue
+                    case tok.Default:
+                        _ = self.eat(tok.Default)
+                        _ = self.eat(tok.Colon)
+                        frames.append(StmtFrame(tok.Default))
+                        continue
+                    case _:
+                        item = self.simple_stmt()
+
+            # hand the completed item to the enclosing statements, until one needs another sub-statement
+            while frames:
+                frame = frames[-1]
+                match frame.kind:
+                    case tok.If if not frame.items:
+                        frame.items.append(item)
+                        if isinstance(self.peek().tokentype, tok.Else):
+                            _ = self.eat(tok.Else)
+                            break
+                        item = asts.If(frame.parts[0], item, None)
+                    case tok.If:
+                        item = asts.If(frame.parts[0], frame.items[0], item)
+                    case tok.Identifier:
+                        item = asts.Label(frame.parts[0], item)
+                    case tok.LeftBrace:
+                        frame.items.append(item)
+                        if self.peek().tokentype is not tok.RightBrace():
+                            break
+                        _ = self.eat(tok.RightBrace)
+                        item = asts.Compound(asts.Block(frame.items))
+                    case tok.While:
+                        item = asts.While(frame.parts[0], item)
+                    case tok.Do:
+                        _ = self.eat(tok.While)
+                        _ = self.eat(tok.LeftParen)
+                        cond = self.expr()
+                        _ = self.eat(tok.RightParen)
+                        _ = self.eat(tok.Semicolon)
+                        item = asts.DoWhile(cond, item)
+                    case tok.For:
+                        init, maybe_cond, maybe_post = frame.parts
+                        item = asts.For(init, maybe_cond, maybe_post, item)
+                    case tok.Switch:
+                        item = asts.Switch(frame.parts[0], item)
+                    case tok.Case:
+                        frame.items.append(item)
+                        if not isinstance(self.peek().tokentype, tok.RightBrace | tok.Default | tok.Case):
+                            break
+                        item = asts.Case(frame.parts[0], asts.Block(frame.items))
+                    case tok.Default:
+                        item = asts.Default(item)
+                frames.pop()
+            else:
+                assert isinstance(item, asts.Stmt)
+                return item
+
+    def stmt(self) -> asts.Stmt:
+        if self.explicit_stack:
+            return self.stmt_explicit_stack()
+
+        match type(self.peek().tokentype):
             case tok.If:
                 _ = self.eat(tok.If)
                 _ = self.eat(tok.LeftParen)
@@ -287,14 +674,6 @@ class Parser:
                 else:
                     else_ = None
                 return asts.If(cond, then, else_)
-            case tok.Goto:
-                _ = self.eat(tok.Goto)
-                target = self.eat(tok.Identifier).tokentype.value
-                _ = self.eat(tok.Semicolon)
-                return asts.Goto(target)
-            case tok.Semicolon:
-                _ = self.eat(tok.Semicolon)
-                return asts.Null()
             case tok.Identifier if self.peek2(tok.Colon):
                 name = self.eat(tok.Identifier).tokentype.value
                 _ = self.eat(tok.Colon)
@@ -308,14 +687,6 @@ class Parser:
                     items.append(item)
                 _ = self.eat(tok.RightBrace)
                 return asts.Compound(asts.Block(items))
-            case tok.Break:
-                _ = self.eat(tok.Break)
-                _ = self.eat(tok.Semicolon)
-                return asts.Break()
-            case tok.Continue:
-                _ = self.eat(tok.Continue)
-                _ = self.eat(tok.Semicolon)
-                return asts.Continue()
             case tok.While:
                 _ = self.eat(tok.While)
                 _ = self.eat(tok.LeftParen)
@@ -361,9 +732,7 @@ class Parser:
                 body = self.stmt()
                 return asts.Default(body)
             case _:
-                stmt = asts.Expression(self.expr())
-                _ = self.eat(tok.Semicolon)
-                return stmt
+                return self.simple_stmt()
 
     def block_item(self) -> asts.BlockItem:
         match self.peek().tokentype:
@@ -372,9 +741,12 @@ class Parser:
             case _:
                 return self.stmt()
 
+    def at_end(self) -> bool:
+        return self.idx >= len(self.tokens)
+
     def program(self) -> asts.Program:
         functions = []
-        while self.idx < len(self.tokens):
+        while not self.at_end():
             assert isinstance((func := self.declaration()), asts.Declaration)
             functions.append(func)
 
@@ -382,3 +754,202 @@ class Parser:
 
     def parse(self) -> asts.Program:
         return self.program()
+
+    def kinds(self) -> Sequence[int]:
+        return [token.tokentype.kind for token in self.tokens]
+
+    def tokentypes(self, start: int, end: int) -> list[tok.TokenType]:
+        return [token.tokentype for token in self.tokens[start:end]]
+
+    def declaration_starts(self) -> list[int]:
+        # token index of each top-level declaration, found after every ";" or closing "}" at brace depth 0
+        left, right, semicolon = tok.LeftBrace.kind, tok.RightBrace.kind, tok.Semicolon.kind
+        kinds = self.kinds()
+        starts = [self.idx]
+        depth = 0
+        for idx in range(self.idx, len(kinds)):
+            if (kind := kinds[idx]) == left:
+                depth += 1
+            elif kind == right:
+                depth -= 1
+                if not depth:
+                    starts.append(idx + 1)
+            elif kind == semicolon and not depth:
+                starts.append(idx + 1)
+
+        if starts[-1] == len(kinds):
+            starts.pop()
+        return starts
+
+    def program_parallel(self, workers: int | None = None, min_declarations: int = 256) -> asts.Program:
+        """program() over chunks of at least min_declarations top-level declarations, parsed in a pool of worker
+        processes and joined in source order.
+
+        Workers parse eagerly, so lazy_bodies falls back to program(). So does a chunk that fails to parse,
+        program() then raises the error with its usual message and position.
+        """
+        workers = workers or os.process_cpu_count() or 1
+        if self.lazy_bodies:
+            return self.program()
+        starts = self.declaration_starts()
+        if (nchunks := min(workers, len(starts) // max(min_declarations, 1))) <= 1:
+            return self.program()
+
+        points = [starts[len(starts) * chunk // nchunks] for chunk in range(nchunks)]
+        chunks = [self.tokentypes(start, end) for start, end in zip(points, [*points[1:], len(self.tokens)])]
+
+        decls: list[asts.Declaration] = []
+        with ProcessPoolExecutor(workers) as pool:
+            for chunk_decls in pool.map(parse_chunk, chunks, [self.explicit_stack] * nchunks):
+                if chunk_decls is None:
+                    return self.program()
+                decls.extend(chunk_decls)
+
+        self.idx = len(self.tokens)
+        return asts.Program(decls, {})
+
+
+# the errors of a chunk that does not parse on its own
+chunk_errors = (ParserEofError, ParserError, TemporaryParseError, TokenTypeError)
+
+
+def parse_chunk(tokentypes: list[tok.TokenType], explicit_stack: bool) -> list[asts.Declaration] | None:
+    # one program_parallel() chunk, without positions; None if it does not parse on its own
+    tokens = [tok.Token(-1, -1, tokentype) for tokentype in tokentypes]
+    try:
+        return Parser(tokens, explicit_stack).program().decls
+    except chunk_errors:
+        return None
+
+
+class BufferParser(Parser):
+    """Parser over a lex.TokenBuffer, checking token types against its columns and building each token once."""
+
+    tokens: lex.TokenBuffer
+
+    def __init__(self, tokens: lex.TokenBuffer, explicit_stack: bool = False, lazy_bodies: bool = False) -> None:
+        super().__init__(tokens, explicit_stack, lazy_bodies)
+        self.current: tok.LazyToken | None = None
+        self.current_idx = -1
+
+    def token(self) -> tok.LazyToken:
+        if self.current_idx != self.idx or self.current is None:
+            self.current = self.tokens[self.idx]
+            self.current_idx = self.idx
+        return self.current
+
+    def eat(self, expected: type[tok.TokenType] | None = None) -> tok.BaseToken:
+        if self.idx >= len(self.tokens):
+            raise unexpected_eof()
+
+        if expected is not None and not isinstance(self.tokens.tokentype(self.idx), expected):
+            raise TokenTypeError(self.token(), [expected], self.lines)
+
+        token = self.token()
+        self.idx += 1
+        return token
+
+    def peek(self) -> tok.BaseToken:
+        if self.idx >= len(self.tokens):
+            raise unexpected_eof()
+        return self.token()
+
+    def peek_kind(self) -> int:
+        if self.idx >= len(self.tokens):
+            raise unexpected_eof()
+        return self.tokens.kinds[self.idx]
+
+    def peek2(self, tokentype: type[tok.TokenType]) -> bool:
+        return self.idx + 1 < len(self.tokens) and isinstance(self.tokens.tokentype(self.idx + 1), tokentype)
+
+    def kinds(self) -> Sequence[int]:
+        return self.tokens.kinds
+
+    def tokentypes(self, start: int, end: int) -> list[tok.TokenType]:
+        return [self.tokens.tokentype(idx) for idx in range(start, end)]
+
+    def skip_body(self, skipped: list[tok.BaseToken] | None = None) -> set[str]:
+        # brace matching over the kinds column, without building the skipped tokens
+        _ = self.eat(tok.LeftBrace)
+        kinds, values, interned = self.tokens.kinds, self.tokens.values, self.tokens.interned
+        left, right, identifier = tok.LeftBrace.kind, tok.RightBrace.kind, tok.Identifier.kind
+
+        names: set[str] = set()
+        depth = 1
+        for idx in range(self.idx, len(kinds)):
+            if (kind := kinds[idx]) == left:
+                depth += 1
+            elif kind == right:
+                depth -= 1
+                if not depth:
+                    self.idx = idx + 1
+                    return names
+            elif kind == identifier:
+                names.add(interned[values[idx]].value)
+
+        # raised through eat() so the error names skip_body, as the list parser's does
+        self.idx = len(kinds)
+        _ = self.eat()
+        return Unreachable()
+
+
+class StreamParser(Parser):
+    """Parser pulling tokens from an iterator through a two-token lookahead, so lexing and parsing interleave."""
+
+    def __init__(
+        self,
+        tokens: Iterator[tok.BaseToken],
+        explicit_stack: bool = False,
+        lazy_bodies: bool = False,
+        lines: tok.LineIndex | None = None,
+    ) -> None:
+        super().__init__([], explicit_stack, lazy_bodies, lines)
+        self.stream = tokens
+        self.lookahead: deque[tok.BaseToken] = deque()
+
+    def fill(self, ntokens: int) -> bool:
+        while len(self.lookahead) < ntokens:
+            try:
+                self.lookahead.append(next(self.stream))
+            except StopIteration:
+                return False
+        return True
+
+    def eat(self, expected: type[tok.TokenType] | None = None) -> tok.BaseToken:
+        if not self.fill(1):
+            raise unexpected_eof()
+
+        token = self.lookahead.popleft()
+        self.idx += 1
+
+        if expected is None or isinstance(token.tokentype, expected):
+            return token
+        else:
+            raise TokenTypeError(token, [expected], self.lines)
+
+    def peek(self) -> tok.BaseToken:
+        if not self.fill(1):
+            raise unexpected_eof()
+        return self.lookahead[0]
+
+    def peek_kind(self) -> int:
+        if not self.fill(1):
+            raise unexpected_eof()
+        return self.lookahead[0].tokentype.kind
+
+    def peek2(self, tokentype: type[tok.TokenType]) -> bool:
+        return self.fill(2) and isinstance(self.lookahead[1].tokentype, tokentype)
+
+    def at_end(self) -> bool:
+        return not self.fill(1)
+
+    def lazy_body(self) -> asts.LazyBody:
+        # streamed tokens are gone once eaten, so the body keeps its own
+        skipped: list[tok.BaseToken] = []
+        names = self.skip_body(skipped)
+        parser = Parser(skipped, self.explicit_stack, lines=self.lines)
+        return asts.LazyBody(parser.compound_body, names)
+
+    def program_parallel(self, workers: int | None = None, min_declarations: int = 256) -> asts.Program:
+        # the declarations can only be split once every token is read
+        return self.program()
@@ -0,0 +1,438 @@
+import operator
+import os
+import re
+from collections.abc import Callable, Sequence
+
+from nora3 import asts, lex, parse, tok
+
+# directive name and the rest of the line; the text after "#" is all there is to a null directive
+directive_pattern = re.compile(r"#\s*(\w*)\s*(.*)")
+include_pattern = re.compile(r'"([^"]+)"|<([^>]+)>')
+# parameters belong to the macro only when "(" follows the name directly
+define_pattern = re.compile(r"([A-Za-z_]\w*)(?:\(([^)]*)\))?\s*(.*)")
+identifier_pattern = re.compile(r"[A-Za-z_]\w*")
+# blanked out of a directive before it is read, keeping the offsets of what is left
+directive_noise_pattern = re.compile(r"\\\n|//[^\n]*|/\*.*?\*/", re.DOTALL)
+
+MAX_INCLUDE_DEPTH = 200
+
+# a token during macro expansion and the hide set of macros that may not expand it again
+type HiddenToken = tuple[tok.Token, frozenset[str]]
+
+
+# fmt: off
+class PreprocessorError(Exception): ...
+# fmt: on
+
+
+class Macro:
+    def __init__(self, name: str, params: list[str] | None, body: list[tok.Token]) -> None:
+        self.name = name
+        # None for object-like macros
+        self.params = params
+        self.body = body
+
+    def __repr__(self) -> str:
+        params = "" if self.params is None else f"({', '.join(self.params)})"
+        return f"Macro({self.name}{params} {' '.join(token.tokentype.value for token in self.body)})"
+
+
+class SourceFile:
+    """A source lexed once with its directives kept as tok.Pound tokens, and the include guard it is wrapped in."""
+
+    def __init__(self, path: str, src: str, mtime_ns: int = -1) -> None:
+        self.path = path
+        self.src = src
+        self.mtime_ns = mtime_ns
+
+        lexer = lex.Lexer(src, lazy_positions=True, directives=True)
+        try:
+            self.tokens = lexer.lex()
+        except lex.InvalidCharacter as e:
+            if e.value == "\\" and src.startswith("\n", lexer.idx):
+                raise PreprocessorError(f"line continuation outside a directive is not supported @ {path}:{e.line}")
+            raise
+        self.lines = lexer.lines
+        self.guard = self.include_guard()
+
+    def directive(self, token: tok.BaseToken) -> tuple[str, str, int]:
+        # directive name, the text after it and where that text starts in src; comments and line continuations
+        # become spaces
+        assert isinstance(token, tok.LazyToken)
+        lexeme = lex.directive_scanner.match(self.src, token.idx)
+        assert lexeme is not None
+        text = directive_noise_pattern.sub(lambda noise: " " * len(noise.group()), lexeme.group())
+        found = directive_pattern.match(text)
+        assert found is not None
+        return found.group(1), found.group(2).rstrip(), token.idx + found.start(2)
+
+    def located(self, token: tok.BaseToken) -> tok.Token:
+        # a token of this file with its position looked up, expansion mixes the tokens of every file
+        return tok.Token(*token.position(self.lines), token.tokentype)
+
+    def tokens_at(self, text: str, start: int) -> list[tok.Token]:
+        # tokens of directive text found at src[start:], positioned in this file
+        tokens: list[tok.Token] = []
+        for token in lex.Lexer(text, lazy_positions=True).iter_tokens():
+            assert isinstance(token, tok.LazyToken)
+            tokens.append(self.located(tok.LazyToken(token.tokentype, start + token.idx)))
+        return tokens
+
+    def include_guard(self) -> str | None:
+        # the X of a file that is nothing but "#ifndef X", "#define X", ..., "#endif"
+        pound = tok.Pound()
+        if len(self.tokens) < 3 or self.tokens[0].tokentype is not pound or self.tokens[1].tokentype is not pound:
+            return None
+        name, guard, _ = self.directive(self.tokens[0])
+        if name != "ifndef" or (define := self.directive(self.tokens[1]))[0] != "define" or define[1] != guard:
+            return None
+
+        depth = 0
+        for idx, token in enumerate(self.tokens):
+            if token.tokentype is pound:
+                match self.directive(token)[0]:
+                    case "if" | "ifdef" | "ifndef":
+                        depth += 1
+                    case "endif":
+                        depth -= 1
+                        if depth == 0:
+                            return guard if idx == len(self.tokens) - 1 else None
+        return None
+
+
+class IncludeCache:
+    """Lexed sources by path, reused while the file's mtime is unchanged."""
+
+    def __init__(self) -> None:
+        self.files: dict[str, SourceFile] = {}
+
+    def load(self, path: str) -> SourceFile:
+        mtime_ns = os.stat(path).st_mtime_ns
+        if (cached := self.files.get(path)) is not None and cached.mtime_ns == mtime_ns:
+            return cached
+
+        with open(path, "r") as fh:
+            source = SourceFile(path, fh.read(), mtime_ns)
+        self.files[path] = source
+        return source
+
+
+# shared by every Preprocessor that is not given its own, so a batch of compilations lexes each header once
+include_cache = IncludeCache()
+
+
+def c_divide(left: int, right: int) -> int:
+    if right == 0:
+        raise PreprocessorError("division by zero in #if")
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
+
+def c_remainder(left: int, right: int) -> int:
+    return left - right * c_divide(left, right)
+
+
+def c_shift(shift: Callable[[int, int], int]) -> Callable[[int, int], int]:
+    # #if arithmetic is in intmax_t, shifting by a negative count or by its width or more is undefined
+    def checked(left: int, right: int) -> int:
+        if not 0 <= right < 64:
+            raise PreprocessorError(f"shift count {right} out of range in #if")
+        return shift(left, right)
+
+    return checked
+
+
+binary_operators: dict[type[asts.Binary], Callable[[int, int], int]] = {
+    asts.Multiply: operator.mul,
+    asts.Divide: c_divide,
+    asts.Remainder: c_remainder,
+    asts.Add: operator.add,
+    asts.Subtract: operator.sub,
+    asts.LeftShift: c_shift(operator.lshift),
+    asts.RightShift: c_shift(operator.rshift),
+    asts.LessThan: lambda left, right: int(left < right),
+    asts.LessOrEqual: lambda left, right: int(left <= right),
+    asts.GreaterThan: lambda left, right: int(left > right),
+    asts.GreaterOrEqual: lambda left, right: int(left >= right),
+    asts.Equal: lambda left, right: int(left == right),
+    asts.NotEqual: lambda left, right: int(left != right),
+    asts.BitwiseAnd: operator.and_,
+    asts.BitwiseXOr: operator.xor,
+    asts.BitwiseOr: operator.or_,
+}
+
+
+def evaluate(expr: asts.Expr) -> int:
+    match expr:
+        case asts.Constant():
+            return expr.value
+        case asts.Negate():
+            return -evaluate(expr.expr)
+        case asts.Complement():
+            return ~evaluate(expr.expr)
+        case asts.Not():
+            return int(not evaluate(expr.expr))
+        case asts.And():
+            return int(bool(evaluate(expr.left)) and bool(evaluate(expr.right)))
+        case asts.Or():
+            return int(bool(evaluate(expr.left)) or bool(evaluate(expr.right)))
+        case asts.Conditional():
+            return evaluate(expr.middle) if evaluate(expr.left) else evaluate(expr.right)
+        case asts.Binary() if type(expr) in binary_operators:
+            return binary_operators[type(expr)](evaluate(expr.left), evaluate(expr.right))
+        case _:
+            raise PreprocessorError(f"invalid expression in #if: {expr}")
+
+
+class Group:
+    """One #if ... #endif level."""
+
+    def __init__(self, enclosing_active: bool, active: bool) -> None:
+        self.enclosing_active = enclosing_active
+        self.active = active
+        # some branch of the group has been active, the rest are skipped
+        self.taken = active
+        self.seen_else = False
+
+
+class Preprocessor:
+    """Runs directives and expands macros over lexed tokens, in place of an external `gcc -E`.
+
+    Supports #include, object and function-like #define, #undef, #if/#ifdef/#ifndef/#elif/#else/#endif,
+    #error and #pragma once. There are no string literals, so macros have no # and ## operators.
+    The tokens come from every included file, so they are returned as tok.Token with their positions looked up.
+    """
+
+    def __init__(self, include_dirs: Sequence[str] = (), cache: IncludeCache | None = None) -> None:
+        self.include_dirs = list(include_dirs)
+        self.cache = include_cache if cache is None else cache
+        self.macros: dict[str, Macro] = {}
+        # headers that never need reading again in this compilation, by real path
+        self.once: set[str] = set()
+        self.guards: dict[str, str] = {}
+
+    def preprocess(self, src: str, filename: str = "<input>") -> list[tok.BaseToken]:
+        tokens: list[tok.BaseToken] = []
+        self.process(SourceFile(os.path.realpath(filename), src), tokens, 0)
+        return tokens
+
+    def preprocess_file(self, filename: str) -> list[tok.BaseToken]:
+        tokens: list[tok.BaseToken] = []
+        self.process(self.cache.load(os.path.realpath(filename)), tokens, 0)
+        return tokens
+
+    def process(self, source: SourceFile, out: list[tok.BaseToken], depth: int) -> None:
+        groups: list[Group] = []
+        pound = tok.Pound()
+
+        pending: list[tok.Token] = []
+        for token in source.tokens:
+            if token.tokentype is not pound:
+                if not groups or groups[-1].active:
+                    pending.append(source.located(token))
+                continue
+
+            # function-like macro arguments do not run across directives
+            out.extend(self.expand(pending, frozenset()))
+            pending = []
+            self.directive(source, token, groups, out, depth)
+        out.extend(self.expand(pending, frozenset()))
+
+        if groups:
+            raise PreprocessorError(f"unterminated conditional directive @ {source.path}")
+
+    def error(self, message: str, source: SourceFile, token: tok.BaseToken) -> PreprocessorError:
+        return PreprocessorError(f"{message} @ {source.path}:{token.position(source.lines)[0]}")
+
+    def directive(
+        self, source: SourceFile, token: tok.BaseToken, groups: list[Group], out: list[tok.BaseToken], depth: int
+    ) -> None:
+        name, text, start = source.directive(token)
+        active = not groups or groups[-1].active
+
+        match name:
+            case "if" | "ifdef" | "ifndef":
+                groups.append(Group(active, active and self.condition(source, token, name, text, start)))
+            case "elif":
+                if not groups or groups[-1].seen_else:
+                    raise self.error("#elif without #if", source, token)
+                group = groups[-1]
+                group.active = (
+                    group.enclosing_active and not group.taken and self.condition(source, token, name, text, start)
+                )
+                group.taken = group.taken or group.active
+            case "else":
+                if not groups or groups[-1].seen_else:
+                    raise self.error("#else without #if", source, token)
+                group = groups[-1]
+                group.active = group.enclosing_active and not group.taken
+                group.taken = group.seen_else = True
+            case "endif":
+                if not groups:
+                    raise self.error("#endif without #if", source, token)
+                groups.pop()
+            case _ if not active:
+                pass
+            case "include":
+                self.include(source, token, text, out, depth)
+            case "define":
+                self.define(source, token, text, start)
+            case "undef":
+                _ = self.macros.pop(text, None)
+            case "pragma":
+                if text == "once":
+                    self.once.add(source.path)
+            case "error":
+                raise self.error(f"#error {text}", source, token)
+            case "" if not text:
+                pass
+            case "line" | "warning":
+                pass
+            case _:
+                raise self.error(f"invalid directive #{name}", source, token)
+
+    def define(self, source: SourceFile, token: tok.BaseToken, text: str, start: int) -> None:
+        if (found := define_pattern.match(text)) is None:
+            raise self.error(f"invalid macro name in #define {text}", source, token)
+
+        params = None
+        if found.group(2) is not None:
+            params = [param.strip() for param in found.group(2).split(",")] if found.group(2).strip() else []
+            if not all(identifier_pattern.fullmatch(param) for param in params):
+                raise self.error(f"invalid macro parameters in #define {text}", source, token)
+        body = source.tokens_at(found.group(3), start + found.start(3))
+        self.macros[found.group(1)] = Macro(found.group(1), params, body)
+
+    def condition(self, source: SourceFile, token: tok.BaseToken, name: str, text: str, start: int) -> bool:
+        if name in ("ifdef", "ifndef"):
+            if identifier_pattern.fullmatch(text) is None:
+                raise self.error(f"#{name} needs a macro name", source, token)
+            return (text in self.macros) == (name == "ifdef")
+
+        # "defined" is answered before expansion, identifiers still left after it count as 0
+        tokens = source.tokens_at(text, start)
+        resolved: list[tok.Token] = []
+        idx = 0
+        while idx < len(tokens):
+            if isinstance(tokens[idx].tokentype, tok.Identifier) and tokens[idx].tokentype.value == "defined":
+                parens = idx + 1 < len(tokens) and tokens[idx + 1].tokentype is tok.LeftParen()
+                name_idx = idx + 2 if parens else idx + 1
+                if name_idx >= len(tokens) or not isinstance(tokens[name_idx].tokentype, tok.Identifier):
+                    raise self.error("defined needs a macro name", source, token)
+                if parens and (name_idx + 1 >= len(tokens) or tokens[name_idx + 1].tokentype is not tok.RightParen()):
+                    raise self.error("missing ) after defined", source, token)
+                defined = tokens[name_idx].tokentype.value in self.macros
+                resolved.append(tok.Token(-1, -1, tok.LiteralInt("1" if defined else "0")))
+                idx = name_idx + 2 if parens else name_idx + 1
+            else:
+                resolved.append(tokens[idx])
+                idx += 1
+
+        expanded = [
+            tok.Token(-1, -1, tok.LiteralInt("0")) if isinstance(t.tokentype, tok.Identifier) else t
+            for t in self.expand(resolved, frozenset())
+        ]
+        # the parser looks one token past every factor, the end marker keeps it from running out
+        parser = parse.Parser([*expanded, tok.Token(-1, -1, tok.Semicolon())])
+        try:
+            expr = parser.expr()
+        except (parse.ParserError, parse.ParserEofError, parse.TokenTypeError) as e:
+            raise self.error(f"invalid expression in #{name}: {e}", source, token)
+        if parser.idx != len(expanded):
+            raise self.error(f"extra tokens in #{name}", source, token)
+        return evaluate(expr) != 0
+
+    def include(
+        self, source: SourceFile, token: tok.BaseToken, text: str, out: list[tok.BaseToken], depth: int
+    ) -> None:
+        if (found := include_pattern.fullmatch(text)) is None:
+            raise self.error(f'#include expects "FILENAME" or <FILENAME>, got {text}', source, token)
+        if depth >= MAX_INCLUDE_DEPTH:
+            raise self.error("#include nested too deeply", source, token)
+
+        quoted, angled = found.groups()
+        dirs = [os.path.dirname(source.path), *self.include_dirs] if quoted is not None else self.include_dirs
+        for directory in dirs:
+            if os.path.isfile(candidate := os.path.join(directory, quoted or angled)):
+                path = os.path.realpath(candidate)
+                break
+        else:
+            raise self.error(f"#include file not found: {quoted or angled}", source, token)
+
+        # guarded and #pragma once headers are skipped without reading them again
+        if path in self.once or ((guard := self.guards.get(path)) is not None and guard in self.macros):
+            return
+
+        included = self.cache.load(path)
+        if included.guard is not None:
+            self.guards[path] = included.guard
+        self.process(included, out, depth + 1)
+
+    def arguments(self, pending: list[HiddenToken], macro: Macro) -> tuple[list[list[HiddenToken]], frozenset[str]]:
+        # takes the invocation whose "(" is last on pending off it, returning its arguments and the hide set of its ")"
+        _ = pending.pop()
+        args: list[list[HiddenToken]] = [[]]
+        depth = 0
+        while pending:
+            token, hide = pending.pop()
+            match token.tokentype:
+                case tok.RightParen() if depth == 0:
+                    break
+                case tok.Comma() if depth == 0:
+                    args.append([])
+                    continue
+                case tok.LeftParen():
+                    depth += 1
+                case tok.RightParen():
+                    depth -= 1
+            args[-1].append((token, hide))
+        else:
+            raise PreprocessorError(f"unterminated argument list invoking macro {macro.name}")
+
+        assert macro.params is not None
+        if macro.params == [] and args == [[]]:
+            args = []
+        if len(args) != len(macro.params):
+            raise PreprocessorError(
+                f"macro {macro.name} takes {len(macro.params)} arguments, {len(args)} given @ {token.line}"
+            )
+        return args, hide
+
+    def expand(self, tokens: list[tok.Token], disabled: frozenset[str]) -> list[tok.Token]:
+        return [token for token, _ in self.rescan([(token, disabled) for token in tokens])]
+
+    def rescan(self, tokens: list[HiddenToken]) -> list[HiddenToken]:
+        # every replacement goes back in front of the tokens still to be read, so a function-like macro name at its
+        # end takes the argument list that follows it; a token is never expanded by a macro in its hide set, which
+        # stops recursive macros (C17 6.10.3.4)
+        pending = tokens[::-1]
+        expanded: list[HiddenToken] = []
+        while pending:
+            token, hide = pending.pop()
+            if (
+                not isinstance(token.tokentype, tok.Identifier)
+                or (macro := self.macros.get(token.tokentype.value)) is None
+                or macro.name in hide
+            ):
+                expanded.append((token, hide))
+            elif macro.params is None:
+                hide = hide | {macro.name}
+                pending.extend((body_token, hide) for body_token in reversed(macro.body))
+            elif pending and pending[-1][0].tokentype is tok.LeftParen():
+                args, closing = self.arguments(pending, macro)
+                hide = (hide & closing) | {macro.name}
+                replacements = dict(zip(macro.params, map(self.rescan, args)))
+                body: list[HiddenToken] = []
+                for body_token in macro.body:
+                    if isinstance(body_token.tokentype, tok.Identifier) and body_token.tokentype.value in replacements:
+                        body.extend(
+                            (arg_token, arg_hide | hide)
+                            for arg_token, arg_hide in replacements[body_token.tokentype.value]
+                        )
+                    else:
+                        body.append((body_token, hide))
+                pending.extend(reversed(body))
+            else:
+                # a function-like macro name without arguments is an ordinary identifier
+                expanded.append((token, hide))
+        return expanded
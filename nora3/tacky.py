@@ -1,7 +1,7 @@
 from typing import Protocol, TypeVar
 from nora3 import asm
 from nora3.builtin_types import SymbolTable
-from nora3.common import MappingHolder, Emitter
+from nora3.common import MappingHolder, Emitter, VariableTable
 
 
 class TackyGenerationError(Exception): ...
@@ -11,13 +11,18 @@ Res = TypeVar("Res")
 
 
 class ToAsm[Res](Protocol):
+    __slots__ = ()
+
     def to_asm(self) -> Res: ...
 
 
-class Value(ToAsm): ...
+class Value(ToAsm):
+    __slots__ = ()
 
 
 class Constant(Value):
+    __slots__ = ("value",)
+
     def __init__(self, value: int) -> None:
         self.value = value
 
@@ -29,6 +34,8 @@ class Constant(Value):
 
 
 class Null(Value):
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -40,20 +47,31 @@ class Null(Value):
 
 
 class Variable(Value):
-    def __init__(self, name: str) -> None:
-        self.name = name
+    __slots__ = ("id", "variables")
+
+    def __init__(self, variables: VariableTable, name: str | None = None) -> None:
+        # a temporary without a name, numbered in the table of the function being emitted
+        self.variables = variables
+        self.id = variables.add(name)
+
+    @property
+    def name(self) -> str:
+        return self.variables.name(self.id)
 
     def __repr__(self) -> str:
         return f"Variable({self.name})"
 
     def to_asm(self) -> asm.Pseudo:
-        return asm.Pseudo(self.name)
+        return asm.Pseudo(self.id, self.variables)
 
 
-class Instruction(Emitter[asm.Instruction, None]): ...
+class Instruction(Emitter[asm.Instruction, None]):
+    __slots__ = ()
 
 
 class Return(Instruction):
+    __slots__ = ("value",)
+
     def __init__(self, value: Value) -> None:
         self.value = value
 
@@ -73,6 +91,8 @@ class Return(Instruction):
 
 
 class Unary(Instruction, MappingHolder):
+    __slots__ = ("src", "dst")
+
     def __init_subclass__(cls, op: type[asm.Unary] | None = None) -> None:
         cls.mapping[cls] = op
 
@@ -97,14 +117,18 @@ class Unary(Instruction, MappingHolder):
 
 
 # fmt: off
-class Complement(Unary, op=asm.Not): ...
-class Negate(Unary, op=asm.Neg): ...
+class Complement(Unary, op=asm.Not):
+    __slots__ = ()
+class Negate(Unary, op=asm.Neg):
+    __slots__ = ()
 # fmt: on
 
 # TODO use x86 inc/dec functions
 
 
 class PrefixIncrement(Unary):
+    __slots__ = ()
+
     def __init__(self, src: Value, dst: Value) -> None:
         self.src = src
         self.dst = dst
@@ -121,6 +145,8 @@ class PrefixIncrement(Unary):
 
 
 class PrefixDecrement(Unary):
+    __slots__ = ()
+
     def emit(self, instructions: list[asm.Instruction]) -> None:
         src = self.src.to_asm()
         dst = self.dst.to_asm()
@@ -133,6 +159,8 @@ class PrefixDecrement(Unary):
 
 
 class PostfixIncrement(Unary):
+    __slots__ = ()
+
     def emit(self, instructions: list[asm.Instruction]) -> None:
         src = self.src.to_asm()
         dst = self.dst.to_asm()
@@ -145,6 +173,8 @@ class PostfixIncrement(Unary):
 
 
 class PostfixDecrement(Unary):
+    __slots__ = ()
+
     def emit(self, instructions: list[asm.Instruction]) -> None:
         src = self.src.to_asm()
         dst = self.dst.to_asm()
@@ -157,6 +187,8 @@ class PostfixDecrement(Unary):
 
 
 class Not(Unary):
+    __slots__ = ()
+
     def emit(self, instructions: list[asm.Instruction]) -> None:
         src = self.src.to_asm()
         dst = self.dst.to_asm()
@@ -170,6 +202,8 @@ class Not(Unary):
 
 
 class Binary(Instruction, MappingHolder):
+    __slots__ = ("left", "right", "dst")
+
     mode: str
     op: type[asm.Binary] | None
     cc: str | None
@@ -251,26 +285,44 @@ class Binary(Instruction, MappingHolder):
 
 
 # fmt: off
-class Add(Binary, mode="arithmatic", op=asm.Add): ...
-class Subtract(Binary, mode="arithmatic", op=asm.Subtract): ...
-class Multiply(Binary, mode="arithmatic", op=asm.Multiply): ...
-class LeftShift(Binary, mode="arithmatic", op=asm.LeftShift): ...
-class RightShift(Binary, mode="arithmatic", op=asm.RightShift): ...
-class BitwiseAnd(Binary, mode="arithmatic", op=asm.BitwiseAnd): ...
-class BitwiseOr(Binary, mode="arithmatic", op=asm.BitwiseOr): ...
-class BitwiseXOr(Binary, mode="arithmatic", op=asm.BitwiseXor): ...
-class Equal(Binary, mode="relational", cond="e"): ...
-class NotEqual(Binary, mode="relational", cond="ne"): ...
-class LessThan(Binary, mode="relational", cond="l"): ...
-class LessOrEqual(Binary, mode="relational", cond="le"): ...
-class GreaterThan(Binary, mode="relational", cond="g"): ...
-class GreaterOrEqual(Binary, mode="relational", cond="ge"): ...
-class Divide(Binary, mode="division", reg=asm.Ax): ...
-class Remainder(Binary, mode="division", reg=asm.Dx): ...
+class Add(Binary, mode="arithmatic", op=asm.Add):
+    __slots__ = ()
+class Subtract(Binary, mode="arithmatic", op=asm.Subtract):
+    __slots__ = ()
+class Multiply(Binary, mode="arithmatic", op=asm.Multiply):
+    __slots__ = ()
+class LeftShift(Binary, mode="arithmatic", op=asm.LeftShift):
+    __slots__ = ()
+class RightShift(Binary, mode="arithmatic", op=asm.RightShift):
+    __slots__ = ()
+class BitwiseAnd(Binary, mode="arithmatic", op=asm.BitwiseAnd):
+    __slots__ = ()
+class BitwiseOr(Binary, mode="arithmatic", op=asm.BitwiseOr):
+    __slots__ = ()
+class BitwiseXOr(Binary, mode="arithmatic", op=asm.BitwiseXor):
+    __slots__ = ()
+class Equal(Binary, mode="relational", cond="e"):
+    __slots__ = ()
+class NotEqual(Binary, mode="relational", cond="ne"):
+    __slots__ = ()
+class LessThan(Binary, mode="relational", cond="l"):
+    __slots__ = ()
+class LessOrEqual(Binary, mode="relational", cond="le"):
+    __slots__ = ()
+class GreaterThan(Binary, mode="relational", cond="g"):
+    __slots__ = ()
+class GreaterOrEqual(Binary, mode="relational", cond="ge"):
+    __slots__ = ()
+class Divide(Binary, mode="division", reg=asm.Ax):
+    __slots__ = ()
+class Remainder(Binary, mode="division", reg=asm.Dx):
+    __slots__ = ()
 # fmt: on
 
 
 class Copy(Instruction):
+    __slots__ = ("src", "dst")
+
     def __init__(self, src: Value, dst: Value) -> None:
         self.src = src
         self.dst = dst
@@ -287,6 +339,8 @@ class Copy(Instruction):
 
 
 class Jump(Instruction):
+    __slots__ = ("label",)
+
     def __init__(self, label: str) -> None:
         self.label = label
 
@@ -298,6 +352,8 @@ class Jump(Instruction):
 
 
 class JumpIfZero(Instruction):
+    __slots__ = ("cond", "label")
+
     def __init__(self, cond: Value, label: str) -> None:
         self.cond = cond
         self.label = label
@@ -316,6 +372,8 @@ class JumpIfZero(Instruction):
 
 
 class JumpIfNotZero(Instruction):
+    __slots__ = ("cond", "label")
+
     def __init__(self, cond: Value, label: str) -> None:
         self.cond = cond
         self.label = label
@@ -334,6 +392,8 @@ class JumpIfNotZero(Instruction):
 
 
 class Label(Instruction):
+    __slots__ = ("label",)
+
     def __init__(self, label: str) -> None:
         self.label = label
 
@@ -345,6 +405,8 @@ class Label(Instruction):
 
 
 class FuncCall(Instruction):
+    __slots__ = ("name", "args", "dst")
+
     def __init__(self, name: str, args: list[Value], dst: Value) -> None:
         self.name = name
         self.args = args
@@ -397,6 +459,8 @@ class FuncCall(Instruction):
 
 
 class SwitchCasePlaceholder(Instruction):
+    __slots__ = ("value",)
+
     def __init__(self, value: Value | None = None) -> None:
         self.value = value
 
@@ -411,12 +475,16 @@ class SwitchCasePlaceholder(Instruction):
 
 
 class TopLevel(ToAsm):
+    __slots__ = ("name", "globl")
+
     def __init__(self, name: str, globl: bool):
         self.name = name
         self.globl = globl
 
 
 class StaticVar(TopLevel):
+    __slots__ = ("init",)
+
     def __init__(self, name: str, globl: bool, init: int) -> None:
         super().__init__(name, globl)
         self.init = init
@@ -429,10 +497,15 @@ class StaticVar(TopLevel):
 
 
 class FuncDecl(TopLevel):
-    def __init__(self, name: str, globl: bool, params: list[Variable], body: list[Instruction]) -> None:
+    __slots__ = ("params", "body", "variables")
+
+    def __init__(
+        self, name: str, globl: bool, params: list[Variable], body: list[Instruction], variables: VariableTable
+    ) -> None:
         super().__init__(name, globl)
         self.params = params
         self.body = body
+        self.variables = variables
 
     def __repr__(self) -> str:
         body = "\n".join("    " + repr(item) for item in self.body)
@@ -451,10 +524,12 @@ class FuncDecl(TopLevel):
         for instr in self.body:
             instr.emit(instructions)
 
-        return asm.Function(self.name, self.globl, instructions)
+        return asm.Function(self.name, self.globl, instructions, self.variables)
 
 
 class Program(ToAsm):
+    __slots__ = ("top_level", "symbol_table")
+
     def __init__(self, top_level: list[TopLevel], symbol_table: SymbolTable) -> None:
         self.top_level = top_level
         self.symbol_table = symbol_table
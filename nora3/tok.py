@@ -1,8 +1,18 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from mmap import mmap
+
 from nora3.common import MappingHolder, Singleton
 
+TAB_WIDTH = 4
+
+# source text as read from disk (str) or mapped/read as raw bytes, in which case offsets count bytes
+type Source = str | bytes | mmap
+
 
 class TokenType:
     value: str
+    kind: int
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.value})"
@@ -119,20 +129,100 @@ class LiteralInt(Literal): ...
 # fmt: on
 
 
-class Token:
+class BaseToken(ABC):
+    __slots__ = ("tokentype",)
+
+    tokentype: TokenType
+
+    @abstractmethod
+    def position(self, lines: "LineIndex | None") -> tuple[int, int]:
+        """Line and offset just past the token; lazy tokens look them up in the LineIndex of their source."""
+
+    def __repr__(self) -> str:
+        return repr(self.tokentype)
+
+    def __len__(self) -> int:
+        return len(self.tokentype)
+
+
+class Token(BaseToken):
+    __slots__ = ("line", "offset")
+
+    line: int
+    offset: int
+
     def __init__(self, line: int, offset: int, tokentype: TokenType) -> None:
         self.line = line
         self.offset = offset
         self.tokentype = tokentype
 
+    def position(self, lines: "LineIndex | None") -> tuple[int, int]:
+        return self.line, self.offset
+
     def __repr__(self) -> str:
         if self.line == self.offset == -1:
             return repr(self.tokentype)
         else:
             return f"{repr(self.tokentype)} @ {self.line}:{self.offset}"
 
-    def __len__(self) -> int:
-        return len(self.tokentype)
+
+class LineIndex:
+    """Newline positions of a source, found on first use, to turn source indices into line:offset."""
+
+    def __init__(self, src: Source) -> None:
+        self.src = src
+        self.newlines: list[int] | None = None
+
+    def build(self) -> list[int]:
+        newlines = []
+        find = self.src.find
+        newline = "\n" if isinstance(self.src, str) else b"\n"
+        idx = find(newline)  # type: ignore[arg-type]
+        while idx != -1:
+            newlines.append(idx)
+            idx = find(newline, idx + 1)  # type: ignore[arg-type]
+        self.newlines = newlines
+        return newlines
+
+    def position(self, idx: int) -> tuple[int, int]:
+        # the line and offset just past src[idx - 1], the same place the lexer reports for a token ending there
+        newlines = self.build() if self.newlines is None else self.newlines
+        line = bisect_left(newlines, idx)
+        line_start = 0 if line == 0 else newlines[line - 1] + 1
+        if isinstance(self.src, str):
+            tabs = self.src.count("\t", line_start, idx)
+        else:
+            # mmap has no count, slicing one line of it is cheap
+            tabs = self.src[line_start:idx].count(b"\t")
+        return line + 1, idx - line_start + (TAB_WIDTH - 1) * tabs
+
+
+class LazyToken(BaseToken):
+    """Token storing only its type and source index. The LineIndex of the source is kept by the token list, buffer
+    or parser holding the token and passed in when a diagnostic asks for the line and offset."""
+
+    __slots__ = ("idx",)
+
+    def __init__(self, tokentype: TokenType, idx: int) -> None:
+        self.tokentype = tokentype
+        self.idx = idx
+
+    def position(self, lines: LineIndex | None) -> tuple[int, int]:
+        assert lines is not None, "lazy tokens are positioned through the LineIndex of their source"
+        return lines.position(self.idx + len(self.tokentype))
 
 
 characters = {k[:1] for k in Character().mapping.keys()}
+
+# small integer id for every token type, for compact token storage and table-driven dispatch;
+# fixed tokens come first so their singletons can be looked up by id
+kinds: list[type[TokenType]] = [
+    *(type(tokentype) for tokentype in Character().mapping.values()),
+    *(type(tokentype) for tokentype in Keyword().mapping.values()),
+    Identifier,
+    LiteralInt,
+]
+for kind, tokentype in enumerate(kinds):
+    tokentype.kind = kind
+
+fixed_tokentypes: list[TokenType] = [tokentype() for tokentype in kinds[: Identifier.kind]]
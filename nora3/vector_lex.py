@@ -0,0 +1,199 @@
+from array import array
+from mmap import mmap
+from string import ascii_letters, digits, whitespace
+
+import numpy as np
+from numpy.typing import NDArray
+
+from nora3 import tok
+from nora3.lex import Lexer, TokenBuffer, TokenList, byte_directive_scanner
+from nora3.tok import TAB_WIDTH
+
+# character classes, digits are split from letters only to spot invalid numbers
+WHITESPACE, WORD, DIGIT, OPERATOR, INVALID = range(5)
+
+classes = np.full(256, INVALID, dtype=np.uint8)
+for char in whitespace:
+    classes[ord(char)] = WHITESPACE
+for char in ascii_letters + "_":
+    classes[ord(char)] = WORD
+for char in digits:
+    classes[ord(char)] = DIGIT
+# "#" stays invalid, every "#" outside a comment starts a directive and is skipped before classifying
+for char in tok.characters - {tok.Pound.value}:
+    classes[ord(char)] = OPERATOR
+
+# kind of each one-character operator, so operator runs of length one need no python
+single_operators = np.full(256, -1, dtype=np.int64)
+for value, tokentype in tok.Character().mapping.items():
+    if len(value) == 1:
+        single_operators[ord(value)] = type(tokentype).kind
+
+keywords = {value.encode("ascii"): type(tokentype).kind for value, tokentype in tok.Keyword().mapping.items()}
+operators = {value.encode("ascii"): type(tokentype).kind for value, tokentype in tok.Character().mapping.items()}
+longest_operator = max(map(len, operators))
+
+POUND, SLASH, STAR, NEWLINE, TAB = map(ord, "#/*\n\t")
+
+
+class VectorLexer(Lexer):
+    """Lexer classifying the whole source in NumPy passes and splitting tokens at class transitions.
+
+    Only keyword lookup and runs of several operator characters are handled in python. Sources the vector
+    passes cannot lex (non-ascii text, lexer errors) go through the regex lexer, so results and errors are
+    the same as Lexer. iter_tokens() is inherited and still streams from the regex scanner.
+    """
+
+    def source_bytes(self) -> bytes | mmap | None:
+        if not self.binary:
+            assert isinstance(self.src, str)
+            # source indices must stay the same once encoded
+            return self.src.encode("ascii") if self.src.isascii() else None
+        return self.src  # type: ignore[return-value]
+
+    @staticmethod
+    def skipped(buf: bytes | mmap, data: NDArray[np.uint8]) -> NDArray[np.bool_] | None:
+        # comments and directives, found by jumping between the candidate openers; None if a comment is unterminated
+        slashes = np.flatnonzero((data[:-1] == SLASH) & ((data[1:] == SLASH) | (data[1:] == STAR)))
+        candidates = np.union1d(np.flatnonzero(data == POUND), slashes)
+
+        starts: list[int] = []
+        ends: list[int] = []
+        idx = 0
+        for start in candidates.tolist():
+            if start < idx:
+                continue
+            if buf[start] == POUND:
+                found = byte_directive_scanner.match(buf, start)
+                assert found is not None
+                idx = found.end()
+            elif buf[start + 1] == SLASH:
+                # line comment
+                if (idx := buf.find(b"\n", start)) == -1:
+                    idx = len(data)
+            elif (idx := buf.find(b"*/", start + 2)) == -1:
+                return None
+            else:
+                idx += 2
+            starts.append(start)
+            ends.append(idx)
+
+        depth = np.zeros(len(data) + 1, dtype=np.int8)
+        depth[starts] = 1
+        depth[ends] -= 1
+        return np.cumsum(depth[:-1]) > 0
+
+    def split_operators(self, buf: bytes | mmap, start: int, end: int) -> list[tuple[int, int, int]]:
+        # maximal munch over a run of operator characters, the same choice as the regex alternation
+        split = []
+        while start < end:
+            for length in range(min(longest_operator, end - start), 0, -1):
+                if (kind := operators.get(buf[start : start + length])) is not None:
+                    split.append((start, length, kind))
+                    start += length
+                    break
+        return split
+
+    def columns(self) -> tuple[bytes | mmap, NDArray[np.int64], NDArray[np.int64], NDArray[np.int64]] | None:
+        # the source with the start, length and kind of every token, or None to fall back to the regex lexer
+        if (buf := self.source_bytes()) is None:
+            return None
+        data = np.frombuffer(buf, dtype=np.uint8)
+        empty = np.zeros(0, dtype=np.int64)
+        if len(data) == 0:
+            return buf, empty, empty, empty
+
+        cls = classes[data]
+        if (skipped := self.skipped(buf, data)) is None:
+            return None
+        cls[skipped] = WHITESPACE
+        if (cls == INVALID).any():
+            return None
+
+        group = np.where(cls == DIGIT, WORD, cls)
+        change = np.flatnonzero(group[1:] != group[:-1]) + 1
+        run_starts = np.concatenate(([0], change))
+        run_ends = np.concatenate((change, [len(data)]))
+        run_groups = group[run_starts]
+
+        words = run_groups == WORD
+        starts, ends = run_starts[words], run_ends[words]
+        # a word starting with a digit must be all digits, anything else is an invalid number
+        numbers = cls[starts] == DIGIT
+        digit_count = np.concatenate(([0], np.cumsum(cls == DIGIT)))
+        if (digit_count[ends[numbers]] - digit_count[starts[numbers]] != (ends - starts)[numbers]).any():
+            return None
+        word_kinds = np.full(len(starts), tok.LiteralInt.kind, dtype=np.int64)
+        identifier = tok.Identifier.kind
+        word_starts, word_ends = starts[~numbers].tolist(), ends[~numbers].tolist()
+        word_kinds[~numbers] = [keywords.get(buf[s:e], identifier) for s, e in zip(word_starts, word_ends)]
+
+        ops = run_groups == OPERATOR
+        op_starts, op_ends = run_starts[ops], run_ends[ops]
+        single = op_ends - op_starts == 1
+        split = [
+            token
+            for s, e in zip(op_starts[~single].tolist(), op_ends[~single].tolist())
+            for token in self.split_operators(buf, s, e)
+        ]
+        split_starts, split_lengths, split_kinds = np.array(split, dtype=np.int64).reshape(-1, 3).T
+
+        all_starts = np.concatenate((starts, op_starts[single], split_starts))
+        order = np.argsort(all_starts, kind="stable")
+        lengths = np.concatenate((ends - starts, np.ones(single.sum(), dtype=np.int64), split_lengths))
+        kinds = np.concatenate((word_kinds, single_operators[data[op_starts[single]]], split_kinds))
+        return buf, all_starts[order], lengths[order], kinds[order]
+
+    def positions(self, buf: bytes | mmap, ends: NDArray[np.int64]) -> tuple[list[int], list[int]]:
+        # the line and offset just past each token, as tok.LineIndex.position() computes them one at a time
+        data = np.frombuffer(buf, dtype=np.uint8)
+        newlines = np.flatnonzero(data == NEWLINE)
+        lines = np.searchsorted(newlines, ends, side="left")
+        line_starts = np.concatenate(([-1], newlines))[lines] + 1
+        tabs = np.concatenate(([0], np.cumsum(data == TAB)))
+        offsets = ends - line_starts + (TAB_WIDTH - 1) * (tabs[ends] - tabs[line_starts])
+        return (lines + 1).tolist(), offsets.tolist()
+
+    def lex(self) -> TokenList:
+        if (found := self.columns()) is None:
+            return super().lex()
+        buf, starts, lengths, kinds = found
+        self.idx = len(buf)
+
+        fixed = tok.fixed_tokentypes
+        identifier = tok.Identifier.kind
+        tokentypes: list[tok.TokenType] = []
+        for kind, start, length in zip(kinds.tolist(), starts.tolist(), lengths.tolist()):
+            if kind < identifier:
+                tokentypes.append(fixed[kind])
+            else:
+                text = buf[start : start + length].decode("ascii")
+                tokentypes.append(tok.Identifier(text) if kind == identifier else tok.LiteralInt(text))
+
+        if self.lazy_positions:
+            return TokenList(map(tok.LazyToken, tokentypes, starts.tolist()), self.lines)
+
+        lines, offsets = self.positions(buf, starts + lengths)
+        if lines:
+            self.line, self.offset = lines[-1], offsets[-1]
+        return TokenList(map(tok.Token, lines, offsets, tokentypes), self.lines)
+
+    def lex_buffer(self) -> TokenBuffer:
+        if (found := self.columns()) is None:
+            return super().lex_buffer()
+        buf, starts, lengths, kinds = found
+        self.idx = len(buf)
+        self.lazy_positions = True
+
+        buffer = TokenBuffer(self.src, self.lines)
+        buffer.kinds.frombytes(kinds.astype(np.intc).tobytes())
+        buffer.starts.frombytes(starts.astype(np.intc).tobytes())
+        buffer.lengths.frombytes(lengths.astype(np.intc).tobytes())
+
+        values = array("i", [-1]) * len(kinds)
+        for idx in np.flatnonzero(kinds >= tok.Identifier.kind).tolist():
+            start = buffer.starts[idx]
+            values[idx] = buffer.intern(buffer.kinds[idx], buf[start : start + buffer.lengths[idx]])
+        buffer.values = values
+
+        return buffer
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# semantic analysis: resolve() (identifiers, goto labels, loop labels, typecheck, a walk each) against the single
+# walk of analyze(), over the chapter 8-10 valid test files, a generated function of many statements and a generated
+# program of many file-scope declarations used from many blocks
+
+import argparse
+import os.path
+import sys
+from glob import glob
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from nora3.lex import Lexer
+from nora3.parse import Parser
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--statements", type=int, default=100_000)
+parser.add_argument("--declarations", type=int, default=10_000)
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+sources = []
+for chapter in ("chapter_08", "chapter_09", "chapter_10"):
+    for filename in sorted(glob(f"./tests/{chapter}/valid/**/*.c", recursive=True)):
+        with open(filename, "r") as fh:
+            sources.append(fh.read())
+
+STATEMENTS = [
+    "x = a + {idx};",
+    "for (int i = 0; i < x; i = i + 1) {{ if (i % 3 == 0) continue; a += i; }}",
+    "while (a > {idx}) a = a - x;",
+    "switch (a) {{ case 1: a = x; break; default: a++; }}",
+    "if (a < 0) goto end; else a = -a;",
+]
+body = "\n    ".join(STATEMENTS[idx % len(STATEMENTS)].format(idx=idx) for idx in range(args.statements))
+large = f"int main(void) {{\n    int a = 1;\n    int x = 2;\n    {body}\nend:\n    return a;\n}}\n"
+print(f"{len(sources)} files, {sum(map(len, sources))} bytes; {args.statements} statements, {len(large)} bytes")
+
+declarations = "".join(f"int g{idx} = {idx};\n" for idx in range(args.declarations))
+blocks = "\n    ".join(f"{{ int y = g{idx}; {{ a = a + y; }} }}" for idx in range(args.declarations))
+scoped = f"{declarations}int main(void) {{\n    int a = 0;\n    {blocks}\n    return a;\n}}\n"
+print(f"{args.declarations} file-scope declarations and blocks, {len(scoped)} bytes")
+
+# analyze() updates its tree, so every run gets a freshly parsed one
+corpus = [[Parser(Lexer(src).lex()).parse() for src in sources] for _ in range(2 * args.repeat)]
+generated = [[Parser(Lexer(large).lex()).parse()] for _ in range(2 * args.repeat)]
+nested = [[Parser(Lexer(scoped).lex()).parse()] for _ in range(2 * args.repeat)]
+
+
+def timed(run) -> float:
+    start = perf_counter()
+    run()
+    return perf_counter() - start
+
+
+def bench(name: str, asts: list, method: str) -> None:
+    best = min(timed(lambda trees=trees: [getattr(ast, method)() for ast in trees]) for trees in asts)
+    print(f"{name:<40} {best:8.3f}s")
+
+
+for name, asts in (("chapter 8-10", corpus), ("generated", generated), ("scoped", nested)):
+    bench(f"resolve() {name}", asts[: args.repeat], "resolve")
+    bench(f"analyze() {name}", asts[args.repeat :], "analyze")
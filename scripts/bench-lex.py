@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+# lexing throughput of the regex and numpy lexers over the valid test files,
+# each lexed on its own (batch job) and concatenated into one large source
+
+import argparse
+import os.path
+import sys
+from glob import glob
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from nora3.lex import Lexer
+from nora3.vector_lex import VectorLexer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--copies", type=int, default=40, help="copies of the test files in the large source")
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+sources = []
+for filename in sorted(glob("./tests/chapter_*/valid/**/*.c", recursive=True)):
+    with open(filename, "r") as fh:
+        sources.append(fh.read())
+large = "\n".join(sources) * args.copies
+print(f"{len(sources)} files, {sum(map(len, sources))} bytes; large source {len(large)} bytes")
+
+
+def timed(run) -> float:
+    start = perf_counter()
+    run()
+    return perf_counter() - start
+
+
+def bench(name: str, run) -> None:
+    best = min(timed(run) for _ in range(args.repeat))
+    print(f"{name:<40} {best:8.3f}s")
+
+
+for lexer in (Lexer, VectorLexer):
+    bench(f"{lexer.__name__}.lex() per file", lambda lexer=lexer: [lexer(src).lex() for src in sources])
+    bench(f"{lexer.__name__}.lex() large", lambda lexer=lexer: lexer(large).lex())
+    bench(f"{lexer.__name__}.lex_buffer() large", lambda lexer=lexer: lexer(large).lex_buffer())
+    bench(f"{lexer.__name__}.lex_buffer() large bytes", lambda lexer=lexer: lexer(large.encode("ascii")).lex_buffer())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+# peak memory and live allocations while compiling a large generated program through every stage,
+# keeping each stage's tree alive like the driver does
+
+import argparse
+import os.path
+import resource
+import sys
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from nora3.lex import Lexer
+from nora3.parse import Parser
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--functions", type=int, default=2000)
+parser.add_argument("--no-trace", action="store_true", help="skip tracemalloc, for timing and peak rss only")
+args = parser.parse_args()
+
+FUNCTION = """
+int f{idx}(int a, int b) {{
+    int x = a * {idx} + b;
+    for (int i = 0; i < 10; i = i + 1) {{
+        if (x % 3 == 0)
+            x = x / 3;
+        else
+            x += i * 2 - (b << 1);
+    }}
+    while (x > 100)
+        x = x - 7;
+    return x ? f{prev}(x, b) : -x;
+}}
+"""
+
+src = "".join(FUNCTION.format(idx=idx, prev=max(idx - 1, 0)) for idx in range(args.functions))
+src += f"int main(void) {{\n    return f{args.functions - 1}(1, 2);\n}}\n"
+print(f"{args.functions} functions, {len(src)} bytes")
+
+if not args.no_trace:
+    tracemalloc.start()
+
+start = perf_counter()
+stages = {}
+stages["ast"] = Parser(Lexer(src, lazy_positions=True).lex()).parse()
+stages["resolved"] = stages["ast"].resolve()
+stages["tacky"] = stages["resolved"].to_tacky()
+stages["asm"] = stages["tacky"].to_asm()
+stages["asm"].replace_pseudo()
+stages["fixed"] = stages["asm"].fix_instructions()
+elapsed = perf_counter() - start
+
+if not args.no_trace:
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    _, peak = tracemalloc.get_traced_memory()
+    print(f"{'traced peak':<20} {peak / 2**20:10.1f} MiB")
+    print(f"{'live allocations':<20} {blocks:10d}")
+# ru_maxrss is in KiB on linux
+print(f"{'peak rss':<20} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10:10.1f} MiB")
+print(f"{'time':<20} {elapsed:10.3f}s")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# the recursive analyze() and emit() against their explicit-stack drivers, over the valid test files and a
+# generated program of many statements and nested expressions
+
+import argparse
+import os.path
+import sys
+from glob import glob
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from nora3.lex import Lexer
+from nora3.parse import Parser
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--functions", type=int, default=2000)
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+sources = []
+for filename in sorted(glob("./tests/chapter_*/valid/**/*.c", recursive=True)):
+    with open(filename, "r") as fh:
+        sources.append(fh.read())
+
+FUNCTION = """
+int f{idx}(int a, int b) {{
+    int x = a * {idx} + b;
+    for (int i = 0; i < 10; i = i + 1) {{
+        if (x % 3 == 0 && x > 0)
+            x = x / 3;
+        else if (x % 5 == 0 || x < -100)
+            x = x * (b - (a + (i << 1)));
+        else
+            x += i * 2 - (b << 1);
+    }}
+    switch (x & 7) {{
+        case 1: x = -x; break;
+        case 2: {{ int y = x; while (y > 1) y = y >> 1; x = y; }} break;
+        default: x = x ? f{prev}(x, b) : -x;
+    }}
+    return x;
+}}
+"""
+large = "".join(FUNCTION.format(idx=idx, prev=max(idx - 1, 0)) for idx in range(args.functions))
+large += f"int main(void) {{\n    return f{args.functions - 1}(1, 2);\n}}\n"
+print(f"{len(sources)} files, {sum(map(len, sources))} bytes; {args.functions} functions, {len(large)} bytes")
+
+
+def timed(run) -> float:
+    start = perf_counter()
+    run()
+    return perf_counter() - start
+
+
+def bench(name: str, srcs: list[str], explicit_stack: bool) -> None:
+    # analyze() updates its tree, so every run gets a freshly parsed one
+    analyze, emit = [], []
+    for _ in range(args.repeat):
+        asts = [Parser(Lexer(src).lex()).parse() for src in srcs]
+        analyzed = []
+        analyze.append(
+            timed(lambda asts=asts, analyzed=analyzed: analyzed.extend(ast.analyze(explicit_stack) for ast in asts))
+        )
+        emit.append(timed(lambda analyzed=analyzed: [program.to_tacky(explicit_stack) for program in analyzed]))
+    mode = "explicit stack" if explicit_stack else "recursive"
+    print(f"{name:<14} {mode:<16} analyze() {min(analyze):8.3f}s  to_tacky() {min(emit):8.3f}s")
+
+
+for name, srcs in (("test files", sources), ("generated", [large])):
+    bench(name, srcs, False)
+    bench(name, srcs, True)
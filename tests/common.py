@@ -0,0 +1,36 @@
+import os
+import re
+from collections.abc import Callable, Iterator
+from glob import glob
+
+from nora3 import TEST_DIR, asts
+from nora3.asts import ResolverError, TypeCheckerError
+from nora3.lex import Lexer
+from nora3.parse import Parser, ParserError, TokenTypeError
+
+
+def corpus(*patterns: str) -> Iterator[tuple[str, str]]:
+    # path and source of every test program under the matching directories, e.g. "chapter_*/valid"
+    for pattern in patterns:
+        for path in sorted(glob(os.path.join(TEST_DIR, pattern, "**", "*.c"), recursive=True)):
+            with open(path, "r") as fh:
+                yield path, fh.read()
+
+
+def normalized(
+    src: str, analyze: Callable[[asts.Program], asts.Program], explicit_stack: bool = False
+) -> str | None:
+    # declarations, symbols and TACKY after the given analysis, or its error, None if the parser rejects src
+    try:
+        ast = Parser(Lexer(src).lex()).parse()
+    except (ParserError, TokenTypeError):
+        return None
+
+    try:
+        program = analyze(ast)
+        result = repr(program.decls) + repr(sorted(program.symbol_table.items()))
+        result += repr(program.to_tacky(explicit_stack))
+    except (ResolverError, TypeCheckerError) as e:
+        result = f"{e.__class__.__name__}: {e}"
+    # unique names are numbered by global counters, so two runs only agree up to the numbers
+    return re.sub(r"\.\d+", ".N", result)
@@ -1,7 +1,18 @@
 import os
+import pickle
+import sys
+
+import pytest
 
 from nora3 import TEST_DIR
-from nora3.lex import InvalidCharacter, InvalidNumber, Lexer
+from nora3.lex import InvalidCharacter, InvalidNumber, Lexer, TokenBuffer, TokenList, UnexpectedEOF, map_source
+from nora3.tok import LazyToken, LineIndex, Return
+from tests.common import corpus
+
+
+def located(tokens: TokenList | TokenBuffer) -> list[tuple[str, int, int]]:
+    # token types and positions, looked up through the line index of lazy tokens
+    return [(repr(t.tokentype), *t.position(tokens.lines)) for t in tokens]
 
 
 def test_at_sign() -> None:
@@ -74,3 +85,159 @@ def test_bad_label() -> None:
         assert False, "didn't fail successfully"
     except InvalidNumber as e:
         assert str(e) == "invalid number '0invalid_label' @ 2:18"
+
+
+def test_at_sign_lazy_positions() -> None:
+    path = os.path.join(TEST_DIR, "chapter_01", "invalid_lex", "at_sign.c")
+    with open(path, "r") as fh:
+        src = fh.read()
+
+    try:
+        _ = Lexer(src, lazy_positions=True).lex()
+        assert False, "didn't fail successfully"
+    except InvalidCharacter as e:
+        assert (e.value, e.line, e.offset) == ("@", 4, 13)
+
+
+def test_lazy_token_positions() -> None:
+    src = "int main(void) {\n    return 2;\n}\n"
+    eager, lazy = Lexer(src).lex(), Lexer(src, lazy_positions=True).lex()
+    assert located(lazy) == located(eager)
+    # a lazy token holds its type and source index, the token list holds the line index
+    assert {type(t) for t in lazy} == {LazyToken} and lazy.lines.src is src
+    assert sys.getsizeof(lazy[0]) < sys.getsizeof(eager[0])
+
+    token = LazyToken(Return(), src.index("return"))
+    assert token.position(LineIndex(src)) == (2, 10)
+    assert src not in pickle.dumps(token).decode("ascii", errors="replace")
+    token = pickle.loads(pickle.dumps(token))
+    assert (repr(token), token.position(lazy.lines)) == ("Return()", (2, 10))
+
+
+def test_bad_label_mapped() -> None:
+    path = os.path.join(TEST_DIR, "chapter_06", "invalid_lex", "extra_credit", "bad_label.c")
+
+    try:
+        _ = Lexer(map_source(path), lazy_positions=True).lex()
+        assert False, "didn't fail successfully"
+    except InvalidNumber as e:
+        assert str(e) == "invalid number '0invalid_label' @ 2:18"
+
+
+def test_mapped_tokens_match_decoded() -> None:
+    path = os.path.join(TEST_DIR, "chapter_10", "valid", "static_local_multiple_scopes.c")
+    with open(path, "r") as fh:
+        src = fh.read()
+
+    tokens = Lexer(src).lex()
+    mapped = Lexer(map_source(path)).lex()
+    assert located(mapped) == located(tokens)
+
+
+def lexed(lexer: Lexer) -> list[tuple[str, int, int]] | str:
+    try:
+        return located(lexer.lex())
+    except (InvalidCharacter, InvalidNumber, UnexpectedEOF) as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def test_vector_lexer_matches_regex_lexer() -> None:
+    pytest.importorskip("numpy")
+    from nora3.vector_lex import VectorLexer
+
+    sources = list(corpus("chapter_*"))
+    assert sources
+    for path, src in sources:
+        assert lexed(VectorLexer(src)) == lexed(Lexer(src)), path
+        assert lexed(VectorLexer(map_source(path), lazy_positions=True)) == lexed(Lexer(src)), path
+
+
+def test_vector_lexer_buffer() -> None:
+    pytest.importorskip("numpy")
+    from nora3.vector_lex import VectorLexer
+
+    src = "int main(void) {\n\t/* a */ int a = 1 << 2; a <<= 3; # x\n\treturn a+++-a; // end\n}"
+    buffer = VectorLexer(src).lex_buffer()
+    expected = Lexer(src).lex_buffer()
+    assert located(buffer) == located(expected)
+    assert [t.value for t in buffer.interned] == ["main", "a", "1", "2", "3"]
+
+
+def test_parallel_buffer_matches_buffer() -> None:
+    src = "".join(text + "\n" for _, text in corpus("chapter_*/valid"))
+
+    expected = located(Lexer(src).lex_buffer())
+    for chunk_size in (100, 1000):
+        tokens = Lexer(src).lex_parallel(4, chunk_size)
+        assert located(tokens) == expected
+        tokens = Lexer(src.encode("ascii")).lex_parallel(4, chunk_size)
+        assert located(tokens) == expected
+
+
+def test_parallel_comment_across_chunks() -> None:
+    src = "int a;\n/* open\n\n\nint b;\n*/ int c; /* x\n y */ int d;\n" * 20 + "int e;\n  @"
+
+    try:
+        _ = Lexer(src).lex_parallel(8, 10)
+        assert False, "didn't fail successfully"
+    except InvalidCharacter as e:
+        assert (e.value, e.line, e.offset) == ("@", 142, 3)
+
+    src = src[:-3]
+    tokens = Lexer(src).lex_parallel(8, 10)
+    assert located(tokens) == located(Lexer(src).lex())
+
+
+def test_parallel_directive_across_chunks() -> None:
+    for src in (
+        "int a;\n#define X 1 \\\nint y;\nint b;\n",
+        "int a;\n#define X 1 /* open\nint y;\n*/ int b;\nint c;\n",
+        "int a;\n#define X 1 \\\nint y; /* open\nint z;\n*/\nint b;\n" * 10,
+    ):
+        expected = located(Lexer(src).lex_buffer())
+        for workers in (2, 3, 8):
+            tokens = Lexer(src).lex_parallel(workers, min_chunk_size=1)
+            assert located(tokens) == expected, (src, workers)
+            tokens = Lexer(src.encode("ascii")).lex_parallel(workers, min_chunk_size=1)
+            assert located(tokens) == expected, (src, workers)
+
+
+def test_relex_matches_lex_buffer() -> None:
+    path = os.path.join(TEST_DIR, "chapter_10", "valid", "static_local_multiple_scopes.c")
+    with open(path, "r") as fh:
+        src = fh.read()
+    previous = Lexer(src).lex_buffer()
+
+    at = src.index("return")
+    edits = [
+        (at, at + len("return"), "return 1 +"),  # tokens added
+        (at, at, "ret"),  # extends the next token
+        (at - 1, at, "/* "),  # opens a comment closed by a later one, or never
+        (src.index("{"), src.index("{") + 1, "{ // x\n"),
+        (0, 0, "#include <x.h>\n"),
+        (len(src), len(src), "int z;"),
+    ]
+    for start, old_end, text in edits:
+        edited = src[:start] + text + src[old_end:]
+        lexer = Lexer(edited)
+        try:
+            expected: list[tuple[str, int, int]] | str = located(Lexer(edited).lex_buffer())
+        except UnexpectedEOF as e:
+            expected = str(e)
+        try:
+            tokens = lexer.relex(previous, start, old_end, start + len(text))
+            assert located(tokens) == expected, text
+        except UnexpectedEOF as e:
+            assert str(e) == expected
+
+
+def test_relex_stops_at_resync() -> None:
+    src = "int f(void) { return 1; }\n" * 1000
+    previous = Lexer(src).lex_buffer()
+
+    at = src.index("1")
+    edited = src[:at] + "2 + 3" + src[at + 1 :]
+    lexer = Lexer(edited)
+    tokens = lexer.relex(previous, at, at + 1, at + 5)
+    assert lexer.idx < 100
+    assert located(tokens) == located(Lexer(edited).lex())
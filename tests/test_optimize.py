@@ -0,0 +1,194 @@
+from nora3 import CompilationSession, compile, tacky
+from nora3.lex import Lexer
+from nora3.optimize import eliminate_dead_stores, fold_constants, optimize_program, propagate_copies
+from nora3.parse import Parser
+
+
+def program(src: str) -> tacky.Program:
+    with CompilationSession():
+        return Parser(Lexer(src).lex()).parse().resolve().to_tacky()
+
+
+def lowered(src: str) -> list[tacky.FuncDecl]:
+    return [func for func in program(src).top_level if isinstance(func, tacky.FuncDecl)]
+
+
+def returned(expr: str) -> tacky.Instruction:
+    (func,) = lowered(f"int main(void) {{ return {expr}; }}")
+    fold_constants(func)
+    return func.body[-2]
+
+
+def test_fold_nested_expression() -> None:
+    (func,) = lowered("int main(void) { return 2 + 3 * 4; }")
+    assert fold_constants(func) == 2
+    assert repr(func.body[-2]) == "Ret(Constant(14))"
+    assert not any(isinstance(instr, tacky.Binary) for instr in func.body)
+
+
+def test_fold_int_semantics() -> None:
+    # 32-bit wraparound
+    assert repr(returned("2147483647 + 1")) == "Ret(Constant(-2147483648))"
+    assert repr(returned("-2147483647 - 2")) == "Ret(Constant(2147483647))"
+    assert repr(returned("65536 * 65536")) == "Ret(Constant(0))"
+    assert repr(returned("-(-2147483647 - 1)")) == "Ret(Constant(-2147483648))"
+    assert repr(returned("1 << 31")) == "Ret(Constant(-2147483648))"
+    # division truncates towards zero, right shifts are arithmetic
+    assert repr(returned("-7 / 2")) == "Ret(Constant(-3))"
+    assert repr(returned("-7 % 2")) == "Ret(Constant(-1))"
+    assert repr(returned("7 % -2")) == "Ret(Constant(1))"
+    assert repr(returned("-8 >> 1")) == "Ret(Constant(-4))"
+    assert repr(returned("~0 ^ 5 | 2 & 3")) == "Ret(Constant(-6))"
+    assert repr(returned("!5 + !0 + (3 >= 3) + (3 != 3)")) == "Ret(Constant(2))"
+
+
+def test_fold_leaves_undefined_operations() -> None:
+    for expr, op in [
+        ("1 / 0", tacky.Divide),
+        ("1 % 0", tacky.Remainder),
+        ("(-2147483647 - 1) / -1", tacky.Divide),
+        ("1 << 32", tacky.LeftShift),
+        ("1 >> -1", tacky.RightShift),
+    ]:
+        (func,) = lowered(f"int main(void) {{ return {expr}; }}")
+        fold_constants(func)
+        assert [type(instr) for instr in func.body if isinstance(instr, tacky.Binary)] == [op], expr
+
+
+def test_fold_branches() -> None:
+    (func,) = lowered("int main(void) { int a = 1; if (0) a = 2; while (1) { if (a) break; } return a; }")
+    fold_constants(func)
+    # `if (0)` jumps over its body, `while (1)` never tests its condition
+    assert not any(isinstance(instr, (tacky.JumpIfZero, tacky.JumpIfNotZero)) for instr in func.body[:2])
+    assert isinstance(func.body[1], tacky.Jump)
+    jumps = [instr for instr in func.body if isinstance(instr, (tacky.JumpIfZero, tacky.JumpIfNotZero))]
+    assert len(jumps) == 1 and repr(jumps[0].cond) == "Variable(.var.a.1)"
+
+    # || on constants writes its result twice, only the branches fold
+    (func,) = lowered("int main(void) { return 1 || 2; }")
+    fold_constants(func)
+    assert not any(isinstance(instr, (tacky.JumpIfZero, tacky.JumpIfNotZero)) for instr in func.body)
+
+
+def test_fold_keeps_variables() -> None:
+    # named variables and updated operands are left for later passes
+    (func,) = lowered("int main(void) { int a = 1; a++; return a + 1; }")
+    assert fold_constants(func) == 0
+    assert any(isinstance(instr, tacky.PostfixIncrement) for instr in func.body)
+    assert any(isinstance(instr, tacky.Add) for instr in func.body)
+
+
+def test_propagate_copies() -> None:
+    (func,) = lowered("int main(void) { int a = 4; int b = a; int c = b; return c; }")
+    propagate_copies(func)
+    assert repr(func.body[-2]) == "Ret(Variable(.var.b.2))"
+    # each pass follows a chain of copies one step further
+    propagate_copies(func)
+    assert repr(func.body[-2]) == "Ret(Constant(4))"
+    assert propagate_copies(func) == 0
+
+    # with folding the copies turn into constants that fold in turn
+    ir = program("int main(void) { int a = 4; int b = a * 2; int c = b - a; return c + b; }")
+    assert optimize_program(ir, fold=True, propagate=True)["main"]["folded"] == 3
+    (main,) = ir.top_level
+    assert isinstance(main, tacky.FuncDecl)
+    assert repr(main.body[-2]) == "Ret(Constant(12))"
+
+
+def test_propagate_copies_meet() -> None:
+    # a copy made on one path only or killed inside a loop does not reach past the join
+    (func,) = lowered("int f(int a, int b) { int x = a; if (b) x = b; return x; }")
+    propagate_copies(func)
+    assert repr(func.body[-2]) == "Ret(Variable(.var.x.3))"
+
+    (func,) = lowered("int f(int a) { int x = a; while (x < 10) x = x + 1; return x; }")
+    propagate_copies(func)
+    compare = next(instr for instr in func.body if isinstance(instr, tacky.LessThan))
+    assert repr(compare.left) == "Variable(.var.x.2)"
+
+    # the same copy on both paths does
+    (func,) = lowered("int f(int a, int b) { int x = 0; if (b) x = a; else x = a; return x; }")
+    propagate_copies(func)
+    assert repr(func.body[-2]) == "Ret(Variable(.var.a.1))"
+
+
+def test_propagate_copies_statics() -> None:
+    src = """
+    int s = 1;
+    int g(void) { s = s + 1; return 0; }
+    int f(void) {
+        static int t = 2;
+        int a = s;
+        int b = t;
+        t = 3;
+        g();
+        return a + b + t;
+    }
+    """
+    ir = program(src)
+    f = ir.top_level[1]
+    assert isinstance(f, tacky.FuncDecl)
+    propagate_copies(f)
+    # a call may change s and t: a and b are read as they were copied, t is not taken to be 3 any more
+    add, last = (instr for instr in f.body if isinstance(instr, tacky.Add))
+    assert (repr(add.left), repr(add.right)) == ("Variable(.var.a.2)", "Variable(.var.b.3)")
+    assert repr(last.right) == "Variable(.var.t.1)"
+
+    # without a call in between a static variable is propagated like any other
+    ir = program("int s = 1; int f(void) { s = 3; return s; }")
+    (f,) = ir.top_level[:1]
+    assert isinstance(f, tacky.FuncDecl)
+    propagate_copies(f)
+    assert repr(f.body[-2]) == "Ret(Constant(3))"
+
+
+def test_eliminate_dead_stores() -> None:
+    (func,) = lowered("int main(void) { int a = 1; int b = a * 2; a + 2; b = 3; return a; }")
+    assert eliminate_dead_stores(func) == 4
+    assert [repr(instr) for instr in func.body] == [
+        "Copy(Constant(1) -> Variable(.var.a.1))",
+        "Ret(Variable(.var.a.1))",
+        "Ret(Constant(0))",
+    ]
+
+    # a value read on the next iteration is live at the end of the loop body
+    (func,) = lowered("int main(void) { int a = 0; int i = 0; while (i < 5) { a = a + i; i = i + 1; } return a; }")
+    before = len(func.body)
+    assert eliminate_dead_stores(func) == 0
+    assert len(func.body) == before
+
+
+def test_eliminate_dead_stores_keeps_side_effects() -> None:
+    src = """
+    int s;
+    int g(void) { return s; }
+    int f(void) {
+        static int t;
+        int a = 1;
+        s = 1;
+        t = 2;
+        s = 3;
+        g();
+        a = 2;
+        t++;
+        return 0;
+    }
+    """
+    ir = program(src)
+    changes = optimize_program(ir, eliminate=True)
+    assert changes == {"g": {"removed": 0}, "f": {"removed": 2}}
+    f = ir.top_level[1]
+    assert isinstance(f, tacky.FuncDecl)
+    # every write to s and t and the call stay, the copies to a go
+    assert not any(isinstance(instr, tacky.Copy) and repr(instr.dst) == "Variable(.var.a.3)" for instr in f.body)
+    assert sum(isinstance(instr, tacky.Copy) for instr in f.body) == 3
+    assert any(isinstance(instr, tacky.FuncCall) for instr in f.body)
+    assert any(isinstance(instr, tacky.PostfixIncrement) for instr in f.body)
+
+
+def test_compile_optimize() -> None:
+    src = "int main(void) { return (2 + 3) * 4 - 6 / 2; }"
+    assembly = compile(src, optimize=True)
+    assert "$17" in assembly
+    assert "imull" not in assembly and "idivl" not in assembly
+    assert compile(src) != assembly
@@ -1,8 +1,13 @@
 import os
+import pickle
 
-from nora3 import TEST_DIR
+from nora3 import TEST_DIR, asm, asts, tacky
+from nora3.arena import Arena
+from nora3.asts import ResolverError, TypeCheckerError
+from nora3.common import slot_names
 from nora3.lex import Lexer
-from nora3.parse import ParserEofError, TokenTypeError, ParserError, Parser
+from nora3.parse import BufferParser, ParserEofError, TokenTypeError, ParserError, Parser, StreamParser
+from tests.common import corpus
 
 
 def test_end_before_expr() -> None:
@@ -1445,3 +1450,247 @@ def test_static_label() -> None:
         assert False, "didn't fail successfully"
     except ParserError as e:
         assert str(e) == "invalid types: [] @ 4:12"
+
+
+def test_switched_parens_lazy_positions() -> None:
+    path = os.path.join(TEST_DIR, "chapter_01", "invalid_parse", "switched_parens.c")
+    with open(path, "r") as fh:
+        src = fh.read()
+    tokens = Lexer(src, lazy_positions=True).lex()
+
+    try:
+        _ = Parser(tokens).parse()
+        assert False, "didn't fail successfully"
+    except TokenTypeError as e:
+        assert str(e) == "expected Semicolon or Equal, got RightParen() @ 1:10"
+
+
+def test_switched_parens_token_buffer() -> None:
+    path = os.path.join(TEST_DIR, "chapter_01", "invalid_parse", "switched_parens.c")
+    with open(path, "r") as fh:
+        src = fh.read()
+    tokens = Lexer(src).lex_buffer()
+
+    try:
+        _ = BufferParser(tokens).parse()
+        assert False, "didn't fail successfully"
+    except TokenTypeError as e:
+        assert str(e) == "expected Semicolon or Equal, got RightParen() @ 1:10"
+
+
+def test_switched_parens_stream() -> None:
+    path = os.path.join(TEST_DIR, "chapter_01", "invalid_parse", "switched_parens.c")
+    with open(path, "r") as fh:
+        src = fh.read()
+    # the parser stops at the first syntax error, before the lexer reaches the invalid character
+    tokens = Lexer(src + "\n@").iter_tokens()
+
+    try:
+        _ = StreamParser(tokens).parse()
+        assert False, "didn't fail successfully"
+    except TokenTypeError as e:
+        assert str(e) == "expected Semicolon or Equal, got RightParen() @ 1:10"
+
+
+def test_unclosed_brace_stream() -> None:
+    path = os.path.join(TEST_DIR, "chapter_01", "invalid_parse", "unclosed_brace.c")
+    with open(path, "r") as fh:
+        src = fh.read()
+    tokens = Lexer(src).iter_tokens()
+
+    try:
+        _ = StreamParser(tokens).parse()
+        assert False, "didn't fail successfully"
+    except ParserEofError as e:
+        assert str(e) == "unexpected EOF found in func_decl function"
+
+
+
+def test_unclosed_brace_lazy_bodies() -> None:
+    path = os.path.join(TEST_DIR, "chapter_01", "invalid_parse", "unclosed_brace.c")
+    with open(path, "r") as fh:
+        src = fh.read()
+
+    for parser in (
+        Parser(Lexer(src).lex(), lazy_bodies=True),
+        BufferParser(Lexer(src).lex_buffer(), lazy_bodies=True),
+        StreamParser(Lexer(src).iter_tokens(), lazy_bodies=True),
+    ):
+        try:
+            _ = parser.parse()
+            assert False, "didn't fail successfully"
+        except ParserEofError as e:
+            assert str(e) == "unexpected EOF found in skip_body function", type(parser).__name__
+
+def test_precedence_table() -> None:
+    src = "int main(void) { return a = b += 1 + 2 * -3 << 4 < 5 == 6 & 7 ^ 8 | 9 && 10 || c ? 11 : d = 12; }"
+    tokens = Lexer(src).lex()
+
+    body = repr(Parser(tokens).parse())
+    # the conditional binds tighter than assignment, as in the book's grammar
+    expected = (
+        "Return(Assign(Variable(a) . AddAssign(Variable(b) . Assign(Conditional(Or(And(BitwiseOr(BitwiseXOr("
+        "BitwiseAnd(Equal(LessThan(LeftShift(Add(Constant(1) . Multiply(Constant(2) . Negate(Constant(3)))) . "
+        "Constant(4)) . Constant(5)) . Constant(6)) . Constant(7)) . Constant(8)) . Constant(9)) . Constant(10)) . "
+        "Variable(c)) ? Constant(11) : Variable(d)) . Constant(12)))))"
+    )
+    assert expected in body, body
+
+
+def tree(node: object) -> object:
+    # node types and attributes, comparable with == (not every node has a repr before resolution)
+    if isinstance(node, list):
+        return [tree(item) for item in node]
+    if isinstance(node, (asts.Program, asts.Expr, asts.BlockItem)):
+        return type(node).__name__, {name: tree(getattr(node, name)) for name in slot_names(type(node))}
+    return node
+
+
+def test_explicit_stack_matches_recursive() -> None:
+    for path, src in corpus("chapter_*/valid"):
+        tokens = Lexer(src).lex()
+
+        assert tree(Parser(tokens, explicit_stack=True).parse()) == tree(Parser(tokens).parse()), path
+
+
+def test_explicit_stack_deep_nesting() -> None:
+    depth = 100_000
+    nested = "(" * depth + "-~!a++" + ")" * depth
+    chain = " = ".join(["a"] * depth)
+    calls = "f(" * depth + "b" + ")" * depth
+    src = f"int main(void) {{ return {nested}; {chain}; {calls}; }}"
+    program = Parser(Lexer(src, lazy_positions=True).lex(), explicit_stack=True).parse()
+
+    # walk to the innermost node of each expression without recursing
+    body = program.decls[0].body
+    nested_expr, chain_expr, calls_expr = (item.expr for item in body.items)
+    for _ in range(2):
+        assert isinstance(nested_expr, asts.Unary)
+        nested_expr = nested_expr.expr
+    for _ in range(depth - 1):
+        assert isinstance(chain_expr, asts.Assign)
+        chain_expr = chain_expr.right
+    for _ in range(depth):
+        assert isinstance(calls_expr, asts.FuncCall)
+        calls_expr = calls_expr.args[0]
+    assert repr(nested_expr) == "Not(PostfixIncrement(Variable(a)))"
+    assert repr(chain_expr) == "Variable(a)"
+    assert repr(calls_expr) == "Variable(b)"
+
+
+def test_lazy_bodies_match_eager() -> None:
+    for path, src in corpus("chapter_*/valid"):
+        tokens = Lexer(src).lex()
+        eager = [tree(getattr(decl, "body", None)) for decl in Parser(tokens).parse().decls]
+
+        for parser in (
+            Parser(tokens, lazy_bodies=True),
+            BufferParser(Lexer(src).lex_buffer(), lazy_bodies=True),
+            StreamParser(iter(tokens), lazy_bodies=True),
+        ):
+            lazy = [tree(getattr(decl, "body", None)) for decl in parser.parse().decls]
+            assert lazy == eager, (path, type(parser).__name__)
+
+
+def test_lazy_bodies_skip_unused_static() -> None:
+    src = """
+    static int unused(void) { return 1 +; }
+    static int helper(void) { return 2; }
+    static int twice(void) { return helper() * helper(); }
+    int main(void) { return twice(); }
+    """
+    tokens = Lexer(src).lex()
+
+    try:
+        _ = Parser(tokens).parse()
+        assert False, "didn't fail successfully"
+    except ParserError:
+        pass
+
+    program = Parser(tokens, lazy_bodies=True).parse()
+    assert all(isinstance(decl, asts.FuncDecl) and decl.lazy_body is not None for decl in program.decls)
+    assert "{ ... }" in repr(program)
+
+    definitions = [decl.name for decl in program.resolve().decls if isinstance(decl, asts.FuncDecl) and decl.has_body]
+    assert definitions == ["helper", "twice", "main"]
+    assert isinstance((unused := program.decls[0]), asts.FuncDecl) and unused._body is None
+
+
+def test_lazy_bodies_unused_static_definitions() -> None:
+    # an unused static definition is still a definition
+    src = "static int f(void) { return 1; } static int f(void) { return 2; } int main(void) { return 0; }"
+    for resolve in (asts.Program.resolve, asts.Program.analyze):
+        try:
+            _ = resolve(Parser(Lexer(src).lex(), lazy_bodies=True).parse())
+            assert False, "didn't fail successfully"
+        except TypeCheckerError as e:
+            assert str(e) == "function f is defined more than once"
+
+    # but its body is never checked
+    src = "static int g(void) { return x; } int main(void) { return 0; }"
+    try:
+        _ = Parser(Lexer(src).lex()).parse().resolve()
+        assert False, "didn't fail successfully"
+    except ResolverError:
+        pass
+    for resolve in (asts.Program.resolve, asts.Program.analyze):
+        program = resolve(Parser(Lexer(src).lex(), lazy_bodies=True).parse())
+        assert [decl.name for decl in program.decls if isinstance(decl, asts.FuncDecl) and decl.has_body] == ["main"]
+
+
+def test_parallel_matches_sequential() -> None:
+    src = "\n".join(text for _, text in corpus("chapter_1[01]/valid"))
+
+    expected = tree(Parser(Lexer(src).lex()).parse())
+    assert tree(Parser(Lexer(src).lex()).program_parallel(2, min_declarations=8)) == expected
+    assert tree(BufferParser(Lexer(src).lex_buffer()).program_parallel(2, min_declarations=8)) == expected
+
+
+def test_parallel_error_matches_sequential() -> None:
+    src = "int f(void) { return 1; }\n" * 8 + "int g(void) { return (1; }\n" + "int h(void);\n" * 8
+    tokens = Lexer(src).lex()
+
+    try:
+        _ = Parser(tokens).program_parallel(2, min_declarations=4)
+        assert False, "didn't fail successfully"
+    except TokenTypeError as e:
+        assert str(e) == "expected RightParen, got Semicolon() @ 9:24"
+
+
+def test_nodes_are_slotted() -> None:
+    for module in (asts, tacky, asm):
+        for name, cls in vars(module).items():
+            if isinstance(cls, type) and cls.__module__ == module.__name__ and not issubclass(cls, Exception):
+                assert cls.__dictoffset__ == 0, f"{module.__name__}.{name} has a __dict__"
+
+
+def test_arena_round_trip() -> None:
+    for path, src in corpus("chapter_*/valid"):
+        program = Parser(Lexer(src).lex()).parse()
+
+        arena = Arena.from_ast(program)
+        assert tree(arena.to_ast()) == tree(program), path
+        assert tree(pickle.loads(pickle.dumps(arena)).to_ast()) == tree(program), path
+
+
+def test_arena_layout() -> None:
+    program = Parser(Lexer("int main(void) { return -(1 + 2); }").lex()).parse()
+    arena = Arena.from_ast(program)
+
+    assert [arena.node_type(idx).__name__ for idx in range(len(arena))] == [
+        "list",
+        "Constant",
+        "Constant",
+        "Add",
+        "Negate",
+        "Return",
+        "list",
+        "Block",
+        "FuncDecl",
+        "list",
+        "Program",
+    ]
+    assert arena.root == len(arena) - 1
+    # children are stored before their parents
+    assert all(child < idx for idx in range(len(arena)) for child in arena.children(idx))
+    assert [arena.payload(field) for field in arena.node_fields(1)] == [1]
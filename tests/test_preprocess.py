@@ -0,0 +1,165 @@
+import os
+from pathlib import Path
+
+from nora3.lex import Lexer
+from nora3.parse import Parser
+from nora3.preprocess import IncludeCache, Preprocessor, PreprocessorError
+from tests.common import corpus
+
+
+def spelled(tokens) -> str:
+    return " ".join(token.tokentype.value for token in tokens)
+
+
+def test_valid_tests_unchanged() -> None:
+    # their directives only guard pragmas, so preprocessing leaves the tokens as lexed
+    for path, src in corpus("chapter_*/valid"):
+        tokens = Preprocessor().preprocess_file(path)
+        expected = Lexer(src).lex()
+        assert [(repr(t), t.line, t.offset) for t in tokens] == [(repr(t), t.line, t.offset) for t in expected], path
+
+
+def test_macros() -> None:
+    src = """
+#define N 2 + 1
+#define ADD(a, b) (a + b)
+#define SELF SELF + 1
+#define EMPTY() 7
+int main(void) { return ADD(N, ADD(1, 2)) * SELF + EMPTY() + ADD; }
+#undef N
+int N;
+"""
+    tokens = Preprocessor().preprocess(src)
+    assert spelled(tokens) == ("int main ( void ) { return ( 2 + 1 + ( 1 + 2 ) ) * SELF + 1 + 7 + ADD ; } int N ;")
+    # expanded tokens keep the position they were defined at
+    assert (tokens[8].line, tokens[8].offset) == (2, 11)
+
+
+def test_rescan_with_following_tokens() -> None:
+    # a replacement ending in a function-like macro name takes the argument list after it
+    src = """
+#define f(x) x
+#define g f
+int q = g(3);
+"""
+    assert spelled(Preprocessor().preprocess(src)) == "int q = 3 ;"
+
+    src = """
+#define f g
+#define g(x) x+1
+int q = f(2);
+"""
+    assert spelled(Preprocessor().preprocess(src)) == "int q = 2 + 1 ;"
+
+    src = """
+#define id(x) x
+#define h() id
+int q = h()(4);
+"""
+    assert spelled(Preprocessor().preprocess(src)) == "int q = 4 ;"
+
+    # but a macro stays disabled for the tokens its own expansion produced
+    src = """
+#define f(a) a*g
+#define g(a) f(a)
+int q = f(2)(9);
+"""
+    assert spelled(Preprocessor().preprocess(src)) == "int q = 2 * 9 * g ;"
+
+
+def test_conditionals() -> None:
+    src = """
+#define A 2
+#if A * 2 == 4 && defined(A) && !defined B
+int a;
+#  ifdef B
+int b;
+#  elif (A > 1 ? 0 : 1) || UNDEFINED
+int c;
+#  else
+int d;
+#  endif
+#elif 1
+int e;
+#else
+int f;
+#endif
+#ifndef A
+int g;
+#endif
+"""
+    assert spelled(Preprocessor().preprocess(src)) == "int a ; int d ;"
+
+
+def test_directive_comments_and_continuations(tmp_path: Path) -> None:
+    (tmp_path / "x.h").write_text("int x;\n")
+    src = """
+#include "x.h" // the header
+#ifdef A /* not defined */
+int a;
+#elif 1 // always
+#define SUM(a, b) \\
+    ((a) + /* first
+              then */ (b))
+int s = SUM(1, 2);
+#endif
+int after;
+"""
+    tokens = Preprocessor().preprocess(src, str(tmp_path / "main.c"))
+    assert spelled(tokens) == "int x ; int s = ( ( 1 ) + ( 2 ) ) ; int after ;"
+    # lines after a continued directive keep their numbers, so do macro body tokens
+    assert tokens[-2].line == 11
+    assert [token.line for token in tokens if token.tokentype.value == "+"] == [7]
+
+
+def test_invalid_directives() -> None:
+    for src, message in [
+        ("#if 1\nint a;", "unterminated conditional directive"),
+        ("#endif", "#endif without #if"),
+        ("#if 1\n#else\n#else\n#endif", "#else without #if"),
+        ("#if 1 +\n#endif", "invalid expression in #if"),
+        ("#if 1 2\n#endif", "extra tokens in #if"),
+        ("#error stop here", "#error stop here"),
+        ("#frobnicate", "invalid directive #frobnicate"),
+        ("#define F(a, b) a\nint x = F(1);", "macro F takes 2 arguments, 1 given"),
+        ('#include "missing.h"', "#include file not found: missing.h"),
+        ("#if 1 >> -1\n#endif", "shift count -1 out of range in #if"),
+        ("#if 1 << 64\n#endif", "shift count 64 out of range in #if"),
+        ("int a = 1 \\\n + 2;", "line continuation outside a directive is not supported"),
+    ]:
+        try:
+            _ = Preprocessor().preprocess(src)
+            assert False, "didn't fail successfully"
+        except PreprocessorError as e:
+            assert str(e).startswith(message), (src, str(e))
+
+
+def test_includes(tmp_path: Path) -> None:
+    (tmp_path / "include").mkdir()
+    (tmp_path / "include" / "guarded.h").write_text(
+        "#ifndef GUARDED_H\n#define GUARDED_H\n#define SQUARE(x) ((x) * (x))\nint helper(int a);\n#endif\n"
+    )
+    (tmp_path / "once.h").write_text("#pragma once\nint once;\n")
+    main = tmp_path / "main.c"
+    main.write_text(
+        '#include <guarded.h>\n#include "include/guarded.h"\n#include "once.h"\n#include "once.h"\n'
+        "int main(void) { return SQUARE(2) + helper(once); }\n"
+    )
+
+    cache = IncludeCache()
+    preprocessor = Preprocessor([str(tmp_path / "include")], cache)
+    tokens = preprocessor.preprocess_file(str(main))
+    assert spelled(tokens) == (
+        "int helper ( int a ) ; int once ; int main ( void ) { return ( ( 2 ) * ( 2 ) ) + helper ( once ) ; }"
+    )
+    assert list(preprocessor.guards.values()) == ["GUARDED_H"]
+    _ = Parser(tokens).parse()
+
+    # a second compilation reuses the lexed headers until they change
+    header = cache.files[str((tmp_path / "once.h").resolve())]
+    _ = Preprocessor([str(tmp_path / "include")], cache).preprocess_file(str(main))
+    assert cache.files[str((tmp_path / "once.h").resolve())] is header
+    (tmp_path / "once.h").write_text("#pragma once\nint twice;\n")
+    os.utime(tmp_path / "once.h", ns=(header.mtime_ns + 10**9, header.mtime_ns + 10**9))
+    tokens = Preprocessor([str(tmp_path / "include")], cache).preprocess_file(str(main))
+    assert "twice" in spelled(tokens)
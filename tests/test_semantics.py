@@ -1,8 +1,13 @@
 import os
-from nora3 import TEST_DIR
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from nora3 import TEST_DIR, CompilationSession, asm, asts, compile, tacky
 from nora3.lex import Lexer
 from nora3.parse import Parser, ParserError, TokenTypeError
 from nora3.asts import ResolverError, TypeCheckerError
+from nora3.builtin_types import FuncType, IntType, LocalAttrs, StaticAttrs
+from nora3.common import slot_names
+from tests.common import corpus, normalized
 
 
 def test_declared_after_use() -> None:
@@ -1620,3 +1625,213 @@ def test_undeclared_global_variable() -> None:
         assert False, "didn't fail successfully"
     except ResolverError as e:
         assert str(e) == "undefined variable: x"
+
+
+def test_fused_analysis_matches_resolve() -> None:
+    for path, src in corpus("chapter_08/valid", "chapter_09/valid", "chapter_10/valid"):
+        assert normalized(src, asts.Program.analyze) == normalized(src, asts.Program.resolve), path
+
+
+def test_fused_analysis_errors_match_resolve() -> None:
+    invalid = ("invalid_semantics", "invalid_labels", "invalid_declarations", "invalid_types")
+    for path, src in corpus(*(f"chapter_*/{pattern}" for pattern in invalid)):
+        if (fused := normalized(src, asts.Program.analyze)) is None:
+            continue
+        assert "Error: " in fused, path
+        assert fused == normalized(src, asts.Program.resolve), path
+
+
+def test_scope_chain_lookup() -> None:
+    # names resolve through enclosing scopes, extern reaches past shadowing locals to the file-scope variable
+    src = """
+    int x = 1;
+    int main(void) {
+        int x = 2;
+        {
+            int x = 3;
+            {
+                extern int x;
+                return x;
+            }
+        }
+    }
+    """
+    for fused in (False, True):
+        ast = Parser(Lexer(src).lex()).parse()
+        program = ast.analyze() if fused else ast.resolve()
+        assert "Return(Variable(x))" in repr(program.decls[1])
+
+
+def test_explicit_stack_matches_recursive() -> None:
+    patterns = ("valid", "invalid_semantics", "invalid_labels", "invalid_declarations", "invalid_types")
+    for path, src in corpus(*(f"chapter_*/{pattern}" for pattern in patterns)):
+        explicit = normalized(src, lambda ast: ast.analyze(explicit_stack=True), explicit_stack=True)
+        assert explicit == normalized(src, asts.Program.analyze), path
+
+
+def test_explicit_stack_else_if_chain() -> None:
+    # if (a == 0) return 0; else if (a == 1) return 1; ... 50k arms
+    arms = 50_000
+    chain = " else ".join(f"if (a == {idx}) return {idx};" for idx in range(arms))
+    src = f"int f(int a) {{ {chain} else return -1; }}"
+    tokens = Lexer(src, lazy_positions=True).lex()
+
+    try:
+        _ = Parser(tokens).parse()
+        assert False, "didn't fail successfully"
+    except RecursionError:
+        pass
+
+    program = Parser(tokens, explicit_stack=True).parse().analyze(explicit_stack=True)
+    (func,) = program.to_tacky(explicit_stack=True).top_level
+    assert isinstance(func, tacky.FuncDecl)
+    returns = [instr for instr in func.body if isinstance(instr, tacky.Return)]
+    # every arm, the final else and the implicit return at the end
+    assert len(returns) == arms + 2
+    assert sum(isinstance(instr, tacky.JumpIfZero) for instr in func.body) == arms
+
+
+def test_explicit_stack_nested_blocks_and_loops() -> None:
+    # { int x1 = x0 + 1; { int x2 = x1 + 1; ... } } inside 10k nested while loops ending in break and continue
+    depth, loops = 50_000, 10_000
+    blocks = "".join(f"{{ int x{idx} = x{idx - 1} + 1; " for idx in range(1, depth + 1))
+    body = "while (x0) " * loops + f"{{ continue; break; {blocks}return x{depth}; {'}' * depth} }}"
+    src = f"int f(int x0) {{ {body} }}"
+    tokens = Lexer(src, lazy_positions=True).lex()
+
+    program = Parser(tokens, explicit_stack=True).parse().analyze(explicit_stack=True)
+    (func,) = program.to_tacky(explicit_stack=True).top_level
+    assert isinstance(func, tacky.FuncDecl)
+
+    # break and continue go to the innermost loop, every declaration gets its own name
+    jumps = [instr.label for instr in func.body if isinstance(instr, tacky.Jump)]
+    innermost = jumps[0].removeprefix("__continue__")
+    assert "while.f." in innermost and jumps[1] == f"__break__{innermost}"
+    copies = [instr for instr in func.body if isinstance(instr, tacky.Copy)]
+    assert len({copy.dst.name for copy in copies}) == depth
+
+
+def test_explicit_stack_deep_expressions() -> None:
+    depth = 100_000
+    chain = " = ".join(["a"] * depth)
+    calls = "f(" * depth + "a" + ")" * depth
+    nested = "a + (" * depth + "1" + ")" * depth
+    src = f"int f(int x); int main(void) {{ int a = 0; {chain}; {calls}; return {nested}; }}"
+    tokens = Lexer(src, lazy_positions=True).lex()
+
+    try:
+        _ = Parser(tokens, explicit_stack=True).parse().analyze()
+        assert False, "didn't fail successfully"
+    except RecursionError:
+        pass
+
+    program = Parser(tokens, explicit_stack=True).parse().analyze(explicit_stack=True)
+    (func,) = program.to_tacky(explicit_stack=True).top_level
+    assert isinstance(func, tacky.FuncDecl)
+    assert sum(isinstance(instr, tacky.FuncCall) for instr in func.body) == depth
+    assert sum(isinstance(instr, tacky.Add) for instr in func.body) == depth
+
+
+def test_parallel_resolve_matches_resolve() -> None:
+    for path, src in corpus("chapter_09/valid", "chapter_10/valid"):
+        parallel = normalized(src, lambda ast: ast.resolve_parallel(2, min_declarations=1))
+        assert parallel == normalized(src, asts.Program.resolve), path
+
+
+def test_parallel_resolve_unique_names() -> None:
+    src = "".join(f"int f{idx}(int a) {{ static int s = {idx}; int b = a; return s + b; }}\n" for idx in range(8))
+    program = Parser(Lexer(src).lex()).parse().resolve_parallel(4, min_declarations=2)
+
+    statics = [name for name, entry in program.symbol_table.items() if isinstance(entry.attrs, StaticAttrs)]
+    locals_ = [name for name, entry in program.symbol_table.items() if isinstance(entry.attrs, LocalAttrs)]
+    assert len(set(statics)) == 8 and len(set(locals_)) == 16
+    assert [name.split(".")[2] for name in statics] == ["s"] * 8
+
+
+def test_parallel_resolve_errors_match_resolve() -> None:
+    sources = [
+        # g is declared after the body that calls it
+        "int f(void) { return g(); }\n" + "int h(void) { return 0; }\n" * 4 + "int g(void);\n",
+        # the block-scope extern gives x linkage before the file-scope static does
+        "int f(void) { extern int x; return x; }\n" + "int h(void) { return 0; }\n" * 4 + "static int x;\n",
+    ]
+    for src in sources:
+        try:
+            _ = Parser(Lexer(src).lex()).parse().resolve()
+            assert False, "didn't fail successfully"
+        except (ResolverError, TypeCheckerError) as e:
+            expected = f"{e.__class__.__name__}: {e}"
+
+        try:
+            _ = Parser(Lexer(src).lex()).parse().resolve_parallel(2, min_declarations=2)
+            assert False, "didn't fail successfully"
+        except (ResolverError, TypeCheckerError) as e:
+            assert f"{e.__class__.__name__}: {e}" == expected
+
+
+def test_types_are_interned() -> None:
+    two = FuncType((IntType(), IntType()))
+    assert FuncType((IntType(),) * 2) is two and FuncType((IntType(),)) is not two
+    assert pickle.loads(pickle.dumps(two)) is two and pickle.loads(pickle.dumps(IntType())) is IntType()
+
+    try:
+        two.params = ()
+        assert False, "didn't fail successfully"
+    except AttributeError:
+        pass
+
+    src = "".join(f"int f{idx}(int a, int b);\n" for idx in range(100)) + "int main(void) { int x = 1; return x; }"
+    program = Parser(Lexer(src).lex()).parse().resolve()
+    assert {id(program.symbol_table[f"f{idx}"].type_) for idx in range(100)} == {id(two)}
+    (local,) = [entry for name, entry in program.symbol_table.items() if name.startswith(".var.x.")]
+    assert local.type_ is IntType() and isinstance(local.attrs, LocalAttrs)
+
+
+def test_compile_sessions_are_independent() -> None:
+    sources = [src for _, src in corpus("chapter_09/valid", "chapter_10/valid")]
+
+    # names restart in every session, whatever was compiled before or on other threads
+    expected = [compile(src) for src in sources]
+    assert [compile(src) for src in reversed(sources)] == expected[::-1]
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(compile, sources)) == expected
+
+    session = CompilationSession()
+    assert compile(sources[0], session) == expected[0]
+    assert "main" in session.symbol_table
+    with session:
+        assert asts.make_label_name("x") == f".label.x.{session.labels}"
+
+    # outside any session a thread makes one of its own instead of sharing a default with other threads
+    _ = asts.make_label_name("x")
+    with ThreadPoolExecutor(1) as pool:
+        assert pool.submit(asts.make_label_name, "x").result() == ".label.x.1"
+
+
+def test_variable_ids() -> None:
+    src = "int f(int a) { static int s = 1; int b = a + s * 2; return b + a; }\nint g(void) { return f(1) + 2; }"
+    with CompilationSession():
+        program = Parser(Lexer(src).lex()).parse().resolve().to_tacky()
+    f, g, _ = program.top_level
+    assert isinstance(f, tacky.FuncDecl) and isinstance(g, tacky.FuncDecl)
+
+    # every function numbers its variables from 0, a name is added once and temporaries get no name
+    values = [getattr(instr, name) for instr in f.body for name in slot_names(type(instr))]
+    assert {value.id for value in values if isinstance(value, tacky.Variable)} == set(range(len(f.variables)))
+    a, s, b = (idx for idx, name in enumerate(f.variables.names) if name is not None)
+    assert [param.id for param in f.params] == [a] and f.variables.names[s].startswith(".var.s.")
+    assert f.variables.names[b].startswith(".var.b.")
+    # only s lives in static storage, found in the symbol table when it was added
+    assert f.variables.static == [id_ == s for id_ in range(len(f.variables))]
+    assert g.variables is not f.variables and g.variables.names == [None, None]
+    assert repr(g.body[-2]) == "Ret(Variable(.tmpvar.1))"
+
+    assembly = program.to_asm()
+    assembly.replace_pseudo()
+    function = assembly.functions[0]
+    assert isinstance(function, asm.Function)
+    operands = [getattr(instr, name) for instr in function.instructions for name in slot_names(type(instr))]
+    assert not any(isinstance(operand, asm.Pseudo) for operand in operands)
+    assert {operand.name for operand in operands if isinstance(operand, asm.Data)} == {f.variables.names[s]}
+    # one stack slot for every variable but the static one
+    assert function.stack_size == -4 * (len(f.variables) - 1)